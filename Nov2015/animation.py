@@ -0,0 +1,337 @@
+"""Module for table-driven character animation.
+
+   A character is described by a table of animation states, each
+   listing the sprite sheet frames it uses and how they are timed.
+   The table is turned into an AnimationSet once per character:
+   every frame is cut (through the shared frame cache) for both
+   facing directions up front, so picking a frame while the game
+   runs is a couple of list lookups. Each animated actor only holds
+   a small Animator with its current state and tick count.
+
+   Frames can also carry combat boxes (see the combat module):
+   hitboxes that attack and hurtboxes that can be attacked, given
+   in the frame facing right and mirrored for facing left when the
+   set is built.
+
+   Character table format:
+      sheet      : Path of the sprite sheet
+      frame_size : [width, height] of one frame
+      row        : y of the frame row on the sheet (optional)
+      hurtboxes  : Boxes every frame can be hit in, unless its state
+                   says otherwise (optional)
+      states     : Dict of state name -> state table
+
+   State table format:
+      frames     : List of frame numbers along the row
+      clock      : What picks the frame --
+                   "ticks"     : advances every (step) frames of the
+                                 state playing (the default)
+                   "distance"  : advances every (step) pixels the
+                                 actor is along the x-axis
+                   "threshold" : the bucket of a value (vertical speed
+                                 for falling) among (thresholds)
+      step       : Ticks or pixels per frame (default 1)
+      thresholds : Bucket boundaries for "threshold" clocks; frame n
+                   is used for values below thresholds[n]
+      loop       : Whether "ticks" animations repeat (default True)
+      hitboxes   : One list of boxes per frame that the frame attacks
+                   with (optional; empty lists for frames that don't)
+      hurtboxes  : One list of boxes per frame to use instead of the
+                   character's (optional)
+      damage, knockback ([x, y], away from the attacker), priority :
+                   What the state's hitboxes do (see combat.Attack)
+      projectile : What the state fires when it starts (optional) --
+                   kind  : Projectile kind (see particles.ProjectilePool)
+                   at    : [x, y] in the frame it's launched from (its
+                           back edge, vertically centered)
+                   speed : Pixels per frame, away from the attacker
+                   life  : Frames it flies for (default 60)
+
+   Boxes are [x, y, width, height] in the frame.
+"""
+from bisect import bisect_right
+
+from combat import Attack
+from frame_cache import shared_cache
+
+# -------- Animation states --------
+IDLE = 0
+RUN = 1
+RISE = 2
+FALL = 3
+LAND = 4
+ATTACK = 5
+HURT = 6
+
+STATE_NAMES = ("idle", "run", "rise", "fall", "land", "attack", "hurt")
+
+# States a character can leave out, and what plays instead
+FALLBACKS = {"run": "idle", "rise": "idle", "fall": "rise", "land": None,
+             "attack": "idle", "hurt": "fall"}
+
+# -------- Facing directions (index into the frame tables) --------
+RIGHT = 0
+LEFT = 1
+
+DIRECTIONS = {"R": RIGHT, "L": LEFT}
+
+# -------- Frame clocks --------
+TICKS = 0
+DISTANCE = 1
+THRESHOLD = 2
+
+CLOCKS = {"ticks": TICKS, "distance": DISTANCE, "threshold": THRESHOLD}
+
+# Character name -> character table
+CHARACTERS = {}
+
+def register_character(name, table):
+    """Add (or replace) character (name), described by (table)"""
+    CHARACTERS[name] = table
+    shared_cache.forget_built(("animations", name))
+
+def get_animation_set(name, frame_cache=shared_cache):
+    """The AnimationSet for character (name), built the first time
+       it's asked for and shared by every actor after that. It's
+       kept in (frame_cache) with the frames it uses, so unloading
+       the character's sheet drops it too and the next ask builds
+       it again.
+    """
+    table = CHARACTERS[name]
+    return frame_cache.get_built(table["sheet"], ("animations", name),
+                                 lambda: AnimationSet(table, frame_cache))
+
+class AnimationSet(object):
+    """Every frame of one character, ready to look up.
+
+       INSTANCE VARIABLES:
+       frames :
+          frames[state][direction] is the tuple of Surfaces for
+          that state facing that way
+       clocks :
+          clocks[state] is the clock type picking the state's frame
+       steps :
+          steps[state] is the ticks or pixels per frame
+       thresholds :
+          thresholds[state] is the bucket boundaries for threshold
+          clocks (empty for the others)
+       loops :
+          loops[state] is whether a ticks animation repeats
+       durations :
+          durations[state] is how many ticks a non-looping
+          animation plays for (0 for the others)
+       hitboxes / hurtboxes :
+          hitboxes[state][direction][n] is the tuple of (x, y,
+          width, height) boxes frame n of that state attacks with /
+          can be hit in, facing that way
+       attacks :
+          attacks[state] is the combat.Attack the state's hitboxes
+          do, or None
+       projectiles :
+          projectiles[state] is (kind, points, speed, life) for the
+          projectile the state fires, points[direction] being the
+          (x, y) in the frame it's launched from facing that way, or
+          None
+    """
+
+    def __init__(self, table, frame_cache=shared_cache):
+        sheet = table["sheet"]
+        width, height = table["frame_size"]
+        row = table.get("row", 0)
+
+        count = len(STATE_NAMES)
+        self.frames = [None] * count
+        self.clocks = [TICKS] * count
+        self.steps = [1] * count
+        self.thresholds = [()] * count
+        self.loops = [True] * count
+        self.durations = [0] * count
+        self.hitboxes = [None] * count
+        self.hurtboxes = [None] * count
+        self.attacks = [None] * count
+        self.projectiles = [None] * count
+
+        body = table.get("hurtboxes", ())
+
+        states = table["states"]
+        for state, name in enumerate(STATE_NAMES):
+            if name not in states:
+                continue
+            entry = states[name]
+            right = []
+            left = []
+            for number in entry["frames"]:
+                rect = (number * width, row, width, height)
+                right.append(frame_cache.get_frame(sheet, rect))
+                left.append(frame_cache.get_frame(sheet, rect, flip=True))
+            self.frames[state] = (tuple(right), tuple(left))
+
+            frame_count = len(right)
+            hitboxes = entry.get("hitboxes", [()] * frame_count)
+            hurtboxes = entry.get("hurtboxes", [body] * frame_count)
+            for boxes in (hitboxes, hurtboxes):
+                if len(boxes) != frame_count:
+                    raise ValueError("%s: %d frames need %d lists of boxes, got %d"
+                                     % (name, frame_count, frame_count, len(boxes)))
+            self.hitboxes[state] = self.mirror_boxes(hitboxes, width)
+            self.hurtboxes[state] = self.mirror_boxes(hurtboxes, width)
+            if "hitboxes" in entry:
+                knockX, knockY = entry.get("knockback", (0, 0))
+                self.attacks[state] = Attack(entry.get("damage", 0), knockX, knockY,
+                                             entry.get("priority", 0))
+            if "projectile" in entry:
+                shot = entry["projectile"]
+                x, y = shot["at"]
+                self.projectiles[state] = (shot["kind"], ((x, y), (width - x, y)),
+                                           shot["speed"], shot.get("life", 60))
+
+            self.clocks[state] = CLOCKS[entry.get("clock", "ticks")]
+            self.steps[state] = entry.get("step", 1)
+            self.thresholds[state] = tuple(entry.get("thresholds", ()))
+            self.loops[state] = entry.get("loop", True)
+            if not self.loops[state]:
+                self.durations[state] = len(right) * self.steps[state]
+
+            if self.clocks[state] == THRESHOLD and \
+                    len(self.thresholds[state]) != len(right) - 1:
+                raise ValueError("%s: %d frames need %d thresholds, got %r"
+                                 % (name, len(right), len(right) - 1,
+                                    self.thresholds[state]))
+
+        if self.frames[IDLE] is None:
+            raise ValueError("character table has no idle state")
+
+        # Fill in left out states from the ones that stand in for
+        #   them, so lookups never have to check
+        for state, name in enumerate(STATE_NAMES):
+            stand_in = name
+            while self.frames[state] is None and FALLBACKS[stand_in] is not None:
+                stand_in = FALLBACKS[stand_in]
+                other = STATE_NAMES.index(stand_in)
+                self.frames[state] = self.frames[other]
+                self.clocks[state] = self.clocks[other]
+                self.steps[state] = self.steps[other]
+                self.thresholds[state] = self.thresholds[other]
+                self.loops[state] = self.loops[other]
+                self.hitboxes[state] = self.hitboxes[other]
+                self.hurtboxes[state] = self.hurtboxes[other]
+                self.attacks[state] = self.attacks[other]
+                self.projectiles[state] = self.projectiles[other]
+
+    @staticmethod
+    def mirror_boxes(frames, width):
+        """(frames) (a list of box lists, one per frame) as a pair of
+           tuples: facing right as given, and facing left (flipped
+           within a frame (width) pixels wide)
+        """
+        right = []
+        left = []
+        for boxes in frames:
+            right.append(tuple((x, y, w, h) for x, y, w, h in boxes))
+            left.append(tuple((width - x - w, y, w, h) for x, y, w, h in boxes))
+        return (tuple(right), tuple(left))
+
+    def has(self, state):
+        return self.frames[state] is not None
+
+    def index(self, state, value):
+        """Which of (state)'s frames to show, where (value) is the
+           ticks the state has played, the actor's x position, or
+           the thresholded value, depending on the state's clock
+        """
+        clock = self.clocks[state]
+        if clock == THRESHOLD:
+            return bisect_right(self.thresholds[state], value)
+
+        bucket = int(value // self.steps[state])
+        count = len(self.frames[state][RIGHT])
+        if clock == TICKS and not self.loops[state]:
+            return min(bucket, count - 1)
+        return bucket % count
+
+    def frame(self, state, direction, value):
+        """The Surface for (state) facing (direction) (RIGHT or
+           LEFT), with (value) as for index()
+        """
+        return self.frames[state][direction][self.index(state, value)]
+
+class Animator(object):
+    """Animation state of one actor.
+
+       INSTANCE VARIABLES:
+       animations :
+          The actor's (shared) AnimationSet
+       state :
+          State shown last frame
+       ticks :
+          Number of frames (state) has been shown for, minus one
+       index / direction :
+          Frame of (state) and facing direction shown last frame
+    """
+
+    def __init__(self, animations):
+        self.animations = animations
+        self.state = IDLE
+        self.ticks = 0
+        self.index = 0
+        self.direction = RIGHT
+
+    def restart(self):
+        """Play the next state from its first frame, even if it's
+           the state already showing (e.g. a second attack)
+        """
+        self.state = -1
+
+    def play(self, state, direction, value=None, frames=1):
+        """Show (state) for the next (frames) frames and return its
+           image. (value) is passed on to AnimationSet.frame(); ticks
+           clocks use the Animator's own tick count.
+        """
+        animations = self.animations
+
+        # Standing after a fall plays the landing animation first
+        #   (if the character has one)
+        if state == IDLE and animations.frames[LAND] is not None:
+            if self.state == FALL or \
+                    (self.state == LAND and self.ticks + frames < animations.durations[LAND]):
+                state = LAND
+
+        if state == self.state:
+            self.ticks += frames
+        else:
+            self.state = state
+            self.ticks = 0
+
+        if value is None or animations.clocks[state] == TICKS:
+            value = self.ticks
+        self.index = animations.index(state, value)
+        self.direction = DIRECTIONS[direction]
+        return animations.frames[state][self.direction][self.index]
+
+    def hitboxes(self):
+        """Boxes the frame shown last attacks with (see AnimationSet)"""
+        return self.animations.hitboxes[self.state][self.direction][self.index]
+
+    def hurtboxes(self):
+        """Boxes the frame shown last can be hit in"""
+        return self.animations.hurtboxes[self.state][self.direction][self.index]
+
+    # Number of slots save_state() fills
+    STATE_SIZE = 4
+
+    def save_state(self, buf, offset):
+        """Write the animation state into (buf) at (offset). Which
+           frame is showing decides where the actor's boxes are, so
+           it has to roll back with everything else.
+        """
+        buf[offset] = self.state
+        buf[offset + 1] = self.ticks
+        buf[offset + 2] = self.index
+        buf[offset + 3] = self.direction
+
+    def load_state(self, buf, offset):
+        """Restore the state save_state() wrote at (offset)"""
+        self.state = int(buf[offset])
+        self.ticks = buf[offset + 1]
+        self.index = int(buf[offset + 2])
+        self.direction = int(buf[offset + 3])
@@ -0,0 +1,210 @@
+"""Module for prebuilt asset bundles: every sprite frame the
+   characters use, already cut out of its sheet and flipped, packed
+   into one file that loads with a single read.
+
+   Without a bundle, the first Player() decodes its sprite sheet,
+   checks it for partial alpha, flips it and cuts out every frame
+   before the first frame can be drawn. A bundle is built once,
+   offline (e.g. as a release step):
+
+      python asset_bundle.py [--out FILE] [character ...]
+
+   and the game hands it to load_bundle() at startup, which puts
+   every frame straight into the frame cache. Building a
+   character's AnimationSet then finds all of its frames there and
+   never touches the sheet. Frames missing from the bundle (a
+   character added since it was built, say) are still cut from the
+   sheet as usual.
+
+   Bundle file format (little-endian):
+      header : 4s magic "NVAB", B version, I length of the index
+      index  : JSON (utf-8) list of atlases, one per sheet, each
+               with:
+                  sheet  : path of the sheet the frames were cut from
+                  source : [size, mtime] of the sheet file when the
+                           bundle was built (bundles older than
+                           their sheets aren't loaded)
+                  alpha  : whether the sheet has per-pixel alpha
+                           (pixels are then RGBA, otherwise RGB)
+                  size   : [width, height] of the atlas
+                  offset : where its pixels start, counting from the
+                           end of the index
+                  frames : [x, y, width, height, flip, colorkey,
+                           atlas x, atlas y] per frame, the first
+                           six being its frame cache key
+      pixels : the atlases' pixel rows, back to back
+"""
+import json
+import os
+import struct
+
+import pygame
+
+import constants
+from frame_cache import shared_cache
+
+MAGIC = b"NVAB"
+VERSION = 1
+
+HEADER = struct.Struct("<4sBI")
+
+# Widest an atlas gets before frames wrap onto the next row
+ATLAS_WIDTH = 1024
+
+def source_stamp(path):
+    """[size, mtime] of the file at (path)"""
+    stat = os.stat(path)
+    return [stat.st_size, int(stat.st_mtime)]
+
+def pack(sizes, width=ATLAS_WIDTH):
+    """Place rectangles of (sizes) left to right in rows at most
+       (width) wide. Returns ([(x, y)] per rectangle, atlas width,
+       atlas height).
+    """
+    x = y = row_height = used_width = 0
+    positions = []
+    for w, h in sizes:
+        if x and x + w > width:
+            x = 0
+            y += row_height
+            row_height = 0
+        positions.append((x, y))
+        x += w
+        row_height = max(row_height, h)
+        used_width = max(used_width, x)
+    return positions, used_width, y + row_height
+
+def build_bundle(path=constants.ASSET_BUNDLE, names=None):
+    """Cut every frame of the characters called (names) (every
+       registered character by default) and write them to a bundle
+       at (path). Returns the number of frames written.
+    """
+    # Imported here, as only building needs the character tables
+    import animation
+    import characters
+    from frame_cache import FrameCache
+
+    if names is None:
+        names = sorted(animation.CHARACTERS)
+    cache = FrameCache()
+    for name in names:
+        animation.AnimationSet(animation.CHARACTERS[name], cache)
+
+    by_sheet = {}
+    for key, frame in cache.frames.items():
+        by_sheet.setdefault(key[0], []).append((key, frame))
+
+    index = []
+    chunks = []
+    offset = 0
+    count = 0
+    for sheet_path in sorted(by_sheet):
+        alpha = cache.sheets[sheet_path].alpha
+        pixel_format = "RGBA" if alpha else "RGB"
+        depth = len(pixel_format)
+        frames = sorted(by_sheet[sheet_path],
+                        key=lambda item: (item[0][1], item[0][2], repr(item[0][3])))
+        positions, width, height = pack([frame.get_size() for key, frame in frames])
+
+        # Copy each frame's rows into place (rather than blitting,
+        #   so alpha comes through exactly as it is in the sheet)
+        pixels = bytearray(width * height * depth)
+        entries = []
+        for (key, frame), (atlas_x, atlas_y) in zip(frames, positions):
+            x, y, w, h = key[1]
+            flip, colorkey = key[2], key[3]
+            data = pygame.image.tostring(frame, pixel_format)
+            row = w * depth
+            for n in range(h):
+                start = ((atlas_y + n) * width + atlas_x) * depth
+                pixels[start:start + row] = data[n * row:(n + 1) * row]
+            entries.append([x, y, w, h, flip,
+                            list(colorkey) if colorkey is not None else None,
+                            atlas_x, atlas_y])
+
+        index.append({"sheet": sheet_path, "source": source_stamp(sheet_path),
+                      "alpha": alpha, "size": [width, height], "offset": offset,
+                      "frames": entries})
+        chunks.append(bytes(pixels))
+        offset += len(pixels)
+        count += len(entries)
+
+    index_data = json.dumps(index, sort_keys=True).encode("utf-8")
+    with open(path, "wb") as bundle_file:
+        bundle_file.write(HEADER.pack(MAGIC, VERSION, len(index_data)))
+        bundle_file.write(index_data)
+        for chunk in chunks:
+            bundle_file.write(chunk)
+    return count
+
+def load_bundle(path=constants.ASSET_BUNDLE, frame_cache=shared_cache):
+    """Put every frame of the bundle at (path) into (frame_cache).
+       Call it after the display is set up, so the atlases get
+       converted to its pixel format. Returns the number of frames
+       loaded: 0 if there's no bundle, it's from another version, or
+       any of its sheets has changed since it was built.
+    """
+    try:
+        with open(path, "rb") as bundle_file:
+            data = bundle_file.read()
+    except IOError:
+        return 0
+
+    if len(data) < HEADER.size:
+        return 0
+    magic, version, index_length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        return 0
+    start = HEADER.size + index_length
+    index = json.loads(data[HEADER.size:start].decode("utf-8"))
+
+    for atlas in index:
+        sheet_path = atlas["sheet"]
+        if os.path.exists(sheet_path) and source_stamp(sheet_path) != atlas["source"]:
+            return 0
+
+    display = pygame.display.get_surface() is not None
+    view = memoryview(data)
+    count = 0
+    for atlas in index:
+        alpha = atlas["alpha"]
+        pixel_format = "RGBA" if alpha else "RGB"
+        size = tuple(atlas["size"])
+        offset = start + atlas["offset"]
+        length = size[0] * size[1] * len(pixel_format)
+
+        # One Surface per atlas, converted once, with every frame a
+        #   subsurface view into it (like SpriteSheet's subsurface
+        #   mode)
+        image = pygame.image.frombuffer(view[offset:offset + length], size, pixel_format)
+        if display:
+            image = image.convert_alpha() if alpha else image.convert()
+        else:
+            image = image.copy()
+
+        sheet_path = atlas["sheet"]
+        for x, y, w, h, flip, colorkey, atlas_x, atlas_y in atlas["frames"]:
+            frame = image.subsurface((atlas_x, atlas_y, w, h))
+            if colorkey is not None:
+                colorkey = tuple(colorkey)
+                if not alpha:
+                    frame.set_colorkey(colorkey, pygame.RLEACCEL)
+            frame_cache.add_frame(sheet_path, (x, y, w, h), flip, colorkey, frame)
+            count += 1
+    return count
+
+if __name__ == "__main__":
+    import argparse
+
+    from simulation import init_headless
+
+    parser = argparse.ArgumentParser(description="Build the prebuilt sprite bundle")
+    parser.add_argument("characters", nargs="*",
+                        help="characters to bundle (default: all of them)")
+    parser.add_argument("--out", default=constants.ASSET_BUNDLE,
+                        help="bundle file to write")
+    args = parser.parse_args()
+
+    init_headless()
+    count = build_bundle(args.out, args.characters or None)
+    print("Wrote %d frames to %s (%d bytes)" % (count, args.out, os.path.getsize(args.out)))
@@ -0,0 +1,206 @@
+"""Module for simulating many simple physical bodies at once.
+
+   Instead of one Sprite per object doing its own gravity and
+   collision in Python, BodyBatch keeps every body's position,
+   velocity and size in NumPy arrays and moves them all with a few
+   vectorized passes per step, following the same rules as
+   Player.update: gravity, move on x and stop at walls, then move
+   on y and land on platforms or bump heads on their undersides.
+   Moves are swept like the PhysWorld's, so bodies can't pass
+   through platforms however fast they go.
+
+   Requires NumPy.
+"""
+import numpy
+
+from phys_object import Player
+
+class BodyBatch(object):
+    """Struct-of-arrays store for up to (capacity) axis-aligned
+       bodies.
+
+       INSTANCE VARIABLES:
+       count :
+          Number of bodies in use (indices 0..count-1)
+       x, y, width, height :
+          Top-left corner and size of each body
+       deltaX, deltaY :
+          Velocity of each body, in pixels per step
+       grounded :
+          Whether each body landed on a platform last step
+
+       gravity_force and bump_force default to the Player's gravity
+       and the speed Player.stop_rising adds after a head bump.
+    """
+
+    def __init__(self, capacity, gravity_force=Player.gravity_force,
+                 bump_force=-0.5 * Player.jump_force):
+        self.capacity = capacity
+        self.count = 0
+        self.gravity_force = gravity_force
+        self.bump_force = bump_force
+
+        self.x = numpy.zeros(capacity)
+        self.y = numpy.zeros(capacity)
+        self.width = numpy.zeros(capacity)
+        self.height = numpy.zeros(capacity)
+        self.deltaX = numpy.zeros(capacity)
+        self.deltaY = numpy.zeros(capacity)
+        self.grounded = numpy.zeros(capacity, dtype=bool)
+
+    def add(self, x, y, width, height, deltaX=0, deltaY=0):
+        """Add a body and return its index"""
+        if self.count == self.capacity:
+            raise IndexError("BodyBatch is full (%d bodies)" % self.capacity)
+
+        n = self.count
+        self.x[n] = x
+        self.y[n] = y
+        self.width[n] = width
+        self.height[n] = height
+        self.deltaX[n] = deltaX
+        self.deltaY[n] = deltaY
+        self.grounded[n] = False
+        self.count += 1
+        return n
+
+    def remove(self, n):
+        """Remove body (n) by moving the last body into its slot.
+           Returns the old index of the body that moved (or None).
+        """
+        last = self.count - 1
+        for field in (self.x, self.y, self.width, self.height,
+                      self.deltaX, self.deltaY, self.grounded):
+            field[n] = field[last]
+        self.count = last
+        return last if last != n else None
+
+    def step(self, platforms, frames=1):
+        """Advance every body one step of (frames) frames against
+           (platforms), an (M, 4) array of platform left, top, right,
+           bottom edges (see PlatformArray)
+        """
+        n = self.count
+        if n == 0:
+            return
+
+        x = self.x[:n]
+        y = self.y[:n]
+        width = self.width[:n]
+        height = self.height[:n]
+        deltaX = self.deltaX[:n]
+        deltaY = self.deltaY[:n]
+
+        # Calculate and apply gravity (same rule as
+        #   Player.calc_grav: a body at rest starts falling at 1,
+        #   and several frames fall as far as they would one by one)
+        first = deltaY + self.gravity_force
+        first[deltaY == 0] = 1
+        fall = frames * first + self.gravity_force * frames * (frames - 1) / 2.0
+        deltaY[:] = first + (frames - 1) * self.gravity_force
+
+        left = platforms[:, 0]
+        top = platforms[:, 1]
+        right = platforms[:, 2]
+        bottom = platforms[:, 3]
+
+        # Move left/right (apply deltaX)
+        start = x.copy()
+        x += deltaX * frames
+
+        # Check for collisions (x-axis): every body against every
+        #   platform at once, as an (N, M) table of platforms
+        #   overlapped or passed through on the way
+        hits = (self.overlaps(x, y, width, height, left, top, right, bottom) |
+                (self.swept(start, x, width, left, right) &
+                 self.spans(y, height, top, bottom)))
+        hit_any = hits.any(axis=1)
+        if hit_any.any():
+            # Moving right: stop at the nearest platform's left side
+            moving = hit_any & (deltaX > 0)
+            if moving.any():
+                edge = numpy.where(hits[moving], left, numpy.inf).min(axis=1)
+                x[moving] = edge - width[moving]
+
+            # Moving left: stop at the nearest platform's right side
+            moving = hit_any & (deltaX < 0)
+            if moving.any():
+                edge = numpy.where(hits[moving], right, -numpy.inf).max(axis=1)
+                x[moving] = edge
+
+        # Move up/down (apply deltaY)
+        start = y.copy()
+        y += fall
+
+        # Check for collisions (y-axis)
+        hits = (self.overlaps(x, y, width, height, left, top, right, bottom) |
+                (self.swept(start, y, height, top, bottom) &
+                 self.spans(x, width, left, right)))
+        hit_any = hits.any(axis=1)
+        landed = hit_any & (fall > 0)
+        if landed.any():
+            # Falling: land on top of the highest platform hit
+            edge = numpy.where(hits[landed], top, numpy.inf).min(axis=1)
+            y[landed] = edge - height[landed]
+            deltaY[landed] = 0
+
+        bumped = hit_any & (fall < 0)
+        if bumped.any():
+            # Rising: bump heads on the lowest platform hit and
+            #   start falling sooner
+            edge = numpy.where(hits[bumped], bottom, -numpy.inf).max(axis=1)
+            y[bumped] = edge
+            deltaY[bumped] += self.bump_force
+
+        self.grounded[:n] = landed
+
+    @staticmethod
+    def overlaps(x, y, width, height, left, top, right, bottom):
+        """(N, M) table of which bodies overlap which platforms"""
+        return ((x[:, None] < right) & (x[:, None] + width[:, None] > left) &
+                (y[:, None] < bottom) & (y[:, None] + height[:, None] > top))
+
+    @staticmethod
+    def spans(position, size, near, far):
+        """(N, M) table of which bodies overlap which platforms
+           along one axis
+        """
+        return (position[:, None] < far) & (position[:, None] + size[:, None] > near)
+
+    @staticmethod
+    def swept(start, end, size, near, far):
+        """(N, M) table of which platform edges each body's leading
+           edge crossed moving along one axis from (start) to (end)
+        """
+        forward = (end > start)[:, None]
+        ahead = (near >= (start + size)[:, None]) & (near < (end + size)[:, None])
+        behind = (far <= start[:, None]) & (far > end[:, None])
+        return numpy.where(forward, ahead, behind)
+
+class PlatformArray(object):
+    """A level's platforms as an (M, 4) array of left, top, right,
+       bottom edges, rebuilt only when the level's platform list
+       changes. With (static_only), moving platforms are left out,
+       and the array is only rebuilt when platforms are added or
+       removed.
+    """
+
+    def __init__(self, level, static_only=False):
+        self.level = level
+        self.static_only = static_only
+        self.version = None
+        self.edges = numpy.zeros((0, 4))
+
+    def get(self):
+        platform_list = self.level.platform_list
+        if self.static_only:
+            version = platform_list.members_version
+        else:
+            version = platform_list.version
+        if self.version != version:
+            self.edges = numpy.array(
+                [(p.rect.left, p.rect.top, p.rect.right, p.rect.bottom)
+                 for p in platform_list
+                 if p.static or not self.static_only], dtype=float).reshape(-1, 4)
+            self.version = version
+        return self.edges
@@ -0,0 +1,40 @@
+"""Module for the camera that scrolls play levels wider than the
+   screen, by moving the level's world_shift to follow a target
+"""
+import constants
+
+class Camera(object):
+    """Scrolls (level) to keep a target sprite between the scroll
+       bounds, never showing past either end of the level.
+
+       Everything in a level lives in world coordinates; the screen
+       position of something is its world position plus
+       level.world_shift (which is 0 or negative).
+    """
+
+    def __init__(self, level, left_bound=constants.SCROLL_LEFT_BOUND,
+                 right_bound=constants.SCROLL_RIGHT_BOUND):
+        self.level = level
+        self.left_bound = left_bound
+        self.right_bound = right_bound
+
+    def follow(self, target):
+        """Scroll so (target)'s rect is inside the scroll bounds"""
+        level = self.level
+        shift = level.world_shift
+        rect = target.rect
+
+        # If the target moves past a bound, shift the world
+        #   the other way by the same amount
+        if rect.right + shift > self.right_bound:
+            shift = self.right_bound - rect.right
+        elif rect.left + shift < self.left_bound:
+            shift = self.left_bound - rect.left
+
+        # Don't scroll past either end of the level
+        if shift < level.level_limit:
+            shift = level.level_limit
+        if shift > 0:
+            shift = 0
+
+        level.world_shift = shift
@@ -0,0 +1,43 @@
+"""Module of character animation tables (see the animation module for
+   the format). New characters are added by registering another
+   table here; Player picks one by name.
+"""
+import animation
+import constants
+
+# -------- Test player character --------
+# 120x114 frames along the top of the sprite sheet
+NOV2015 = {
+    "sheet": constants.PLAYER_SPRITESHEET,
+    "frame_size": [120, 114],
+    # Head and shoulders, then hips and legs
+    "hurtboxes": [[40, 25, 40, 36], [30, 61, 56, 53]],
+    "states": {
+        "idle": {"frames": [0]},
+        # Running frames change every 30 pixels travelled
+        "run": {"frames": [2, 3, 4, 5, 6, 7], "clock": "distance", "step": 30},
+        "rise": {"frames": [8]},
+        # Falling frames change with falling speed
+        "fall": {"frames": [9, 10, 11], "clock": "threshold",
+                 "thresholds": [1.6, 3.3]},
+        # Crouch for a few frames on landing
+        "land": {"frames": [1], "step": 4, "loop": False},
+        # Sword slash: wind up, then the blade sweeps forward and
+        #   low over two frames, then follow through. Throws a bolt
+        #   forward from sword height as it starts
+        "attack": {"frames": [17, 18, 19, 20], "step": 4, "loop": False,
+                   "hitboxes": [[],
+                                [[84, 42, 36, 18], [70, 58, 32, 20]],
+                                [[56, 72, 40, 14]],
+                                []],
+                   "hurtboxes": [[[30, 32, 44, 82]],
+                                 [[40, 42, 42, 72]],
+                                 [[40, 49, 42, 65]],
+                                 [[44, 53, 40, 61]]],
+                   "damage": 8, "knockback": [4, -6], "priority": 1,
+                   "projectile": {"kind": 0, "at": [110, 60], "speed": 8}},
+        "hurt": {"frames": [13]},
+    },
+}
+
+animation.register_character("nov2015", NOV2015)
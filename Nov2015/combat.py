@@ -0,0 +1,253 @@
+"""Module for combat: working out which attacks hit whom each sim
+   step, and what that does.
+
+   Everything that takes part (fighters and projectiles) hands over
+   boxes in world coordinates: hitboxes that attack and hurtboxes
+   that can be attacked. A fighter's boxes come from the animation
+   frame it's showing, so several per frame is normal.
+
+   Finding overlaps is a sort-and-sweep: every box of every
+   combatant goes in one list sorted by left edge, then a single
+   pass keeps the boxes whose x-interval is still open and only
+   tests a new box against those. Only hitboxes are tested against
+   anything (hurtboxes never need testing against each other), so
+   the cost grows with the overlaps along x rather than with the
+   number of pairs of boxes.
+
+   What overlaps is then resolved by these rules:
+      - Hitboxes of two different owners meeting clank: equal
+        priority cancels both attacks, otherwise the higher
+        priority attack carries on and the other is cancelled.
+        Cancelled attacks hit nothing else.
+      - A hitbox on another owner's hurtbox is a hit, at most one
+        per attack per victim. Hits found on the same step all
+        land, so two fighters hitting each other trade.
+      - A hit freezes attacker and victim for a moment (hit-stop),
+        longer for harder hits, then the victim flies off and
+        can't act for a while (hitstun). Knockback grows with the
+        damage the victim has taken.
+"""
+
+# -------- Box kinds --------
+HIT = 0
+HURT = 1
+
+# Frames of hit-stop every hit / clank gets, plus more for damage
+HITSTOP_BASE = 3
+HITSTOP_PER_DAMAGE = 1 / 3.0
+CLANK_HITSTOP = 6
+
+# Extra knockback per point of damage the victim has taken
+KNOCKBACK_GROWTH = 0.01
+
+# Frames of hitstun every hit gets, plus more for knockback speed
+HITSTUN_BASE = 10
+HITSTUN_PER_KNOCKBACK = 2
+
+# hit_mask of an attack that can't hit anything any more
+SPENT = -1
+
+class Attack(object):
+    """What an attack's hitboxes do.
+
+       INSTANCE VARIABLES:
+       damage :
+          Damage added to the victim
+       knockX, knockY :
+          Base knockback speed; knockX points away from the attacker
+       priority :
+          Which attack wins when hitboxes meet (higher wins, equal
+          clanks)
+    """
+    __slots__ = ("damage", "knockX", "knockY", "priority")
+
+    def __init__(self, damage, knockX, knockY, priority=0):
+        self.damage = damage
+        self.knockX = knockX
+        self.knockY = knockY
+        self.priority = priority
+
+    def __repr__(self):
+        return "Attack(%r, %r, %r, %r)" % (self.damage, self.knockX,
+                                           self.knockY, self.priority)
+
+def world_boxes(boxes, x, y, out):
+    """Append (boxes) ((x, y, width, height) in a frame) to (out) as
+       (left, top, right, bottom) for a frame drawn at (x, y)
+    """
+    for left, top, width, height in boxes:
+        left += x
+        top += y
+        out.append((left, top, left + width, top + height))
+
+def overlap_center(box, other):
+    """Middle of the overlap of two overlapping boxes"""
+    return ((max(box[0], other[0]) + min(box[2], other[2])) // 2,
+            (max(box[1], other[1]) + min(box[3], other[3])) // 2)
+
+def sweep(boxes):
+    """Sort-and-sweep (boxes), a list of (left, top, right, bottom,
+       combatant, owner, kind) tuples. Returns (clanks, hits): lists
+       of (box, box) for hitboxes meeting hitboxes and hitboxes on
+       hurtboxes (hitbox first), never pairing an owner's own boxes.
+    """
+    boxes.sort(key=lambda box: box[0])
+
+    open_hits = []
+    open_hurts = []
+    clanks = []
+    hits = []
+    for box in boxes:
+        left, top, right, bottom, combatant, owner, kind = box
+
+        # Close the intervals that ended before this one starts
+        if open_hits:
+            open_hits = [other for other in open_hits if other[2] > left]
+        if open_hurts:
+            open_hurts = [other for other in open_hurts if other[2] > left]
+
+        # Every open interval overlaps this one along x, so only y
+        #   is left to test
+        for other in open_hits:
+            if other[5] is not owner and other[1] < bottom and other[3] > top:
+                if kind == HIT:
+                    clanks.append((other, box))
+                else:
+                    hits.append((other, box))
+
+        if kind == HIT:
+            for other in open_hurts:
+                if other[5] is not owner and other[1] < bottom and other[3] > top:
+                    hits.append((box, other))
+            open_hits.append(box)
+        else:
+            open_hurts.append(box)
+    return clanks, hits
+
+class CombatWorld(object):
+    """Combat between the fighters and projectiles of one sim.
+
+       Fighters (e.g. Players) provide:
+          hitboxes(out) / hurtboxes(out) : append their boxes in
+             world coordinates to (out)
+          attack_data() : the Attack their hitboxes do
+          hit_mask : fighter_bit()s of the fighters the current
+             attack has hit (SPENT once it can't hit anything)
+          damage : damage taken so far
+          facing() : 1 facing right, -1 facing left
+          take_hit(damage, knockX, knockY, hitstun, hitstop) :
+             react to being hit
+          hit_landed(hitstop) / clank(hitstop) : react to their
+             attack hitting / clanking
+
+       Projectiles come from pools (see particles.ProjectilePool)
+       that append their hitboxes to the sweep themselves. Each one
+       provides the same as a fighter, minus the boxes, damage and
+       take_hit, plus its owner: the fighter that fired it, which it
+       can't hit or clank with.
+
+       INSTANCE VARIABLES:
+       fighters :
+          List of fighters, each with its own bit for hit_masks
+       pools :
+          List of projectile pools
+       hits / clanks :
+          (attacker, victim, x, y) / (attacker, attacker, x, y)
+          from the last step, (x, y) being the middle of where the
+          boxes overlapped, for the game or telemetry to react to
+    """
+
+    def __init__(self):
+        self.fighters = []
+        self.bits = {}
+        self.pools = []
+        self.hits = []
+        self.clanks = []
+
+        # Fighters in rough left-to-right order, so their boxes go
+        #   into the sweep nearly sorted already
+        self.order = []
+
+    def add_fighter(self, fighter):
+        if fighter not in self.bits:
+            self.bits[fighter] = 1 << len(self.fighters)
+            self.fighters.append(fighter)
+            self.order.append(fighter)
+
+    def add_pool(self, pool):
+        """Let the projectiles in (pool) take part"""
+        pool.fighters = self.fighters
+        self.pools.append(pool)
+
+    def fighter_bit(self, fighter):
+        return self.bits[fighter]
+
+    def gather(self):
+        """Every box of every combatant, for sweep()"""
+        self.order.sort(key=lambda fighter: fighter.rect.left)
+
+        boxes = []
+        found = []
+        for fighter in self.order:
+            if fighter.hit_mask != SPENT:
+                fighter.hitboxes(found)
+                for left, top, right, bottom in found:
+                    boxes.append((left, top, right, bottom, fighter, fighter, HIT))
+                del found[:]
+            fighter.hurtboxes(found)
+            for left, top, right, bottom in found:
+                boxes.append((left, top, right, bottom, fighter, fighter, HURT))
+            del found[:]
+
+        for pool in self.pools:
+            pool.combat_boxes(boxes)
+        return boxes
+
+    def step(self):
+        """Find and resolve this step's clanks and hits"""
+        hits = self.hits
+        del hits[:]
+        del self.clanks[:]
+
+        # A lone fighter (and its projectiles) has nobody to hit
+        if len(self.fighters) < 2:
+            return
+
+        clanks, contacts = sweep(self.gather())
+
+        # Clanks first, so cancelled attacks don't hit anything
+        for box, other in clanks:
+            first = box[4]
+            second = other[4]
+            if first.hit_mask == SPENT or second.hit_mask == SPENT:
+                continue
+            difference = first.attack_data().priority - second.attack_data().priority
+            x, y = overlap_center(box, other)
+            self.clanks.append((first, second, x, y))
+            if difference <= 0:
+                first.clank(CLANK_HITSTOP)
+            if difference >= 0:
+                second.clank(CLANK_HITSTOP)
+
+        # Work out every hit before applying any, so a hit can't
+        #   cancel an attack that landed on the same step
+        for hitbox, hurtbox in contacts:
+            attacker = hitbox[4]
+            victim = hurtbox[4]
+            bit = self.bits[victim]
+            if attacker.hit_mask == SPENT or attacker.hit_mask & bit:
+                continue
+            attacker.hit_mask |= bit
+            x, y = overlap_center(hitbox, hurtbox)
+            hits.append((attacker, victim, x, y))
+
+        for attacker, victim, x, y in hits:
+            attack = attacker.attack_data()
+            hitstop = HITSTOP_BASE + int(attack.damage * HITSTOP_PER_DAMAGE)
+            damage = victim.damage + attack.damage
+            scale = 1 + damage * KNOCKBACK_GROWTH
+            knockX = attack.knockX * scale * attacker.facing()
+            knockY = attack.knockY * scale
+            hitstun = HITSTUN_BASE + int((abs(knockX) + abs(knockY)) * HITSTUN_PER_KNOCKBACK)
+            victim.take_hit(attack.damage, knockX, knockY, hitstun, hitstop)
+            attacker.hit_landed(hitstop)
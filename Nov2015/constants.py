@@ -1,23 +1,130 @@
-"""
-Global constants
-"""
-
-# Target frame rate
-TARGET_FRAME_RATE = 60
-
-# Colors
-BLACK    = (   0,   0,   0)
-BLUE     = (   0,   0, 255)
-CYAN     = (   0, 255, 255)
-GREEN    = (   0, 255,   0)
-PURPLE   = ( 255,   0, 255)
-RED      = ( 255,   0,   0)
-WHITE    = ( 255, 255, 255)
-YELLOW   = ( 255, 255,   0)
-
-# Screen dimensions
-SCREEN_WIDTH  = 800
-SCREEN_HEIGHT = 600
-
-# Game window caption
-WINDOW_CAPTION = "Nov 2015 Platformer Test"
\ No newline at end of file
+"""
+Global constants
+"""
+
+# Target frame rate
+TARGET_FRAME_RATE = 60
+
+# Colors
+BLACK    = (   0,   0,   0)
+BLUE     = (   0,   0, 255)
+CYAN     = (   0, 255, 255)
+GREEN    = (   0, 255,   0)
+PURPLE   = ( 255,   0, 255)
+RED      = ( 255,   0,   0)
+WHITE    = ( 255, 255, 255)
+YELLOW   = ( 255, 255,   0)
+
+# Screen dimensions: the logical resolution, i.e. how much of the
+#   world the camera shows. Everything in the game (physics, camera,
+#   stage layouts, drawing) works in these coordinates, whatever
+#   the window and render target below are
+SCREEN_WIDTH  = 800
+SCREEN_HEIGHT = 600
+
+# Window size
+WINDOW_WIDTH  = SCREEN_WIDTH
+WINDOW_HEIGHT = SCREEN_HEIGHT
+
+# Size of the internal render target the game draws into, which
+#   is then scaled to the window once per frame (see render_target),
+#   e.g. (400, 300) to draw a quarter of the pixels. None draws
+#   straight into the window, as the game always has
+RENDER_SIZE = None
+
+# Game window caption
+WINDOW_CAPTION = "Nov 2015 Platformer Test"
+
+# Fixed simulation timestep (seconds per physics step)
+SIM_TIMESTEP = 1.0 / TARGET_FRAME_RATE
+
+# Longest real-time frame the fixed-timestep loop will try to
+#   catch up on (prevents a "spiral of death" after a hitch)
+MAX_FRAME_TIME = 0.25
+
+# Cell size (pixels) of the spatial hash used to index platforms
+SPATIAL_HASH_CELL_SIZE = 128
+
+# Sprite sheet for the test player character
+PLAYER_SPRITESHEET = "img/nov2015_spritesheet_2.png"
+
+# Draw only the parts of the screen that changed each frame
+#   (background restored under moved sprites) instead of
+#   redrawing and flipping the whole window
+DIRTY_RECT_RENDERING = False
+
+# Composite each play level's background and platforms into
+#   cached screen-sized tiles, baked as they come into view,
+#   instead of drawing every platform every frame
+BAKE_STATIC_LAYER = True
+
+# How many baked tiles of the static layer each level keeps
+#   (the one or two on screen plus a couple either side)
+STATIC_TILE_CACHE_SIZE = 4
+
+# Releasing jump within this many frames of pressing it
+#   cuts the jump short (short hop)
+SHORT_HOP_FRAMES = 10
+
+# Camera: the player is kept between these screen x coordinates,
+#   scrolling the world when they go past them
+SCROLL_LEFT_BOUND = 250
+SCROLL_RIGHT_BOUND = SCREEN_WIDTH - 250
+
+# Extra pixels around the screen that still count as on screen
+#   when culling what to draw and update
+CULL_MARGIN = 64
+
+# Stage files, in play order
+STAGE_FILES = ["stages/stage_01.json",
+               "stages/stage_02.json",
+               "stages/stage_03.json"]
+
+# How many read stage files the level loader keeps around
+LEVEL_CACHE_SIZE = 4
+
+# Cut sprite frames as subsurface views into their sheet instead
+#   of copying each one out
+SPRITESHEET_SUBSURFACES = True
+
+# Animation table the player character uses (see characters.py)
+PLAYER_CHARACTER = "nov2015"
+
+# Particle pools: slots for players' projectiles and for hit sparks
+PROJECTILE_POOL_SIZE = 64
+PARTICLE_POOL_SIZE = 4096
+
+# Hit sparks: how many per point of damage (and per clank), how
+#   fast (pixels per frame) and for how many frames they fly
+SPARKS_PER_DAMAGE = 25
+CLANK_SPARKS = 60
+SPARK_SPEED = 9
+SPARK_LIFE = 24
+
+# Frame pacer the main loop uses by default (see frame_pacing.py)
+FRAME_PACING = "tick"
+
+# Input bindings of each local player: action name -> list of
+#   bindings, written "key:<pygame key name>", "button:<joystick>:<button>",
+#   "hat:<joystick>:<hat>:<left/right/up/down>" or
+#   "axis:<joystick>:<axis>:<-/+>" (see controls.InputMapper)
+PLAYER_BINDINGS = [
+    {"left": ["key:K_LEFT"], "right": ["key:K_RIGHT"],
+     "jump": ["key:K_UP"], "attack": ["key:K_x"]},
+    {"left": ["key:K_a"], "right": ["key:K_d"],
+     "jump": ["key:K_w"], "attack": ["key:K_f"]},
+    {"left": ["hat:0:0:left", "axis:0:0:-"], "right": ["hat:0:0:right", "axis:0:0:+"],
+     "jump": ["button:0:0", "hat:0:0:up"], "attack": ["button:0:2"]},
+    {"left": ["hat:1:0:left", "axis:1:0:-"], "right": ["hat:1:0:right", "axis:1:0:+"],
+     "jump": ["button:1:0", "hat:1:0:up"], "attack": ["button:1:2"]},
+]
+
+# How far a stick has to be pushed (out of 1.0) to count as held
+AXIS_DEADZONE = 0.5
+
+# Sim steps of input history each player's InputBuffer keeps
+INPUT_BUFFER_SIZE = 64
+
+# Prebuilt sprite frames (see asset_bundle.py), loaded at startup
+#   if the file exists
+ASSET_BUNDLE = "img/sprites.bundle"
@@ -0,0 +1,587 @@
+"""Module for turning player input into Player method calls.
+
+   Input for one player on one sim step is packed into a small
+   integer mask of which actions were pressed and which were
+   released during that step. The same masks drive the Player
+   whether they come from the keyboard or a gamepad (InputMapper),
+   a replay file (replay.ReplayInput), the network (NetworkInput)
+   or a script, so a recorded session plays back exactly. Every
+   source has a sample(frame) that returns the masks of one step,
+   one per player, in a list it reuses.
+
+   Each PlayerController keeps its player's recent input in an
+   InputBuffer: a ring of frame-stamped masks plus, per action, when
+   it was last pressed, released and held since. Questions like
+   "pressed in the last N frames" or "held for N frames" are a
+   subtraction against those stamps rather than a search of the
+   history.
+"""
+from array import array
+
+import pygame
+
+import constants
+
+# -------- Actions --------
+LEFT = 1
+RIGHT = 2
+JUMP = 4
+ATTACK = 8
+
+# Actions in the order their presses/releases are applied
+#   within a single step
+ACTIONS = (LEFT, RIGHT, JUMP, ATTACK)
+
+# Action names (as used in bindings) -> action, and action ->
+#   its index in per-action arrays
+ACTION_NAMES = {"left": LEFT, "right": RIGHT, "jump": JUMP, "attack": ATTACK}
+ACTION_INDEX = dict((action, n) for n, action in enumerate(ACTIONS))
+
+# Bits of an input mask: the low bits mark actions pressed
+#   during the step, the bits above them actions released
+RELEASE_SHIFT = 4
+ACTION_BITS = (1 << RELEASE_SHIFT) - 1
+
+def input_mask(pressed=0, released=0):
+    """Pack (pressed) and (released) action bits into an input mask"""
+    return pressed | (released << RELEASE_SHIFT)
+
+def held_mask(held, want):
+    """Input mask that takes a player from holding action bits
+       (held) to holding (want), for bots and scripts that just say
+       what they want held
+    """
+    return (want & ~held) | ((held & ~want) << RELEASE_SHIFT)
+
+
+# Stamp of something that hasn't happened (so far back that it's
+#   never "within" any number of frames)
+NEVER = -1e9
+
+# Presses of each action an InputBuffer remembers, for
+#   pressed_in_order() and tapped_twice()
+PRESS_HISTORY = 4
+
+class InputBuffer(object):
+    """Fixed-size history of one player's input: what each of the
+       last (capacity) sim steps pressed and released, and per action
+       when it was last pressed, released and held since.
+
+       Times are in frames of game time since the buffer started
+       (a sim stepping twice a frame advances half a frame a step).
+       Something that happened on the current step is 0 frames old,
+       so "within 1 frame" means "this step" at the normal rate.
+
+       INSTANCE VARIABLES:
+       capacity :
+          Number of steps kept
+       now :
+          Frame the current step started at
+       steps :
+          Steps ended so far
+       held :
+          Action bits held right now
+       times :
+          Per action, TIME_FIELDS doubles: the frame it was pressed
+          if it's held (else NEVER), the frame it was last released,
+          the slot of its latest press, then a ring of the frames of
+          its last PRESS_HISTORY presses
+       ring :
+          (input mask, starting frame) of each of the last (capacity)
+          steps, back to back
+
+       Both arrays are doubles, like the snapshot buffers, so
+       save_state() is two slice copies.
+    """
+
+    # Offsets into an action's fields in (times)
+    HELD_SINCE = 0
+    RELEASED_AT = 1
+    PRESS_HEAD = 2
+    PRESSES = 3
+    TIME_FIELDS = 3 + PRESS_HISTORY
+
+    def __init__(self, capacity=constants.INPUT_BUFFER_SIZE):
+        self.capacity = capacity
+        self.now = 0.0
+        self.steps = 0
+        self.held = 0
+
+        # Mask of the step in progress
+        self.step_mask = 0
+
+        self.times = array("d", [NEVER]) * (len(ACTIONS) * self.TIME_FIELDS)
+        for n in range(len(ACTIONS)):
+            self.times[n * self.TIME_FIELDS + self.PRESS_HEAD] = 0
+        self.ring = array("d", [0.0, NEVER]) * capacity
+
+        self.STATE_SIZE = 3 + len(self.times) + len(self.ring)
+
+    def press(self, action):
+        times = self.times
+        base = ACTION_INDEX[action] * self.TIME_FIELDS
+        self.held |= action
+        self.step_mask |= action
+        times[base + self.HELD_SINCE] = self.now
+
+        head = (int(times[base + self.PRESS_HEAD]) + 1) % PRESS_HISTORY
+        times[base + self.PRESS_HEAD] = head
+        times[base + self.PRESSES + head] = self.now
+
+    def release(self, action):
+        times = self.times
+        base = ACTION_INDEX[action] * self.TIME_FIELDS
+        self.held &= ~action
+        self.step_mask |= action << RELEASE_SHIFT
+        times[base + self.HELD_SINCE] = NEVER
+        times[base + self.RELEASED_AT] = self.now
+
+    def end_step(self, frames=1):
+        """Record the step that's ending, (frames) frames long"""
+        slot = (self.steps % self.capacity) * 2
+        self.ring[slot] = self.step_mask
+        self.ring[slot + 1] = self.now
+        self.step_mask = 0
+        self.steps += 1
+        self.now += frames
+
+    # -------- Queries (none of them search the history) --------
+
+    def last_press(self, action, back=0):
+        """Frame of the (back)th latest press of (action) (0 the
+           latest, up to PRESS_HISTORY - 1), or NEVER
+        """
+        times = self.times
+        base = ACTION_INDEX[action] * self.TIME_FIELDS
+        head = (int(times[base + self.PRESS_HEAD]) - back) % PRESS_HISTORY
+        return times[base + self.PRESSES + head]
+
+    def pressed_within(self, action, frames):
+        """Whether (action) was pressed less than (frames) frames ago
+           (input buffering: a press early by up to (frames) frames
+           still counts)
+        """
+        return self.now - self.last_press(action) < frames
+
+    def released_within(self, action, frames):
+        base = ACTION_INDEX[action] * self.TIME_FIELDS
+        return self.now - self.times[base + self.RELEASED_AT] < frames
+
+    def held_time(self, action):
+        """Frames (action) has been held for, or -1 if it isn't held"""
+        since = self.times[ACTION_INDEX[action] * self.TIME_FIELDS + self.HELD_SINCE]
+        if since == NEVER:
+            return -1
+        return self.now - since
+
+    def held_for(self, action, frames):
+        """Whether (action) has been held for at least (frames) frames"""
+        return self.held_time(action) >= frames
+
+    def tapped_twice(self, action, frames):
+        """Whether (action)'s last two presses both came less than
+           (frames) frames ago (a double tap)
+        """
+        return self.now - self.last_press(action, 1) < frames
+
+    def pressed_in_order(self, actions, frames):
+        """Whether (actions) were pressed one after another, on
+           different steps, all less than (frames) frames ago -- a
+           motion input, e.g. (LEFT, RIGHT, ATTACK). Each action
+           looks at no more than its last PRESS_HISTORY presses.
+        """
+        start = self.now - frames
+        limit = None
+        for action in reversed(actions):
+            # Latest press of this action before the next one in
+            #   the sequence
+            for back in range(PRESS_HISTORY):
+                stamp = self.last_press(action, back)
+                if limit is None or stamp < limit:
+                    break
+            else:
+                return False
+            if stamp <= start:
+                return False
+            limit = stamp
+        return True
+
+    def mask_at(self, steps_ago):
+        """Input mask of the step (steps_ago) steps before the last
+           one that ended (0 for the last), or 0 if it's not kept
+        """
+        if steps_ago >= min(self.steps, self.capacity):
+            return 0
+        return int(self.ring[(self.steps - 1 - steps_ago) % self.capacity * 2])
+
+    def frame_at(self, steps_ago):
+        """Frame the step mask_at(steps_ago) describes started at"""
+        if steps_ago >= min(self.steps, self.capacity):
+            return NEVER
+        return self.ring[(self.steps - 1 - steps_ago) % self.capacity * 2 + 1]
+
+    # -------- State snapshots (for rollback) --------
+    # (STATE_SIZE is set per buffer, from its capacity)
+
+    def save_state(self, buf, offset):
+        buf[offset] = self.now
+        buf[offset + 1] = self.steps
+        buf[offset + 2] = self.held
+        offset += 3
+        end = offset + len(self.times)
+        buf[offset:end] = self.times
+        buf[end:end + len(self.ring)] = self.ring
+
+    def load_state(self, buf, offset):
+        self.now = buf[offset]
+        self.steps = int(buf[offset + 1])
+        self.held = int(buf[offset + 2])
+        self.step_mask = 0
+        offset += 3
+        end = offset + len(self.times)
+        self.times[:] = buf[offset:end]
+        self.ring[:] = buf[end:end + len(self.ring)]
+
+class PlayerController(object):
+    """Applies input masks to a Player, one sim step at a time.
+
+       INSTANCE VARIABLES:
+       player :
+          The Player being controlled
+       buffer :
+          InputBuffer of the player's recent input
+    """
+
+    def __init__(self, player, buffer_size=constants.INPUT_BUFFER_SIZE):
+        self.player = player
+        self.buffer = InputBuffer(buffer_size)
+        self.STATE_SIZE = self.buffer.STATE_SIZE
+
+    @property
+    def held(self):
+        """Action bits currently held down"""
+        return self.buffer.held
+
+    def apply(self, mask):
+        """Apply one step's input mask. A step may both press and
+           release an action: if it was held going in, it's released
+           first, otherwise it's pressed first (a quick tap).
+        """
+        if not mask:
+            return
+
+        pressed = mask & ACTION_BITS
+        released = (mask >> RELEASE_SHIFT) & ACTION_BITS
+        for action in ACTIONS:
+            if action & self.held:
+                if action & released:
+                    self.release(action)
+                if action & pressed:
+                    self.press(action)
+            else:
+                if action & pressed:
+                    self.press(action)
+                if action & released and action & self.held:
+                    self.release(action)
+
+    def press(self, action):
+        player = self.player
+        self.buffer.press(action)
+
+        # A character frozen or reeling from a hit ignores input
+        if not player.can_act():
+            return
+
+        # Press left/right: Run (or stop, if that makes both held)
+        if action == LEFT or action == RIGHT:
+            self.steer()
+
+        # Press jump: Jump / air jump
+        elif action == JUMP:
+            if player.airborne:
+                player.air_jump()
+            else:
+                player.jump()
+
+        # Press attack: Attack
+        elif action == ATTACK:
+            player.attack()
+
+    def release(self, action):
+        player = self.player
+
+        # How long it was held, before the buffer forgets
+        held_time = self.buffer.held_time(action)
+        self.buffer.release(action)
+
+        if not player.can_act():
+            return
+
+        # Release left/right: Stop, or run the other way if that's
+        #   still held
+        if action == LEFT or action == RIGHT:
+            self.steer()
+
+        # Release jump: If SHORT_HOP_FRAMES frames or less have
+        #   passed between jump press and jump release (counting
+        #   the step it was pressed on), player's upward momentum
+        #   is arrested to cause a short jump
+        elif action == JUMP:
+            if held_time + 1 <= constants.SHORT_HOP_FRAMES:
+                player.stop_rising()
+
+    def steer(self):
+        """Run the way the held direction says: left or right on its
+           own runs that way, and both at once (or neither) is
+           horizontal neutral -- the character doesn't move
+           horizontally
+        """
+        direction = self.buffer.held & (LEFT | RIGHT)
+        if direction == LEFT:
+            self.player.go_left()
+        elif direction == RIGHT:
+            self.player.go_right()
+        else:
+            self.player.stop()
+
+    def end_step(self, frames=1):
+        """Called once at the end of every sim step, (frames)
+           frames long
+        """
+        self.buffer.end_step(frames)
+
+    # (STATE_SIZE is set per controller, from its buffer's)
+
+    def save_state(self, buf, offset):
+        """Write the controller's state into (buf) at (offset)"""
+        self.buffer.save_state(buf, offset)
+
+    def load_state(self, buf, offset):
+        """Restore the state save_state() wrote at (offset)"""
+        self.buffer.load_state(buf, offset)
+
+# -------- Input sources --------
+
+# Hat directions: name -> (index into the hat's (x, y) value, sign)
+HAT_DIRECTIONS = {"left": (0, -1), "right": (0, 1), "up": (1, 1), "down": (1, -1)}
+
+def parse_binding(text):
+    """Binding string (as in constants.PLAYER_BINDINGS) -> the key
+       InputMapper dispatches on:
+          "key:K_LEFT"    -> ("key", pygame.K_LEFT)
+          "button:0:2"    -> ("button", 0, 2)
+          "hat:0:0:left"  -> ("hat", 0, 0, "left")
+          "axis:0:1:-"    -> ("axis", 0, 1, -1)
+    """
+    parts = text.split(":")
+    kind = parts[0]
+    try:
+        if kind == "key" and len(parts) == 2:
+            return ("key", getattr(pygame, parts[1]))
+        if kind == "button" and len(parts) == 3:
+            return ("button", int(parts[1]), int(parts[2]))
+        if kind == "hat" and len(parts) == 4 and parts[3] in HAT_DIRECTIONS:
+            return ("hat", int(parts[1]), int(parts[2]), parts[3])
+        if kind == "axis" and len(parts) == 4 and parts[3] in ("-", "+"):
+            return ("axis", int(parts[1]), int(parts[2]), -1 if parts[3] == "-" else 1)
+    except (AttributeError, ValueError):
+        pass
+    raise ValueError("bad input binding %r" % text)
+
+class InputMapper(object):
+    """Collects keyboard and joystick events between sim steps into
+       input masks for up to four local players, through one
+       dispatch table from binding to the (player, action)s it
+       drives. An action stays held while any of its bindings is
+       down.
+
+       INSTANCE VARIABLES:
+       players :
+          Number of players
+       dispatch :
+          Dict of binding (see parse_binding) -> list of
+          (player, action)
+       down :
+          Dict of binding -> whether it's down
+       held :
+          Per player, action bits held
+       pressed / released :
+          Per player, action bits pressed / released since the last
+          sample()
+       masks :
+          Per player input mask; the list sample() hands back
+       joysticks :
+          Dict of joystick number -> pygame Joystick, for the ones
+          init_joysticks() opened
+    """
+
+    def __init__(self, players=1, bindings=constants.PLAYER_BINDINGS,
+                 deadzone=constants.AXIS_DEADZONE):
+        if players > len(bindings):
+            raise ValueError("only %d players have input bindings" % len(bindings))
+        self.players = players
+        self.deadzone = deadzone
+
+        self.dispatch = {}
+        for player in range(players):
+            for name, texts in bindings[player].items():
+                action = ACTION_NAMES[name]
+                for text in texts:
+                    self.dispatch.setdefault(parse_binding(text), []).append((player, action))
+        self.down = dict.fromkeys(self.dispatch, False)
+
+        # Bindings down per player and action
+        self.counts = array("B", [0]) * (players * len(ACTIONS))
+
+        self.held = [0] * players
+        self.pressed = [0] * players
+        self.released = [0] * players
+        self.masks = [0] * players
+        self.joysticks = {}
+
+    def init_joysticks(self):
+        """Open every joystick a binding uses that's plugged in"""
+        pygame.joystick.init()
+        count = pygame.joystick.get_count()
+        for binding in self.dispatch:
+            number = binding[1]
+            if binding[0] != "key" and number < count and number not in self.joysticks:
+                joystick = pygame.joystick.Joystick(number)
+                joystick.init()
+                self.joysticks[number] = joystick
+
+    def set_binding(self, binding, down):
+        """Note (binding) going down (or up)"""
+        targets = self.dispatch.get(binding)
+        if targets is None or self.down[binding] == down:
+            return
+        self.down[binding] = down
+
+        counts = self.counts
+        for player, action in targets:
+            slot = player * len(ACTIONS) + ACTION_INDEX[action]
+            if down:
+                counts[slot] += 1
+                if counts[slot] == 1:
+                    self.held[player] |= action
+                    self.pressed[player] |= action
+            elif counts[slot]:
+                counts[slot] -= 1
+                if counts[slot] == 0:
+                    self.held[player] &= ~action
+                    self.released[player] |= action
+
+    def handle_event(self, event):
+        """Note an event if it's for one of our bindings"""
+        kind = event.type
+        if kind == pygame.KEYDOWN:
+            self.set_binding(("key", event.key), True)
+
+        elif kind == pygame.KEYUP:
+            self.set_binding(("key", event.key), False)
+
+        elif kind == pygame.JOYBUTTONDOWN:
+            self.set_binding(("button", event.joy, event.button), True)
+
+        elif kind == pygame.JOYBUTTONUP:
+            self.set_binding(("button", event.joy, event.button), False)
+
+        elif kind == pygame.JOYHATMOTION:
+            for name, (axis, sign) in HAT_DIRECTIONS.items():
+                self.set_binding(("hat", event.joy, event.hat, name),
+                                 event.value[axis] == sign)
+
+        elif kind == pygame.JOYAXISMOTION:
+            for sign in (-1, 1):
+                self.set_binding(("axis", event.joy, event.axis, sign),
+                                 event.value * sign >= self.deadzone)
+
+        # Regaining focus: catch up on anything released meanwhile
+        elif kind == pygame.ACTIVEEVENT:
+            self.poll()
+
+    def poll(self):
+        """Bring every binding in line with how the keyboard and
+           joysticks are right now, for events that went missing
+        """
+        keys = pygame.key.get_pressed()
+        for binding in self.dispatch:
+            kind = binding[0]
+            if kind == "key":
+                self.set_binding(binding, bool(keys[binding[1]]))
+                continue
+
+            joystick = self.joysticks.get(binding[1])
+            if joystick is None:
+                continue
+            if kind == "button":
+                down = bool(joystick.get_button(binding[2]))
+            elif kind == "hat":
+                axis, sign = HAT_DIRECTIONS[binding[3]]
+                down = joystick.get_hat(binding[2])[axis] == sign
+            else:
+                down = joystick.get_axis(binding[2]) * binding[3] >= self.deadzone
+            self.set_binding(binding, down)
+
+    def sample(self, frame=None):
+        """Return the input masks (one per player, in a list that's
+           reused) for the next sim step and start collecting the
+           step after it
+        """
+        masks = self.masks
+        pressed = self.pressed
+        released = self.released
+        for n in range(self.players):
+            masks[n] = pressed[n] | (released[n] << RELEASE_SHIFT)
+            pressed[n] = 0
+            released[n] = 0
+        return masks
+
+class NetworkInput(object):
+    """Input masks of remote players, stamped with the sim frame
+       they're for as they arrive. A mask that hasn't arrived yet
+       reads as 0 (no change, so whatever the player held stays
+       held), and a RollbackSession corrects the frame when it does.
+
+       INSTANCE VARIABLES:
+       players :
+          Number of players
+       capacity :
+          Frames of masks kept
+       masks, frames :
+          Rings of (capacity) frames x (players) masks, and the sim
+          frame each slot is for (-1 if none)
+       latest :
+          Per player, the newest frame received
+    """
+
+    def __init__(self, players, capacity=constants.INPUT_BUFFER_SIZE):
+        self.players = players
+        self.capacity = capacity
+        self.masks = array("B", [0]) * (capacity * players)
+        self.frames = array("l", [-1]) * (capacity * players)
+        self.latest = array("l", [-1]) * players
+        self.out = [0] * players
+
+    def receive(self, frame, player, mask):
+        """Store player (player)'s (mask) for (frame)"""
+        slot = (frame % self.capacity) * self.players + player
+        self.masks[slot] = mask
+        self.frames[slot] = frame
+        if frame > self.latest[player]:
+            self.latest[player] = frame
+
+    def has(self, frame, player):
+        """Whether player (player)'s mask for (frame) has arrived"""
+        return self.frames[(frame % self.capacity) * self.players + player] == frame
+
+    def sample(self, frame):
+        """Return the masks (one per player, in a list that's reused)
+           for (frame)
+        """
+        out = self.out
+        base = (frame % self.capacity) * self.players
+        for n in range(self.players):
+            slot = base + n
+            out[n] = self.masks[slot] if self.frames[slot] == frame else 0
+        return out
@@ -1,15 +1,158 @@
-"""
-   Module for debugging functions and features
-"""
-import pygame
-
-import constants
-
-class DebugBox(pygame.sprite.Sprite):
-    """A Sprite that illustrates the boundaries
-       of a collision rect
-    """
-    def __init__(self, width, height):
-        super(DebugBox, self).__init__()
-
-        self.image = pygame.Surface([width, height])
\ No newline at end of file
+"""
+   Module for debugging functions and features
+"""
+import pygame
+
+import constants
+import profiler
+
+class DebugBox(pygame.sprite.Sprite):
+    """A Sprite that illustrates the boundaries
+       of a collision rect
+    """
+    def __init__(self, width, height, color=constants.RED):
+        super(DebugBox, self).__init__()
+
+        self.color = color
+        self.target = None
+
+        self.image = pygame.Surface([width, height])
+        self.rect = self.image.get_rect()
+        self.redraw()
+
+    def redraw(self):
+        """Draw the outline of the box onto its image"""
+        # Black is transparent, so only the outline shows
+        self.image.fill(constants.BLACK)
+        self.image.set_colorkey(constants.BLACK)
+        pygame.draw.rect(self.image, self.color, self.image.get_rect(), 1)
+
+    def track(self, target):
+        """Follow (target)'s rect from now on"""
+        self.target = target
+        self.update()
+
+    def update(self):
+        if self.target is None:
+            return
+
+        rect = self.target.rect
+        # Resize if the target's rect changed size
+        if rect.size != self.rect.size:
+            self.image = pygame.Surface(rect.size)
+            self.redraw()
+        self.rect = self.image.get_rect(topleft=rect.topleft)
+
+class DebugOverlay(object):
+    """Toggleable overlay that shows frame-time graphs and stats
+       from a FrameProfiler, plus collision boxes for the active
+       sprites and the platforms near them.
+
+       Drawing is only done while the overlay is visible.
+    """
+
+    # Height in pixels of the frame-time graph, and the frame time
+    #   (in seconds) that fills it
+    GRAPH_HEIGHT = 60
+    GRAPH_SCALE = 2.0 / constants.TARGET_FRAME_RATE
+
+    # How often (in frames) to recompute the percentile text
+    STATS_INTERVAL = 30
+
+    def __init__(self, frame_profiler):
+        self.profiler = frame_profiler
+        self.visible = False
+        self.profiler_was_enabled = frame_profiler.enabled
+        self.font = None
+        self.text = []
+        self.boxes = pygame.sprite.Group()
+
+    def toggle(self):
+        """Show or hide the overlay. Showing it switches profiling
+           on; hiding it puts profiling back how it was.
+        """
+        self.visible = not self.visible
+        if self.visible:
+            self.profiler_was_enabled = self.profiler.enabled
+            self.profiler.enabled = True
+            self.profiler.reset()
+        else:
+            self.profiler.enabled = self.profiler_was_enabled
+
+    def track(self, sprites):
+        """Draw collision boxes around each of (sprites)"""
+        for sprite in sprites:
+            box = DebugBox(sprite.rect.width, sprite.rect.height)
+            box.track(sprite)
+            self.boxes.add(box)
+
+    def draw(self, screen, level):
+        """Draw the overlay on (screen): a Surface, or a
+           render_target.ScaledView, in which case everything is
+           drawn on the Surface underneath at its own resolution
+           (so the outlines stay one pixel wide and the text
+           readable), with the boxes mapped onto it
+        """
+        if not self.visible:
+            return
+
+        map_rect = getattr(screen, "map_rect", pygame.Rect)
+        screen = getattr(screen, "surface", screen)
+
+        # Collision boxes: tracked sprites plus nearby platforms
+        #   (platforms are in world coordinates, so scroll them)
+        shift = level.world_shift
+        self.boxes.update()
+        for box in self.boxes:
+            pygame.draw.rect(screen, box.color, map_rect(box.rect), 1)
+            nearby = box.rect.move(-shift, 0).inflate(200, 200)
+            for platform in level.platform_list.index.query(nearby):
+                pygame.draw.rect(screen, constants.YELLOW,
+                                 map_rect(platform.rect.move(shift, 0)), 1)
+
+        self.draw_graph(screen)
+        self.draw_stats(screen)
+
+    def draw_graph(self, screen):
+        """Frame times as one vertical line per frame, with the
+           target frame time marked
+        """
+        times = self.profiler.recent(self.profiler.frame_times)
+        width = min(len(times), screen.get_width())
+        times = times[len(times) - width:]
+
+        bottom = screen.get_height() - 1
+        scale = self.GRAPH_HEIGHT / self.GRAPH_SCALE
+        for x in range(width):
+            height = min(int(times[x] * scale), self.GRAPH_HEIGHT)
+            if times[x] > 1.0 / constants.TARGET_FRAME_RATE:
+                color = constants.RED
+            else:
+                color = constants.GREEN
+            pygame.draw.line(screen, color, (x, bottom), (x, bottom - height))
+
+        target = bottom - int(scale / constants.TARGET_FRAME_RATE)
+        pygame.draw.line(screen, constants.WHITE, (0, target), (width, target))
+
+    def draw_stats(self, screen):
+        """p50/p95/p99/worst milliseconds per phase"""
+        if self.font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            self.font = pygame.font.Font(None, 18)
+
+        if self.profiler.frames % self.STATS_INTERVAL == 0 or not self.text:
+            lines = [("frame", self.profiler.stats())]
+            lines += [(name, self.profiler.stats(phase))
+                      for phase, name in enumerate(profiler.PHASE_NAMES)]
+            self.text = [
+                self.font.render("%-13s p50 %5.2f  p95 %5.2f  p99 %5.2f  worst %5.2f ms" %
+                                 (name, stats["p50"] * 1000, stats["p95"] * 1000,
+                                  stats["p99"] * 1000, stats["worst"] * 1000),
+                                 False, constants.WHITE)
+                for name, stats in lines]
+
+        y = 4
+        for line in self.text:
+            screen.blit(line, (4, y))
+            y += line.get_height()
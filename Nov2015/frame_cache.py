@@ -0,0 +1,127 @@
+"""Module for a process-wide cache of sprite sheet frames, so every
+   character sharing a sheet shares one decode of it and one copy
+   of each frame (and of anything built from them, like a
+   character's animations)
+"""
+import constants
+from spritesheet import SpriteSheet
+
+class FrameCache(object):
+    """Cache of decoded sprite sheets and the frames cut from them.
+
+       Frames are keyed by (sheet path, source rect, flip, colorkey)
+       and built once; strips of frames are handed out as tuples so
+       callers can share them but not append to them. The frame
+       Surfaces themselves are shared too, so never draw onto them.
+
+       INSTANCE VARIABLES:
+       sheets :
+          Dict of sheet path -> SpriteSheet
+       frames :
+          Dict of (path, (x, y, w, h), flip, colorkey) -> Surface
+       strips :
+          Dict of (path, (x, y, w, h), count, flip, colorkey) -> tuple
+       built :
+          Dict of (path, key) -> object built from the sheet's frames
+          (see get_built)
+       decodes :
+          Number of sheet images loaded from disk so far
+    """
+
+    def __init__(self):
+        self.sheets = {}
+        self.frames = {}
+        self.strips = {}
+        self.built = {}
+        self.decodes = 0
+
+    def get_sheet(self, path):
+        """Return the SpriteSheet for (path), decoding it on first use"""
+        sheet = self.sheets.get(path)
+        if sheet is None:
+            sheet = self.sheets[path] = SpriteSheet(path)
+            self.decodes += 1
+        return sheet
+
+    def get_frame(self, path, rect, flip=False, colorkey=constants.BLACK):
+        """Return the frame at (rect) = (x, y, width, height) on the
+           sheet at (path), mirrored left/right if (flip) is set
+        """
+        rect = tuple(rect)
+        key = (path, rect, flip, colorkey)
+        frame = self.frames.get(key)
+        if frame is None:
+            # Flipped frames come from the sheet's flipped copy, so
+            #   they're cut once like any other frame
+            x, y, width, height = rect
+            frame = self.get_sheet(path).get_image(x, y, width, height,
+                                                   colorkey, flip)
+            self.frames[key] = frame
+        return frame
+
+    def get_strip(self, path, rect, count, flip=False, colorkey=constants.BLACK):
+        """Return a tuple of (count) frames laid out left to right,
+           starting with the frame at (rect)
+        """
+        rect = tuple(rect)
+        key = (path, rect, count, flip, colorkey)
+        strip = self.strips.get(key)
+        if strip is None:
+            x, y, width, height = rect
+            strip = self.strips[key] = tuple(
+                self.get_frame(path, (x + width * n, y, width, height),
+                               flip, colorkey)
+                for n in range(count))
+        return strip
+
+    def get_built(self, path, key, build):
+        """Return what (build)() makes out of frames of the sheet at
+           (path) (e.g. a character's AnimationSet), built the first
+           time (key) is asked for and dropped along with the sheet,
+           so unloading the sheet doesn't leave it holding the frames
+        """
+        built_key = (path, key)
+        thing = self.built.get(built_key)
+        if thing is None:
+            thing = self.built[built_key] = build()
+        return thing
+
+    def forget_built(self, key):
+        """Drop whatever was built for (key), from any sheet (e.g.
+           when what it was built from changes)
+        """
+        for built_key in [built_key for built_key in self.built
+                          if built_key[1] == key]:
+            del self.built[built_key]
+
+    def add_frame(self, path, rect, flip, colorkey, frame):
+        """Put a frame built elsewhere (e.g. loaded from an asset
+           bundle) in the cache, as get_frame() would have cut it
+        """
+        self.frames[(path, tuple(rect), flip, colorkey)] = frame
+
+    def memory_report(self):
+        """Dict of sheet path -> bytes of pixel data held for it"""
+        return dict((path, sheet.memory_bytes())
+                    for path, sheet in self.sheets.items())
+
+    def unload(self, path):
+        """Drop the sheet at (path), every frame cut from it and
+           everything built from them, e.g. when a level transition
+           no longer needs a character. Anything still holding the
+           frames (say, a Player's Animator) keeps them alive.
+        """
+        self.sheets.pop(path, None)
+        for cache in (self.frames, self.strips, self.built):
+            for key in [key for key in cache if key[0] == path]:
+                del cache[key]
+
+    def clear(self):
+        """Drop every cached sheet and frame"""
+        self.sheets.clear()
+        self.frames.clear()
+        self.strips.clear()
+        self.built.clear()
+
+# The cache shared by everything in the process
+shared_cache = FrameCache()
@@ -0,0 +1,355 @@
+"""Module for frame pacing: when in each frame the main loop waits,
+   and how long input sits before it reaches the screen.
+
+   The main loop calls wait_for_input() right before polling events
+   and flipped() right after the display flip; a pacer decides where
+   the frame's waiting goes:
+
+      tick       : pygame's Clock.tick() after the flip, as the game
+                   has always done (SDL_Delay, so a millisecond or
+                   more of jitter)
+      sleep-poll : sleep up to the frame boundary before polling, so
+                   the poll comes right at the start of the frame
+      busy-wait  : sleep-poll, but only sleeps until a couple of
+                   milliseconds before the boundary and spins for
+                   the rest, for frames on time to well under a
+                   millisecond
+      late-input : aims the flip (not the poll) at the frame
+                   boundary: waits until the boundary minus how long
+                   recent frames took to simulate and draw, then
+                   polls, so input is as fresh as possible at the
+                   flip
+      vsync      : late-input locked to the display's refresh, with
+                   the flip synced to it (pygame 2, and a display
+                   refreshing at the frame rate; acts like
+                   late-input where vsync isn't available or doesn't
+                   hold flips back)
+
+   Every pacer keeps PacingStats. Input can arrive any time between
+   two polls and then waits for the next one, so a frame's
+   input-to-flip latency is taken as poll-to-flip plus half the time
+   since the previous poll (and at worst the whole of it). Jitter is
+   how much the time between flips varies.
+
+   Run this module to compare the pacers on this machine.
+"""
+from array import array
+import math
+import time
+import timeit
+
+import pygame
+
+import constants
+from profiler import percentile
+
+# How long before a deadline the sleeping pacers stop sleeping and
+#   spin instead (time.sleep can overshoot by about this much)
+SPIN_MARGIN = 0.002
+
+# Extra time late-input leaves between its predicted end of the
+#   frame's work and the flip
+LATE_INPUT_MARGIN = 0.001
+
+# Frames of work times late-input predicts from, and which
+#   percentile of them it plans for
+WORK_HISTORY = 30
+WORK_PERCENTILE = 0.9
+
+# Frames vsync runs before checking that flips really wait for the
+#   refresh (some drivers accept vsync and ignore it)
+VSYNC_CHECK_FRAMES = 60
+
+class PacingStats(object):
+    """Ring buffers of per-frame latency and flip timings.
+
+       INSTANCE VARIABLES:
+       period :
+          Target seconds per frame
+       poll_to_flip :
+          Seconds from polling input to the flip returning
+       poll_gaps :
+          Seconds since the previous poll
+       flip_intervals :
+          Seconds since the previous flip
+       frames :
+          Total number of frames recorded
+    """
+
+    def __init__(self, period, capacity=600):
+        self.period = period
+        self.capacity = capacity
+        self.poll_to_flip = array("d", [0.0]) * capacity
+        self.poll_gaps = array("d", [0.0]) * capacity
+        self.flip_intervals = array("d", [0.0]) * capacity
+        self.frames = 0
+
+    def record(self, poll_to_flip, poll_gap, flip_interval):
+        slot = self.frames % self.capacity
+        self.poll_to_flip[slot] = poll_to_flip
+        self.poll_gaps[slot] = poll_gap
+        self.flip_intervals[slot] = flip_interval
+        self.frames += 1
+
+    def recent(self, times):
+        """The recorded part of ring buffer (times)"""
+        return times[:min(self.frames, self.capacity)]
+
+    def summary(self):
+        """Dict of latency and jitter stats, in seconds"""
+        poll_to_flip = self.recent(self.poll_to_flip)
+        gaps = self.recent(self.poll_gaps)
+        intervals = self.recent(self.flip_intervals)
+        count = len(intervals)
+        if not count:
+            return {}
+
+        average = sorted(latency + gap / 2.0 for latency, gap in zip(poll_to_flip, gaps))
+        worst = sorted(latency + gap for latency, gap in zip(poll_to_flip, gaps))
+        mean_interval = sum(intervals) / count
+        jitter = math.sqrt(sum((interval - mean_interval) ** 2
+                               for interval in intervals) / count)
+        return {"latency mean": sum(average) / count,
+                "latency p99": percentile(worst, 0.99),
+                "poll to flip": sum(poll_to_flip) / count,
+                "frame time": mean_interval,
+                "jitter": jitter,
+                "late frames": sum(1 for interval in intervals
+                                   if interval > self.period * 1.5)}
+
+    def report(self):
+        """One line summary for the console"""
+        stats = self.summary()
+        if not stats:
+            return "no frames"
+        return ("latency mean %.2f ms, p99 %.2f ms (poll to flip %.2f ms); "
+                "frame time %.2f ms, jitter %.3f ms, %d late frames"
+                % (stats["latency mean"] * 1000, stats["latency p99"] * 1000,
+                   stats["poll to flip"] * 1000, stats["frame time"] * 1000,
+                   stats["jitter"] * 1000, stats["late frames"]))
+
+class FramePacer(object):
+    """Base pacer: never waits, so frames run as fast as they can.
+
+       INSTANCE VARIABLES:
+       period :
+          Target seconds per frame
+       stats :
+          PacingStats
+       vsync :
+          Whether the display opened by open_display() flips in
+          sync with the refresh
+    """
+    name = "none"
+
+    def __init__(self, frame_rate=constants.TARGET_FRAME_RATE):
+        self.period = 1.0 / frame_rate
+        self.frame_rate = frame_rate
+        self.timer = timeit.default_timer
+        self.stats = PacingStats(self.period)
+        self.vsync = False
+
+        self.last_poll = None
+        self.last_flip = None
+
+    def open_display(self, size, flags=0):
+        """pygame.display.set_mode() the way this pacer wants it"""
+        return pygame.display.set_mode(size, flags)
+
+    def wait_for_input(self):
+        """Wait until it's time to poll input, and return the seconds
+           since the last poll (the frame time to simulate)
+        """
+        self.wait()
+        now = self.timer()
+        if self.last_poll is None:
+            frame_time = self.period
+        else:
+            frame_time = now - self.last_poll
+        self.poll_gap = frame_time
+        self.last_poll = now
+        return frame_time
+
+    def flipped(self):
+        """Call right after the display flip"""
+        now = self.timer()
+        if self.last_flip is not None:
+            self.stats.record(now - self.last_poll, self.poll_gap, now - self.last_flip)
+        self.last_flip = now
+        self.after_flip(now)
+
+    # -------- Strategy hooks --------
+    def wait(self):
+        """Wait before the poll"""
+        pass
+
+    def after_flip(self, now):
+        """Wait or plan after the flip at (now)"""
+        pass
+
+    def wait_until(self, deadline):
+        """Sleep until just before (deadline), then spin up to it"""
+        remaining = deadline - self.timer() - SPIN_MARGIN
+        if remaining > 0:
+            time.sleep(remaining)
+        while self.timer() < deadline:
+            pass
+
+class TickPacer(FramePacer):
+    """pygame's Clock.tick() after the flip"""
+    name = "tick"
+
+    def __init__(self, frame_rate=constants.TARGET_FRAME_RATE):
+        super(TickPacer, self).__init__(frame_rate)
+        self.clock = pygame.time.Clock()
+
+    def after_flip(self, now):
+        self.clock.tick(self.frame_rate)
+
+class SleepPollPacer(FramePacer):
+    """Sleeps up to the next frame boundary, then polls"""
+    name = "sleep-poll"
+
+    def __init__(self, frame_rate=constants.TARGET_FRAME_RATE):
+        super(SleepPollPacer, self).__init__(frame_rate)
+        self.next_frame = None
+
+    def next_deadline(self, now):
+        """The next frame boundary after (now), starting the
+           schedule over if frames have fallen more than one
+           behind
+        """
+        if self.next_frame is None or now - self.next_frame > self.period:
+            self.next_frame = now
+        else:
+            self.next_frame += self.period
+        return self.next_frame
+
+    def wait(self):
+        remaining = self.next_deadline(self.timer()) - self.timer()
+        if remaining > 0:
+            time.sleep(remaining)
+
+class BusyWaitPacer(SleepPollPacer):
+    """sleep-poll with the last stretch of the wait spun out"""
+    name = "busy-wait"
+
+    def wait(self):
+        self.wait_until(self.next_deadline(self.timer()))
+
+class LateInputPacer(SleepPollPacer):
+    """Polls as late as it can while still flipping by the frame
+       boundary, going by how long recent frames took from poll to
+       flip
+    """
+    name = "late-input"
+
+    def __init__(self, frame_rate=constants.TARGET_FRAME_RATE):
+        super(LateInputPacer, self).__init__(frame_rate)
+        self.work_times = array("d", [0.0]) * WORK_HISTORY
+        self.work_frames = 0
+
+    def predicted_work(self):
+        """Seconds from poll to flip to plan for"""
+        if not self.work_frames:
+            return self.period / 2
+        recent = sorted(self.work_times[:min(self.work_frames, WORK_HISTORY)])
+        return percentile(recent, WORK_PERCENTILE)
+
+    def flip_deadline(self, now):
+        """When the coming frame should flip"""
+        return self.next_deadline(now)
+
+    def wait(self):
+        deadline = self.flip_deadline(self.timer())
+        self.wait_until(deadline - self.predicted_work() - LATE_INPUT_MARGIN)
+
+    def after_flip(self, now):
+        self.work_times[self.work_frames % WORK_HISTORY] = now - self.last_poll
+        self.work_frames += 1
+
+class VsyncPacer(LateInputPacer):
+    """late-input, planned around the display's refresh: the flip
+       blocks until the vertical blank, and the next one is expected
+       a refresh period after the last
+    """
+    name = "vsync"
+
+    def open_display(self, size, flags=0):
+        # pygame 2 only does vsync through its renderer (the SCALED
+        #   flag); older pygames don't take the argument at all
+        try:
+            screen = pygame.display.set_mode(size, flags | pygame.SCALED, vsync=1)
+            self.vsync = True
+            return screen
+        except (AttributeError, TypeError, pygame.error):
+            return super(VsyncPacer, self).open_display(size, flags)
+
+    def flip_deadline(self, now):
+        if not self.vsync or self.last_flip is None:
+            return super(VsyncPacer, self).flip_deadline(now)
+
+        # The refresh after the last flip (or the first one still
+        #   ahead, if frames have been missed)
+        deadline = self.last_flip + self.period
+        while deadline < now:
+            deadline += self.period
+        return deadline
+
+    def after_flip(self, now):
+        super(VsyncPacer, self).after_flip(now)
+
+        # Planning from the last flip only keeps time if flips wait
+        #   for the refresh; if they come early, go by the timer
+        if self.vsync and self.stats.frames == VSYNC_CHECK_FRAMES:
+            intervals = self.stats.recent(self.stats.flip_intervals)
+            if sum(intervals) / len(intervals) < 0.97 * self.period:
+                self.vsync = False
+
+# Pacer name -> class
+PACERS = dict((pacer.name, pacer) for pacer in
+              (FramePacer, TickPacer, SleepPollPacer, BusyWaitPacer,
+               LateInputPacer, VsyncPacer))
+
+def make_pacer(name, frame_rate=constants.TARGET_FRAME_RATE):
+    return PACERS[name](frame_rate)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare frame pacers on this machine")
+    parser.add_argument("--frames", type=int, default=300,
+                        help="frames to run each pacer for")
+    parser.add_argument("--work", type=float, default=4.0,
+                        help="milliseconds of simulated work (simulate + draw) per frame")
+    parser.add_argument("--pacers", nargs="+", default=sorted(set(PACERS) - set(["none"])),
+                        choices=sorted(PACERS), help="pacers to compare")
+    parser.add_argument("--window", action="store_true",
+                        help="open a real window (needed for vsync) instead of "
+                             "running headless")
+    args = parser.parse_args()
+
+    if not args.window:
+        from simulation import init_headless
+        init_headless()
+    else:
+        pygame.init()
+
+    size = (constants.SCREEN_WIDTH, constants.SCREEN_HEIGHT)
+    for name in args.pacers:
+        pacer = make_pacer(name)
+        screen = pacer.open_display(size)
+        timer = pacer.timer
+        for frame in range(args.frames):
+            pacer.wait_for_input()
+            pygame.event.pump()
+
+            # Stand-in for simulating and drawing
+            end = timer() + args.work / 1000.0
+            screen.fill(constants.BLACK if frame % 2 else constants.BLUE)
+            while timer() < end:
+                pass
+            pygame.display.flip()
+            pacer.flipped()
+        print("%-10s %s%s" % (name, pacer.stats.report(),
+                              " (vsync)" if pacer.vsync else ""))
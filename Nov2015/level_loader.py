@@ -0,0 +1,187 @@
+"""Module for loading play stages from data files instead of
+   hard-coded PlayLevel subclasses.
+
+   Stage file format (JSON):
+      name       : Display name of the stage
+      width      : Width of the stage in pixels (optional, defaults
+                   to the screen width)
+      background : Path of a background image, or null
+      spawn      : List of [x, y] player spawn points
+      platforms  : List of [width, height, x, y] platforms, the same
+                   tables the PlayLevel subclasses use
+      moving     : List of moving platforms (optional), each an
+                   object with a "type", its "size" as [width,
+                   height] and the type's settings:
+                   "path"      : "points" [[x, y], ...], "speed",
+                                 "loop"
+                   "oscillate" : "position" [x, y], "amplitude"
+                                 [x, y], "period", "phase"
+                   "falling"   : "position" [x, y], "delay",
+                                 "respawn"
+"""
+import json
+import threading
+from collections import OrderedDict
+
+import pygame
+
+import constants
+import levels
+from phys_surface import (Platform, PathPlatform, OscillatingPlatform,
+                          FallingPlatform)
+
+def load_level_data(path):
+    """Read and check the stage file at (path)"""
+    with open(path) as stage_file:
+        data = json.load(stage_file)
+
+    for platform in data.get("platforms", []):
+        if len(platform) != 4:
+            raise ValueError("%s: platforms must be [width, height, x, y], got %r"
+                             % (path, platform))
+    for platform in data.get("moving", []):
+        if platform.get("type") not in MOVING_PLATFORMS:
+            raise ValueError("%s: unknown moving platform type %r"
+                             % (path, platform.get("type")))
+    return data
+
+def build_path_platform(width, height, entry):
+    return PathPlatform(width, height, entry["points"], entry.get("speed", 2),
+                        entry.get("loop", False))
+
+def build_oscillating_platform(width, height, entry):
+    x, y = entry["position"]
+    amplitudeX, amplitudeY = entry.get("amplitude", [0, 0])
+    return OscillatingPlatform(width, height, x, y, amplitudeX, amplitudeY,
+                               entry.get("period", 120), entry.get("phase", 0.0))
+
+def build_falling_platform(width, height, entry):
+    x, y = entry["position"]
+    return FallingPlatform(width, height, x, y, entry.get("delay", 30),
+                           entry.get("respawn", 240))
+
+# Moving platform "type" -> builder(width, height, stage file entry)
+MOVING_PLATFORMS = {
+    "path": build_path_platform,
+    "oscillate": build_oscillating_platform,
+    "falling": build_falling_platform,
+}
+
+class DataLevel(levels.PlayLevel):
+    """A PlayLevel built from stage file data"""
+
+    def __init__(self, player, data, name=None):
+        # Set the width before anything that depends on it
+        self.level_width = data.get("width", constants.SCREEN_WIDTH)
+
+        super(DataLevel, self).__init__(player)
+
+        self.name = name or data.get("name", "")
+        self.title = data.get("name", "")
+        self.spawn_points = [tuple(point) for point in data.get("spawn", [[10, 10]])]
+
+        if data.get("background"):
+            self.background = pygame.image.load(data["background"])
+
+        # Add platforms to platform list
+        for platform in data.get("platforms", []):
+            block = Platform(platform[0], platform[1])
+            block.rect.x = platform[2]
+            block.rect.y = platform[3]
+            block.player = self.player
+            self.platform_list.add(block)
+
+        for entry in data.get("moving", []):
+            width, height = entry["size"]
+            block = MOVING_PLATFORMS[entry["type"]](width, height, entry)
+            block.player = self.player
+            self.platform_list.add(block)
+
+def build_level(name, player):
+    """Build the level called (name): a stage file path, or the
+       name of a PlayLevel subclass in the levels module
+    """
+    if name.endswith(".json"):
+        return DataLevel(player, load_level_data(name), name)
+    return getattr(levels, name)(player)
+
+class LevelLoader(object):
+    """Reads the stage files in (paths) on demand and keeps the
+       parsed data of the most recently used (cache_size) of them,
+       so switching back and forth between stages doesn't read them
+       again. prefetch() reads a stage file on a background thread
+       ahead of time.
+
+       The levels themselves (and their Surfaces) are only ever
+       built by get(), on the thread calling it, and built afresh
+       each time, so a stage always starts with its moving and
+       falling platforms where its file puts them.
+    """
+
+    def __init__(self, paths, cache_size=constants.LEVEL_CACHE_SIZE):
+        self.paths = list(paths)
+        self.cache_size = cache_size
+
+        # Index -> parsed stage data, least recently used first
+        self.cache = OrderedDict()
+
+        # Index -> thread currently reading that stage
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.paths)
+
+    def load(self, index):
+        """Read and parse stage (index)'s file"""
+        return load_level_data(self.paths[index])
+
+    def store(self, index, data):
+        with self.lock:
+            # Re-insert to mark it most recently used
+            self.cache.pop(index, None)
+            self.cache[index] = data
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def prefetch(self, index):
+        """Start reading stage (index) in the background, unless
+           it's already read or being read
+        """
+        index %= len(self.paths)
+        with self.lock:
+            if index in self.cache or index in self.pending:
+                return
+            thread = threading.Thread(target=self.prefetch_worker, args=(index,),
+                                      name="prefetch stage %d" % index)
+            thread.daemon = True
+            self.pending[index] = thread
+        thread.start()
+
+    def prefetch_worker(self, index):
+        # Only file reading and parsing here: Surfaces are made on
+        #   the main thread
+        try:
+            self.store(index, self.load(index))
+        finally:
+            with self.lock:
+                self.pending.pop(index, None)
+
+    def get(self, index, player):
+        """Build stage (index) with (player) in it, reading its file
+           now if it isn't cached (or waiting for a prefetch to
+           finish)
+        """
+        index %= len(self.paths)
+        with self.lock:
+            thread = self.pending.get(index)
+        if thread is not None:
+            thread.join()
+
+        with self.lock:
+            data = self.cache.get(index)
+        if data is None:
+            data = self.load(index)
+        self.store(index, data)
+
+        return DataLevel(player, data, self.paths[index])
@@ -1,102 +1,466 @@
-"""
-    Module for classes representing stages, including play stages
-    as well as menu screens
-    Written Dec 4, 2015 by Benjamin Reed
-"""
-import pygame
-
-import constants
-from phys_surface import *
-
-# Generic level superclass
-class Level(object):
-
-    # Background image
-    # DEBUG: background is a black window-sized surface to black out frame
-    # background = None
-    background = pygame.Surface([constants.SCREEN_WIDTH, constants.SCREEN_HEIGHT])
-
-    # How far this world has been scrolled left/right
-    world_shift = 0
-    level_limit = -1000
-
-    #def __init__(self):
-        #print "I'm a level."
-
-    # Generic state update method to be overridden
-    #   in subclasses
-    # def update(self):
-        # print "Updating..."
-
-    # Generic draw method to be overriden
-    #   in subclasses
-    def draw(self, screen):
-        # Wipe contents of previous frame
-        # (DEBUG: Fill with black)
-        screen.fill(constants.BLACK)
-        # DEBUG: Don't forget to blit!
-        screen.blit(self.background,[0,0])
-
-# Subclass for a play stage, where actual gameplay
-#   takes place
-class PlayLevel(Level):
-    def __init__(self, player):
-        super(PlayLevel, self).__init__()
-
-        # Create a sprite group for level platforms
-        #   (which of course extend the pygame Sprite)
-        self.platform_list = pygame.sprite.Group()
-
-        # Add player param as a member of this level
-        #   so that the level can reference player
-        #   members/properties
-        self.player = player
-
-    def update(self):
-        # Update members of the platform list
-        self.platform_list.update()
-
-    def draw(self, screen):
-        # Wipe contents of previous frame
-        # (DEBUG: Fill with black)
-        screen.fill(constants.BLACK)
-        # DEBUG: Don't forget to blit!
-        screen.blit(self.background,[0,0])
-
-        # Draw all the sprite lists that we have
-        self.platform_list.draw(screen)
-
-# Test level: Flat empty stage (Final Destination jokes go here)
-class PlayLevel_01(PlayLevel):
-    def __init__(self, player):
-        super(PlayLevel_01, self).__init__(player)
-
-        # Single flat platform to serve as floor
-        level = [[constants.SCREEN_WIDTH,15,0,(constants.SCREEN_HEIGHT-30)]]
-
-        # Add platforms to platform list
-        for platform in level:
-            block = Platform(platform[0], platform[1])
-            block.rect.x = platform[2]
-            block.rect.y = platform[3]
-            block.player = self.player
-            self.platform_list.add(block)
-
-# Test level: ground + elevated platforms to jump on
-class PlayLevel_02(PlayLevel):
-    def __init__(self, player):
-        super(PlayLevel_02, self).__init__(player)
-
-        # Ground platform plus two raised platforms
-        level = [ [constants.SCREEN_WIDTH,15,0,(constants.SCREEN_HEIGHT-30)],
-                  [80, 15, 140, (constants.SCREEN_HEIGHT-200)],
-                  [80, 15, (constants.SCREEN_WIDTH-240), (constants.SCREEN_HEIGHT-150)]
-                  ]
-
-        # Add platforms to platform list
-        for platform in level:
-            block = Platform(platform[0], platform[1])
-            block.rect.x = platform[2]
-            block.rect.y = platform[3]
-            block.player = self.player
+"""
+    Module for classes representing stages, including play stages
+    as well as menu screens
+    Written Dec 4, 2015 by Benjamin Reed
+"""
+from collections import OrderedDict
+import random
+
+import pygame
+
+import constants
+from phys_surface import *
+from phys_world import PhysWorld
+from spatial_hash import SpatialHashGroup
+
+# Generic level superclass
+class Level(object):
+
+    # Background image (set per level, e.g. by the level loader).
+    #   Levels without one get a black window-sized surface to
+    #   black out the frame, made the first time it's drawn rather
+    #   than when this module is imported
+    _background = None
+    default_background = None
+
+    @property
+    def background(self):
+        if self._background is None:
+            if Level.default_background is None:
+                Level.default_background = pygame.Surface([constants.SCREEN_WIDTH,
+                                                           constants.SCREEN_HEIGHT])
+            return Level.default_background
+        return self._background
+
+    @background.setter
+    def background(self, image):
+        self._background = image
+
+    # How far this world has been scrolled left/right
+    world_shift = 0
+    level_limit = -1000
+
+    #def __init__(self):
+        #print "I'm a level."
+
+    # Generic state update method to be overridden
+    #   in subclasses
+    # def update(self):
+        # print "Updating..."
+
+    # Generic draw method to be overriden
+    #   in subclasses
+    def draw(self, screen):
+        # Wipe contents of previous frame by blitting the
+        #   window-sized background over it (no need to fill
+        #   first, the blit covers every pixel)
+        screen.blit(self.background,[0,0])
+
+# Sprite.update as a plain function, to spot platforms that
+#   don't override it
+_sprite_update = getattr(pygame.sprite.Sprite.update, "__func__",
+                         pygame.sprite.Sprite.update)
+
+# Subclass for a play stage, where actual gameplay
+#   takes place
+class PlayLevel(Level):
+
+    # Composite the background and static platforms into cached
+    #   screen-sized tiles (static_tiles) instead of drawing every
+    #   platform every frame. Tiles are baked as they first come
+    #   into view, and only the few most recently drawn are kept,
+    #   so the cost follows what's on screen rather than the size
+    #   of the stage. Platforms are assumed not to move unless they
+    #   are added, removed or reindexed in platform_list.
+    bake_static = constants.BAKE_STATIC_LAYER
+
+    # Width of the stage in world coordinates. Stages wider
+    #   than the screen scroll (see camera.Camera)
+    level_width = constants.SCREEN_WIDTH
+
+    def __init__(self, player):
+        super(PlayLevel, self).__init__()
+
+        # Create a sprite group for level platforms
+        #   (which of course extend the pygame Sprite).
+        #   The group keeps a spatial hash of its platforms
+        #   so collision checks only look at nearby ones
+        self.platform_list = SpatialHashGroup()
+
+        # Collision world moving bodies through the platforms
+        self.world = PhysWorld(self.platform_list)
+
+        # Whether draw_dirty() has to redraw the whole screen
+        #   (always true until the level has been drawn once)
+        self.full_redraw = True
+
+        # world_shift the screen was last drawn at by draw_dirty()
+        self.drawn_shift = None
+
+        # Cached background + static platforms composites, tile
+        #   index (world x // SCREEN_WIDTH) -> Surface, least
+        #   recently drawn first, and the platform_list
+        #   members_version they were built from
+        self.static_tiles = OrderedDict()
+        self.static_version = None
+
+        # Platforms that move themselves, whether any static
+        #   platform overrides update(), and the platform_list
+        #   members_version those were worked out for
+        self.moving_platforms = []
+        self.platforms_update = False
+        self.platforms_version = None
+
+        # Screen rect each moving platform was last drawn at
+        self.moving_drawn = {}
+
+        # Name used to rebuild this level (e.g. for replays)
+        self.name = type(self).__name__
+
+        # Add player param as a member of this level
+        #   so that the level can reference player
+        #   members/properties
+        self.player = player
+
+    @property
+    def level_limit(self):
+        """Lowest world_shift the stage can scroll to"""
+        return min(0, constants.SCREEN_WIDTH - self.level_width)
+
+    def view_rect(self, margin=0):
+        """The part of the world on screen, in world coordinates,
+           grown by (margin) pixels on every side
+        """
+        return pygame.Rect(-self.world_shift - margin, -margin,
+                           constants.SCREEN_WIDTH + 2 * margin,
+                           constants.SCREEN_HEIGHT + 2 * margin)
+
+    def refresh_platforms(self):
+        """Sort out which platforms move (and whether any static
+           ones have updates), if platforms were added or removed
+           since last time
+        """
+        version = self.platform_list.members_version
+        if version == self.platforms_version:
+            return
+
+        self.moving_platforms = [platform for platform in self.platform_list
+                                 if not platform.static]
+        self.platforms_update = any(
+            getattr(type(platform).update, "__func__",
+                    type(platform).update) is not _sprite_update
+            for platform in self.platform_list if platform.static)
+        self.platforms_version = version
+
+    def update(self, frames=1):
+        self.refresh_platforms()
+
+        if self.moving_platforms:
+            self.move_platforms(frames)
+
+        # Update static members of the platform list near the
+        #   screen, unless none of them have anything to update
+        if self.platforms_update:
+            for platform in self.platform_list.index.query(
+                    self.view_rect(constants.CULL_MARGIN)):
+                if platform.static:
+                    platform.update()
+
+    def move_platforms(self, frames):
+        """Move every moving platform (frames) frames along, carrying
+           whatever stands on them. Only platforms that moved are
+           reindexed, so this costs the same however many static
+           platforms the stage has.
+        """
+        world = self.world
+
+        # Who is riding which platform, before anything moves
+        riders = []
+        for body in world.bodies:
+            ground = world.ground_contact(body)
+            if ground is not None and not ground.surface.static:
+                ground.surface.ridden(body)
+                riders.append((body, ground.surface))
+
+        platform_list = self.platform_list
+        for platform in self.moving_platforms:
+            topleft = platform.rect.topleft
+            platform.update(frames)
+            if platform.rect.topleft != topleft:
+                platform_list.reindex(platform)
+
+        # Carry riders along (through the world, so they're still
+        #   stopped by walls, but not by the platform carrying them,
+        #   which may have risen into them)
+        for body, platform in riders:
+            if platform.deltaX or platform.deltaY:
+                world.move(body, platform.deltaX, platform.deltaY, platform)
+
+    # Number of slots save_state() fills
+    @property
+    def STATE_SIZE(self):
+        self.refresh_platforms()
+        return 1 + sum(platform.STATE_SIZE for platform in self.moving_platforms)
+
+    def save_state(self, buf, offset):
+        """Write the level's simulation state into (buf) at (offset)"""
+        buf[offset] = self.world_shift
+        offset += 1
+        for platform in self.moving_platforms:
+            platform.save_state(buf, offset)
+            offset += platform.STATE_SIZE
+
+    def load_state(self, buf, offset):
+        """Restore the state save_state() wrote at (offset)"""
+        self.world_shift = int(buf[offset])
+        offset += 1
+        for platform in self.moving_platforms:
+            platform.load_state(buf, offset)
+            offset += platform.STATE_SIZE
+            self.platform_list.reindex(platform)
+
+        # What bodies touched was worked out against the platforms
+        #   where they were, not where they've been put back to
+        self.world.forget_contacts()
+
+    def collide_platforms(self, sprite):
+        """Return a list of the platforms (sprite) overlaps"""
+        return self.platform_list.collide(sprite)
+
+    def draw_background(self, surface, shift, area):
+        """Tile the background across (area) of (surface), scrolled
+           by (shift)
+        """
+        width = self.background.get_width()
+        clip = surface.get_clip()
+        surface.set_clip(area)
+
+        # Leftmost tile that reaches into the area
+        x = (area.left - shift) // width * width + shift
+        while x < area.right:
+            surface.blit(self.background, (x, 0))
+            x += width
+
+        surface.set_clip(clip)
+
+    def build_static_tile(self, index):
+        """Composite the background and the static platforms of
+           screen-wide tile (index) of the stage
+        """
+        width = constants.SCREEN_WIDTH
+        left = index * width
+        tile = pygame.Surface([width, constants.SCREEN_HEIGHT])
+        if pygame.display.get_surface() is not None:
+            tile = tile.convert()
+        area = tile.get_rect()
+        self.draw_background(tile, -left, area)
+        for platform in self.platform_list.index.query(area.move(left, 0)):
+            if platform.static:
+                tile.blit(platform.image, platform.rect.move(-left, 0))
+        return tile
+
+    def get_static_tile(self, index):
+        """Return tile (index) of the static layer, baking it if it
+           isn't cached (all of them again if the platforms changed
+           since they were baked)
+        """
+        tiles = self.static_tiles
+        if self.static_version != self.platform_list.members_version:
+            tiles.clear()
+            self.static_version = self.platform_list.members_version
+
+        tile = tiles.pop(index, None)
+        if tile is None:
+            tile = self.build_static_tile(index)
+        tiles[index] = tile
+        while len(tiles) > constants.STATIC_TILE_CACHE_SIZE:
+            tiles.popitem(last=False)
+        return tile
+
+    def draw_static(self, screen, area):
+        """Blit the part of the static layer under (area) (screen
+           coordinates) onto (screen)
+        """
+        shift = self.world_shift
+        width = constants.SCREEN_WIDTH
+        first = (area.left - shift) // width
+        last = (area.right - 1 - shift) // width
+        for index in range(max(first, 0), last + 1):
+            tile_left = index * width + shift
+            left = max(area.left, tile_left)
+            right = min(area.right, tile_left + width)
+            if left < right:
+                screen.blit(self.get_static_tile(index), (left, area.top),
+                            (left - tile_left, area.top, right - left, area.height))
+
+    def draw_moving(self, screen, area=None):
+        """Draw the moving platforms on screen (or only the parts
+           of them inside (area), without recording where they were
+           drawn)
+        """
+        shift = self.world_shift
+        if area is None:
+            area = screen.get_rect()
+            drawn = self.moving_drawn
+        else:
+            drawn = None
+
+        for platform in self.moving_platforms:
+            rect = platform.rect.move(shift, 0)
+            if rect.colliderect(area):
+                screen.blit(platform.image, rect)
+            if drawn is not None:
+                drawn[platform] = rect
+
+    def draw(self, screen):
+        shift = self.world_shift
+
+        if self.bake_static:
+            # Background and static platforms in a blit of each
+            #   tile of the stage that's on screen (one or two)
+            self.draw_static(screen, screen.get_rect())
+            self.draw_moving(screen)
+            return
+
+        # Wipe contents of previous frame by blitting the
+        #   background over it (no need to fill first, the
+        #   blit covers every pixel)
+        self.draw_background(screen, shift, screen.get_rect())
+
+        # Draw the platforms that are on screen
+        for platform in self.platform_list.index.query(self.view_rect()):
+            if platform.static:
+                screen.blit(platform.image, platform.rect.move(shift, 0))
+        self.draw_moving(screen)
+
+    def invalidate(self):
+        """Make the next draw_dirty() redraw the whole screen
+           (e.g. after switching levels or resizing the window)
+        """
+        self.full_redraw = True
+
+    def restore(self, screen, rect):
+        """Redraw the background and platforms under (rect) only.
+           Used as the background callback for Group.clear().
+        """
+        shift = self.world_shift
+
+        clip = screen.get_clip()
+        screen.set_clip(rect)
+
+        if self.bake_static:
+            self.draw_static(screen, rect)
+        else:
+            self.draw_background(screen, shift, rect)
+
+            # Only platforms overlapping the rect need redrawing,
+            #   clipped so they don't spill over sprites drawn
+            #   outside it
+            for platform in self.platform_list.index.collide(rect.move(-shift, 0)):
+                if platform.static:
+                    screen.blit(platform.image, platform.rect.move(shift, 0))
+
+        self.draw_moving(screen, rect)
+        screen.set_clip(clip)
+
+    def draw_dirty(self, screen, sprite_group):
+        """Dirty-rectangle version of drawing the level plus
+           (sprite_group), which must be a RenderUpdates (or
+           another group whose draw() returns changed rects).
+
+           Erases the sprites from where they were last drawn,
+           draws them where they are now and returns the list of
+           rects that changed, for pygame.display.update().
+           If the stage scrolled, everything changed.
+        """
+        if self.full_redraw or self.drawn_shift != self.world_shift:
+            self.draw(screen)
+            sprite_group.draw(screen)
+            self.full_redraw = False
+            self.drawn_shift = self.world_shift
+            return [screen.get_rect()]
+
+        sprite_group.clear(screen, self.restore)
+
+        # Moving platforms that moved: erase them where they were
+        #   drawn and draw them where they are now
+        dirty = []
+        moved = []
+        drawn = self.moving_drawn
+        for platform in self.moving_platforms:
+            rect = platform.rect.move(self.world_shift, 0)
+            old = drawn.get(platform)
+            if old != rect:
+                if old is not None:
+                    self.restore(screen, old)
+                    dirty.append(old)
+                dirty.append(rect)
+                moved.append((platform, rect))
+                drawn[platform] = rect
+        for platform, rect in moved:
+            screen.blit(platform.image, rect)
+
+        return dirty + sprite_group.draw(screen)
+
+# Test level: Flat empty stage (Final Destination jokes go here)
+class PlayLevel_01(PlayLevel):
+    def __init__(self, player):
+        super(PlayLevel_01, self).__init__(player)
+
+        # Single flat platform to serve as floor
+        level = [[constants.SCREEN_WIDTH,15,0,(constants.SCREEN_HEIGHT-30)]]
+
+        # Add platforms to platform list
+        for platform in level:
+            block = Platform(platform[0], platform[1])
+            block.rect.x = platform[2]
+            block.rect.y = platform[3]
+            block.player = self.player
+            self.platform_list.add(block)
+
+# Test level: ground + elevated platforms to jump on
+class PlayLevel_02(PlayLevel):
+    def __init__(self, player):
+        super(PlayLevel_02, self).__init__(player)
+
+        # Ground platform plus two raised platforms
+        level = [ [constants.SCREEN_WIDTH,15,0,(constants.SCREEN_HEIGHT-30)],
+                  [80, 15, 140, (constants.SCREEN_HEIGHT-200)],
+                  [80, 15, (constants.SCREEN_WIDTH-240), (constants.SCREEN_HEIGHT-150)]
+                  ]
+
+        # Add platforms to platform list
+        for platform in level:
+            block = Platform(platform[0], platform[1])
+            block.rect.x = platform[2]
+            block.rect.y = platform[3]
+            block.player = self.player
+            self.platform_list.add(block)
+
+# Test level: Long scrolling stage with a ground floor and lots
+#   of scattered platforms, for testing the camera and culling
+class PlayLevel_03(PlayLevel):
+
+    level_width = 12000
+
+    def __init__(self, player):
+        super(PlayLevel_03, self).__init__(player)
+
+        # Ground floor in screen-wide pieces
+        level = [[constants.SCREEN_WIDTH, 15, x, (constants.SCREEN_HEIGHT-30)]
+                 for x in range(0, self.level_width, constants.SCREEN_WIDTH)]
+
+        # Platforms scattered along the stage (same layout
+        #   every time)
+        rand = random.Random(2015)
+        for n in range(2000):
+            level.append([80, 15, rand.randrange(0, self.level_width - 80),
+                          rand.randrange(120, constants.SCREEN_HEIGHT - 110)])
+
+        # Add platforms to platform list
+        for platform in level:
+            block = Platform(platform[0], platform[1])
+            block.rect.x = platform[2]
+            block.rect.y = platform[3]
+            block.player = self.player
             self.platform_list.add(block)
\ No newline at end of file
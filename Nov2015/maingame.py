@@ -1,201 +1,293 @@
-"""Main module for platformer-fighter testbed (Nov 2015)
-   Written Dec 4, 2015 by Benjamin Reed
-"""
-
-import pygame
-
-import constants
-from levels import *
-from phys_object import *
-
-def main():
-    """Main function
-    """
-
-    # Initialization
-    pygame.init()
-    print pygame.__version__
-    print pygame.font.get_default_font()
-
-    # Set screen dimensions and window caption
-    screenSize = (constants.SCREEN_WIDTH, constants.SCREEN_HEIGHT)
-    screen = pygame.display.set_mode(screenSize)
-    pygame.display.set_caption(constants.WINDOW_CAPTION)
-
-    # DEBUG: Test objects declared here
-    player = Player()
-
-    # Level list
-    #test_level = PlayLevel_01(player)
-    test_level = PlayLevel_02(player)
-    level_list = []
-    level_list.append(test_level)
-
-    # Set a list index for the current level
-    current_level_no = 0
-    current_level = level_list[current_level_no]
-
-    # Set up active sprite group
-    active_sprite_list = pygame.sprite.Group()
-    player.level = current_level
-
-    # Add player to the active sprite list once their level
-    #   member is set
-    active_sprite_list.add(player)
-
-    # ---------- Loop and event control initialization ----------
-
-    # Boolean to control main loop exit
-    done = False
-
-    # DEBUG: Game-scoped input state variables
-    #key = None
-    left_held = False
-    right_held = False
-
-    # Frame counter variable (the first of many?)
-    jump_frame_counter = 0
-
-    # Variable limit on how high the frame counter goes
-    #   (to be reassigned as needed?)
-    counter_limit = 0
-
-    # Start the clock to manage for fast the display
-    #   updates
-    clock = pygame.time.Clock()
-
-    # ---------- MAIN LOOP ----------
-    while not done:
-        # ---------- Event polling ----------
-
-        # Get key states
-        #key = pygame.key.get_pressed()
-
-        #pygame.event.get() clears event queue
-        for event in pygame.event.get():
-
-            # Look for quit event
-            if event.type == pygame.QUIT:
-                done = True
-
-            # ---------- Input handling ----------
-            # Handle KEYDOWN events
-            if event.type == pygame.KEYDOWN:
-
-                #TODO:
-                # Handle player holding both left
-                #   and right at once (resolve to
-                #   horizontal neutral input --
-                #   character does not move
-                #   horizontally)
-
-                # Keydown left: Move character left
-                if event.key == pygame.K_LEFT:
-                    #left_held = True
-                    #if not right_held:
-                        #player.go_left()
-                    #else:
-                        #player.stop()
-                    player.go_left()
-
-                # Keydown right: Move character right
-                elif event.key == pygame.K_RIGHT:
-                    #right_held = True
-                    #if not left_held:
-                        #player.go_right()
-                    #else:
-                        #player.stop()
-                    player.go_right()
-
-                # Keydown up: Jump / air jump
-                elif event.key == pygame.K_UP:
-                    jump_frame_counter +=1
-                    if player.airborne:
-                        player.air_jump()
-                    else:
-                        player.jump()
-
-            # Handle KEYUP events
-            if event.type == pygame.KEYUP:
-                # Keyup left: Stop moving left
-                if event.key == pygame.K_LEFT:
-                    #left_held = False
-                    #if player.deltaX < 0 and not right_held:
-                        #player.stop()
-                    if player.deltaX < 0:
-                        player.stop()
-
-                # Keyup right: Stop moving right
-                elif event.key == pygame.K_RIGHT:
-                    #right_held = False
-                    #if player.deltaX > 0 and not left_held:
-                        #player.stop()
-                    if player.deltaX > 0:
-                        player.stop()
-
-                # Keyup up: Test how long since jump button pressed and
-                #   determine height of jump
-                elif event.key == pygame.K_UP:
-
-                    # If 10 frames or less have passed between jump press
-                    #   and jump release, player's upward momentum is arrested to
-                    #   cause a short jump
-                    if jump_frame_counter <= 10:
-                        player.stop_rising()
-
-                    # Reset jump frame counter
-                    jump_frame_counter = 0
-
-        #if key[pygame.K_LEFT] and key[pygame.K_RIGHT]:
-            #print "Both held"
-            #player.stop()
-
-        # ---------- Update ----------
-
-        # Update active sprites
-        active_sprite_list.update()
-
-        # DEBUG: Player vs screen boundary handling (right)
-        if player.rect.right > constants.SCREEN_WIDTH:
-            player.rect.right = constants.SCREEN_WIDTH
-
-        # DEBUG: Player vs screen boundary handling (left)
-        if player.rect.left < 0:
-            player.rect.left = 0
-
-        # ---------- Draw code begins ----------
-
-        # Draw current level
-        current_level.draw(screen)
-
-        # Draw active sprite list
-        active_sprite_list.draw(screen)
-
-        # ---------- Draw code ends ----------
-
-        # Test the frame counter(s) to make sure we don't
-        #   count past whatever limit(s) we set
-        if jump_frame_counter == counter_limit:
-            jump_frame_counter = 0
-
-        # If frame counters are greater than 0, they're clearly
-        #   counting time since some event, so add 1 to their
-        #   values
-        if jump_frame_counter > 0:
-            jump_frame_counter+=1
-
-        # Limit to target frame rate (60 fps)
-        clock.tick(constants.TARGET_FRAME_RATE)
-
-        # DEBUG: Print FPS to console
-        # print clock.get_fps()
-
-        # Flip display
-        pygame.display.flip()
-
-    # Be IDLE friendly. If you forget this line, the program will 'hang'
-    # on exit.
-    pygame.quit()
-
-if __name__ == "__main__":
-    main()
+"""Main module for platformer-fighter testbed (Nov 2015)
+   Written Dec 4, 2015 by Benjamin Reed
+"""
+
+# Time startup from before the imports (see --startup-profile)
+import timeit
+STARTUP_START = timeit.default_timer()
+
+import argparse
+
+import pygame
+
+import asset_bundle
+import constants
+from controls import InputMapper
+from debug import DebugOverlay
+from frame_pacing import PACERS, make_pacer
+from level_loader import LevelLoader
+from phys_object import Player
+from profiler import (FrameProfiler, StartupProfile, POLL_WAIT, EVENT_POLL,
+                      LEVEL_DRAW, SPRITE_DRAW, FLIP, TICK_WAIT)
+from render_target import RenderTarget
+from replay import InputRecorder, state_checksum
+from simulation import Simulation, FixedTimestep
+from telemetry import TelemetryWriter
+
+try:
+    import particles
+except ImportError:
+    # Projectiles and hit sparks need NumPy; the game plays
+    #   without them
+    particles = None
+
+def main(argv=None):
+    """Main function
+    """
+
+    # Command line options
+    parser = argparse.ArgumentParser(description=constants.WINDOW_CAPTION)
+    parser.add_argument("--record", metavar="FILE",
+                        help="record input to a replay file")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each phase of the main loop from the start")
+    parser.add_argument("--telemetry", metavar="FILE",
+                        help="stream frame timings and player events to FILE "
+                             "(.json for Chrome trace format, .jsonl for JSON lines)")
+    parser.add_argument("--pacing", default=constants.FRAME_PACING, choices=sorted(PACERS),
+                        help="where each frame waits (see frame_pacing)")
+    parser.add_argument("--pacing-stats", action="store_true",
+                        help="print input-to-flip latency and frame jitter on exit")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="print how long each step of startup took, up to "
+                             "the first frame")
+    parser.add_argument("--window-size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"),
+                        default=(constants.WINDOW_WIDTH, constants.WINDOW_HEIGHT),
+                        help="size of the window")
+    parser.add_argument("--render-size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"),
+                        default=constants.RENDER_SIZE,
+                        help="draw into an internal render target of this size, "
+                             "scaled to the window each frame (see render_target)")
+    args = parser.parse_args(argv)
+    startup = StartupProfile(STARTUP_START)
+    startup.mark("imports")
+
+    # Initialization. Only the display: the game has no sound, and
+    #   opening the audio device can take a while on some systems
+    #   (fonts and joysticks start up when they're first used)
+    pygame.display.init()
+    print pygame.__version__
+    print pygame.font.get_default_font()
+    startup.mark("pygame init")
+
+    # Set window dimensions and caption
+    windowSize = tuple(args.window_size)
+    pacer = make_pacer(args.pacing)
+    window = pacer.open_display(windowSize)
+    pygame.display.set_caption(constants.WINDOW_CAPTION)
+
+    # Everything is drawn in logical (SCREEN_WIDTH x SCREEN_HEIGHT)
+    #   coordinates onto screen: the window, or a render target
+    #   that's scaled to it once per frame
+    render_target = RenderTarget(window, args.render_size)
+    screen = render_target.view
+    startup.mark("display")
+
+    # Sprite frames prebuilt by asset_bundle.py, if there's a
+    #   bundle (otherwise they're cut from the sheets as each
+    #   character is first built)
+    asset_bundle.load_bundle()
+    startup.mark("sprite bundle")
+
+    # DEBUG: Test objects declared here
+    player = Player()
+    startup.mark("player")
+
+    # Level loader: stage files are read when first needed and
+    #   kept in a small cache; levels are built from them
+    level_loader = LevelLoader(constants.STAGE_FILES)
+
+    # Set a list index for the current level
+    current_level_no = 1
+    current_level = level_loader.get(current_level_no, player)
+    player.rect.topleft = current_level.spawn_points[0]
+
+    # Read the next stage in the background so switching to it
+    #   only has to build it
+    level_loader.prefetch(current_level_no + 1)
+    startup.mark("level")
+
+    # Set up active sprite group (a RenderUpdates group, so
+    #   drawing it reports which rects changed)
+    active_sprite_list = pygame.sprite.RenderUpdates()
+
+    # Set up the simulation, which sets the player's level
+    #   member and adds them to the active sprite list
+    #   (with pooled projectiles and hit sparks, drawn over the
+    #   sprites, if we have NumPy)
+    pools = []
+    if particles:
+        pools = [particles.ProjectilePool(constants.PROJECTILE_POOL_SIZE,
+                                          particles.projectile_kinds()),
+                 particles.ParticlePool(constants.PARTICLE_POOL_SIZE,
+                                        particles.spark_images())]
+        sim = Simulation(current_level, [player], active_sprite_list,
+                         projectiles=pools[0])
+        sim.effects = pools[1]
+    else:
+        sim = Simulation(current_level, [player], active_sprite_list)
+
+    # Fixed-timestep accumulator: the sim always steps at
+    #   TARGET_FRAME_RATE no matter how fast we draw
+    timestep = FixedTimestep()
+
+    # ---------- Loop and event control initialization ----------
+
+    # Boolean to control main loop exit
+    done = False
+
+    # Keyboard/joystick input (see constants.PLAYER_BINDINGS),
+    #   sampled once per sim step
+    input_mapper = InputMapper(len(sim.players))
+    input_mapper.init_joysticks()
+
+    # Optionally stream every step's input and state checksum
+    #   to a replay file
+    recorder = None
+    if args.record:
+        recorder = InputRecorder(args.record, current_level.name, len(sim.players))
+
+    # Per-phase frame timing (off unless --profile is given or
+    #   the debug overlay is shown with F3)
+    frame_profiler = FrameProfiler(enabled=args.profile)
+    sim.profiler = frame_profiler
+    overlay = DebugOverlay(frame_profiler)
+    overlay.track([player])
+
+    # Optionally stream timings and events to disk for offline
+    #   analysis (needs the profiler running)
+    telemetry = None
+    collision_queries = 0
+    if args.telemetry:
+        telemetry = TelemetryWriter(args.telemetry)
+        frame_profiler.enabled = True
+        player.event_listener = telemetry.player_event
+
+    startup.mark("setup")
+
+    # ---------- MAIN LOOP ----------
+    while not done:
+        frame_profiler.begin_frame()
+
+        # Wait for the frame (how, and for how long, is up to the
+        #   pacer) and measure how much real time the sim has to
+        #   catch up on
+        frame_time = pacer.wait_for_input()
+        frame_profiler.mark(POLL_WAIT)
+
+        # ---------- Event polling ----------
+
+        #pygame.event.get() clears event queue
+        for event in pygame.event.get():
+
+            # Look for quit event
+            if event.type == pygame.QUIT:
+                done = True
+
+            # F3: Toggle the debug overlay
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                overlay.toggle()
+                current_level.invalidate()
+
+            # Page Up/Page Down: Switch to the previous/next stage
+            #   (not while recording, replays only know one stage)
+            if (event.type == pygame.KEYDOWN and not recorder and
+                    event.key in (pygame.K_PAGEUP, pygame.K_PAGEDOWN)):
+                if event.key == pygame.K_PAGEDOWN:
+                    current_level_no = (current_level_no + 1) % len(level_loader)
+                else:
+                    current_level_no = (current_level_no - 1) % len(level_loader)
+                current_level = level_loader.get(current_level_no, player)
+                player.rect.topleft = current_level.spawn_points[0]
+                sim.set_level(current_level)
+                collision_queries = current_level.world.queries
+                level_loader.prefetch(current_level_no + 1)
+
+            # ---------- Input handling ----------
+            # Collect presses/releases of bound keys and buttons
+            #   into the input masks for the next sim step (see
+            #   controls.PlayerController for what each one does to
+            #   the player)
+            input_mapper.handle_event(event)
+
+        frame_profiler.mark(EVENT_POLL)
+
+        # ---------- Update ----------
+
+        # Run however many fixed sim steps the real time since
+        #   the last frame calls for
+        for step in range(timestep.advance(frame_time)):
+            inputs = input_mapper.sample(sim.frame)
+            sim.step(inputs)
+            if recorder:
+                recorder.record(inputs, state_checksum(sim))
+
+        # ---------- Draw code begins ----------
+
+        # Draw current level and active sprite list, with the
+        #   sprites blended between the last two sim states
+        with sim.interpolated(timestep.alpha()):
+            # (Particles aren't tracked by the dirty rects, so
+            #   redraw everything while any are flying)
+            if (constants.DIRTY_RECT_RENDERING and not overlay.visible and
+                    not any(pool.count for pool in pools)):
+                # Only redraw what moved
+                dirty_rects = current_level.draw_dirty(screen, active_sprite_list)
+                frame_profiler.mark(LEVEL_DRAW)
+            else:
+                current_level.draw(screen)
+                frame_profiler.mark(LEVEL_DRAW)
+                active_sprite_list.draw(screen)
+                for pool in pools:
+                    pool.draw(screen, current_level.world_shift)
+                dirty_rects = None
+
+            # Scale the frame to the window (if drawn into a render
+            #   target), then the debug overlay over it at window
+            #   resolution (does nothing unless toggled on)
+            dirty_rects = render_target.present(dirty_rects)
+            overlay.draw(render_target.window_view, current_level)
+        frame_profiler.mark(SPRITE_DRAW)
+
+        # ---------- Draw code ends ----------
+
+        # Flip display (or just push the rects that changed)
+        if dirty_rects is not None:
+            pygame.display.update(dirty_rects)
+        else:
+            pygame.display.flip()
+        frame_profiler.mark(FLIP)
+
+        # Startup is over once the first frame is on screen
+        if startup is not None:
+            startup.mark("first frame")
+            if args.startup_profile:
+                print(startup.report())
+            startup = None
+
+        # Let the pacer do any waiting it does after the flip
+        pacer.flipped()
+        frame_profiler.mark(TICK_WAIT)
+        frame_profiler.end_frame()
+
+        if telemetry:
+            queries = current_level.world.queries
+            telemetry.record_frame(frame_profiler, queries - collision_queries)
+            collision_queries = queries
+
+        # DEBUG: Print FPS to console
+        # print 1.0 / frame_time
+
+    if args.pacing_stats:
+        print("%s pacing: %s" % (pacer.name, pacer.stats.report()))
+    if recorder:
+        recorder.close()
+    if telemetry:
+        telemetry.close()
+
+    # Be IDLE friendly. If you forget this line, the program will 'hang'
+    # on exit.
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
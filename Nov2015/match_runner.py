@@ -0,0 +1,319 @@
+"""Module for running lots of headless matches in parallel, e.g. for
+   balance tuning.
+
+   Matches are spread over a pool of worker processes. Each worker
+   initializes pygame headless and loads the sprite assets once,
+   then runs whole matches (same Player/PlayLevel logic as the game,
+   driven by bots instead of the keyboard) and sends back a small
+   result dict per match. Results are aggregated as they arrive, so
+   a long batch can be watched or written out while it runs.
+
+   Each match only depends on its spec (level, frames, bot, seed),
+   so a batch gives the same results however many workers run it.
+"""
+import json
+import os
+import random
+import timeit
+
+import constants
+import controls
+from controls import held_mask
+
+# -------- Bots --------
+
+class ScriptedBot(object):
+    """Plays a fixed script over and over: a list of (frames, held
+       actions) pairs, e.g. [(30, RIGHT), (1, RIGHT | JUMP)]
+    """
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.index = 0
+        self.frames_left = self.script[0][0]
+
+    def held(self, sim, player):
+        """Action bits the bot wants held this step"""
+        if self.frames_left <= 0:
+            self.index = (self.index + 1) % len(self.script)
+            self.frames_left = self.script[self.index][0]
+        self.frames_left -= sim.frame_steps
+        return self.script[self.index][1]
+
+class RandomBot(object):
+    """Holds random combinations of actions for random lengths of
+       time, jumping more often when it's on the ground
+    """
+
+    # (held actions, weight) to pick from
+    CHOICES = ((0, 1),
+               (controls.LEFT, 3),
+               (controls.RIGHT, 3),
+               (controls.JUMP, 1),
+               (controls.LEFT | controls.JUMP, 2),
+               (controls.RIGHT | controls.JUMP, 2))
+
+    def __init__(self, seed, min_hold=2, max_hold=40):
+        self.random = random.Random(seed)
+        self.min_hold = min_hold
+        self.max_hold = max_hold
+        self.current = 0
+        self.frames_left = 0
+
+        self.choices = []
+        for actions, weight in self.CHOICES:
+            self.choices += [actions] * weight
+
+    def held(self, sim, player):
+        if self.frames_left <= 0:
+            self.current = self.random.choice(self.choices)
+            self.frames_left = self.random.randint(self.min_hold, self.max_hold)
+        self.frames_left -= sim.frame_steps
+        return self.current
+
+# Bot name -> callable(seed) building a bot
+BOTS = {
+    "random": RandomBot,
+    "runner": lambda seed: ScriptedBot([(45, controls.RIGHT),
+                                        (12, controls.RIGHT | controls.JUMP),
+                                        (45, controls.LEFT),
+                                        (12, controls.LEFT | controls.JUMP)]),
+    "idle": lambda seed: ScriptedBot([(1, 0)]),
+}
+
+# -------- Custom metrics --------
+
+# Metric name -> callable(sim) run at the end of every match.
+#   Register metrics at import time (in this module or one the
+#   workers import) so every worker process has them.
+METRICS = {}
+
+def register_metric(name, func):
+    METRICS[name] = func
+
+register_metric("world_shift", lambda sim: sim.level.world_shift)
+
+# -------- Match statistics --------
+
+class MatchStats(object):
+    """Player event listener counting what happened in one match.
+
+       INSTANCE VARIABLES:
+       events :
+          Dict of Player event name -> number of times it happened
+       airborne_frames :
+          Frames (at the normal frame rate, however often the sim
+          steps) the player spent in the air
+       highest :
+          Highest point (smallest rect.top) the player reached
+       distance :
+          Total pixels moved along the x-axis
+    """
+
+    def __init__(self, player):
+        self.events = {"jump": 0, "air_jump": 0, "land": 0, "stop_rising": 0}
+        self.airborne_frames = 0
+        self.highest = player.rect.top
+        self.distance = 0
+        self.last_x = player.rect.x
+
+    def __call__(self, player, event):
+        self.events[event] = self.events.get(event, 0) + 1
+
+    def step(self, player, frames=1):
+        """Update after every sim step, which covered (frames)
+           frames (a sim's frame_steps)
+        """
+        if player.airborne:
+            self.airborne_frames += frames
+        if player.rect.top < self.highest:
+            self.highest = player.rect.top
+        self.distance += abs(player.rect.x - self.last_x)
+        self.last_x = player.rect.x
+
+# -------- Worker side --------
+
+def worker_init(character=None):
+    """Pool initializer: headless pygame plus the sprite assets
+       (from the prebuilt bundle if there is one), loaded once per
+       worker process instead of once per match
+    """
+    from simulation import init_headless
+    init_headless()
+
+    import animation
+    import asset_bundle
+    import characters
+    asset_bundle.load_bundle()
+    animation.get_animation_set(character or constants.PLAYER_CHARACTER)
+
+def make_spec(match_id, level, frames, bot, seed, hz=constants.TARGET_FRAME_RATE):
+    """Dict describing one match (plain data, so it pickles cheaply).
+       (frames) is the match length in frames at the normal frame
+       rate; the sim steps (hz) times per second of game time.
+    """
+    return {"id": match_id, "level": level, "frames": frames,
+            "bot": bot, "seed": seed, "hz": hz}
+
+def run_match(spec):
+    """Run the match (spec) describes and return its result dict"""
+    from level_loader import build_level
+    from phys_object import Player
+    from simulation import Simulation
+
+    start = timeit.default_timer()
+
+    player = Player()
+    level = build_level(spec["level"], player)
+    spawn_points = getattr(level, "spawn_points", None)
+    if spawn_points:
+        player.rect.topleft = spawn_points[0]
+    sim = Simulation(level, [player], timestep=1.0 / spec["hz"])
+
+    stats = MatchStats(player)
+    player.event_listener = stats
+    bot = BOTS[spec["bot"]](spec["seed"])
+
+    held = 0
+    inputs = [0]
+    steps = int(round(spec["frames"] / sim.frame_steps))
+    for x in range(steps):
+        want = bot.held(sim, player)
+        inputs[0] = held_mask(held, want)
+        held = want
+        sim.step(inputs)
+        stats.step(player, sim.frame_steps)
+
+    result = {"id": spec["id"], "level": spec["level"], "bot": spec["bot"],
+              "seed": spec["seed"], "hz": spec["hz"], "steps": sim.frame,
+              "frames": int(round(sim.frame * sim.frame_steps)),
+              "x": player.rect.x, "y": player.rect.y,
+              "airborne_frames": int(round(stats.airborne_frames)),
+              "highest": stats.highest, "distance": stats.distance,
+              "worker": os.getpid(),
+              "seconds": timeit.default_timer() - start}
+    for name, count in stats.events.items():
+        result[name] = count
+    for name, func in METRICS.items():
+        result[name] = func(sim)
+    return result
+
+# -------- Aggregator --------
+
+class Aggregator(object):
+    """Collects match results as they come in.
+
+       INSTANCE VARIABLES:
+       matches :
+          Number of results collected
+       totals :
+          Dict of numeric result field -> sum over all matches
+       workers :
+          Dict of worker pid -> [matches, frames, seconds]
+    """
+
+    # Result fields that aren't summed
+    SKIP = ("id", "level", "bot", "seed", "hz", "worker", "seconds")
+
+    def __init__(self):
+        self.matches = 0
+        self.totals = {}
+        self.workers = {}
+
+    def add(self, result):
+        self.matches += 1
+        for name, value in result.items():
+            if name in self.SKIP or not isinstance(value, (int, float)):
+                continue
+            self.totals[name] = self.totals.get(name, 0) + value
+
+        worker = self.workers.setdefault(result["worker"], [0, 0, 0.0])
+        worker[0] += 1
+        worker[1] += result["frames"]
+        worker[2] += result["seconds"]
+
+    def means(self):
+        """Dict of numeric result field -> mean per match"""
+        if not self.matches:
+            return {}
+        return dict((name, float(total) / self.matches)
+                    for name, total in self.totals.items())
+
+    def throughput(self):
+        """List of (worker pid, matches, frames per busy second)"""
+        return [(pid, matches, frames / seconds if seconds > 0 else float("inf"))
+                for pid, (matches, frames, seconds) in sorted(self.workers.items())]
+
+def run_batch(specs, workers=None, aggregator=None, chunksize=None, out=None):
+    """Run every match in (specs) on (workers) processes (all cores
+       by default), adding results to (aggregator) as they finish
+       and writing them to the file (out) as JSON lines if given.
+       Returns (aggregator, wall clock seconds).
+    """
+    import multiprocessing
+
+    specs = list(specs)
+    if aggregator is None:
+        aggregator = Aggregator()
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if chunksize is None:
+        # A few chunks per worker keeps them all busy to the end
+        #   without a round trip per match
+        chunksize = max(1, len(specs) // (workers * 4))
+
+    start = timeit.default_timer()
+    pool = multiprocessing.Pool(workers, initializer=worker_init)
+    try:
+        for result in pool.imap_unordered(run_match, specs, chunksize):
+            aggregator.add(result)
+            if out is not None:
+                out.write(json.dumps(result, sort_keys=True) + "\n")
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return aggregator, timeit.default_timer() - start
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run headless matches in parallel")
+    parser.add_argument("--matches", type=int, default=1000,
+                        help="number of matches to run")
+    parser.add_argument("--frames", type=int, default=3600,
+                        help="frames per match (at the normal frame rate)")
+    parser.add_argument("--hz", type=float, default=constants.TARGET_FRAME_RATE,
+                        help="simulation steps per second of game time (fewer "
+                             "steps per match run faster)")
+    parser.add_argument("--level", default="PlayLevel_02",
+                        help="level class name or stage file to play")
+    parser.add_argument("--bot", default="random", choices=sorted(BOTS),
+                        help="bot driving the player")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the first match (match n uses seed + n)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--out", metavar="FILE",
+                        help="write every match result to FILE as JSON lines")
+    args = parser.parse_args()
+
+    specs = [make_spec(n, args.level, args.frames, args.bot, args.seed + n, args.hz)
+             for n in range(args.matches)]
+
+    out = open(args.out, "w") if args.out else None
+    try:
+        aggregator, elapsed = run_batch(specs, args.workers, out=out)
+    finally:
+        if out is not None:
+            out.close()
+
+    frames = aggregator.totals.get("frames", 0)
+    print("Ran %d matches (%d frames) in %.1f s, %.0f frames/sec overall"
+          % (aggregator.matches, frames, elapsed, frames / elapsed))
+    for name, mean in sorted(aggregator.means().items()):
+        print("  mean %-16s %10.2f" % (name, mean))
+    for pid, matches, fps in aggregator.throughput():
+        print("  worker %-7d %5d matches %8.0f frames/sec" % (pid, matches, fps))
@@ -0,0 +1,371 @@
+"""Module for pooled particles and projectiles: hit sparks, dust and
+   fighter projectiles, kept in preallocated NumPy arrays instead of
+   one Sprite (with its own Surface, Rect and Group memberships)
+   each.
+
+   A pool has a fixed capacity. Every field is a parallel array with
+   a slot per particle, and the free slots sit on a stack of
+   indices, so spawning and despawning only move the top of the
+   stack: no Python objects are created, and even a burst of
+   thousands of particles leaves nothing new for the garbage
+   collector to walk. update() moves every particle with a few array
+   operations over the whole pool, and draw() hands all the live
+   ones to a single Surface.blits() call (one blit at a time on
+   pygames older than 1.9.4, which don't have it).
+
+   Requires NumPy.
+"""
+from itertools import islice
+
+import numpy
+import pygame
+
+import combat
+import constants
+
+# Steps (fractions of a turn, of the speed range and of the
+#   lifetime range) between consecutive entries of the burst
+#   spread tables: the golden ratio, sqrt(2) and sqrt(3)
+SPREAD_ANGLE = 0.6180339887498949
+SPREAD_SPEED = 0.4142135623730951
+SPREAD_LIFE = 0.7320508075688772
+
+def spark_images():
+    """Images for hit sparks: white (hits) and yellow (clanks)"""
+    images = []
+    for color, size in ((constants.WHITE, 3), (constants.YELLOW, 3)):
+        image = pygame.Surface([size, size])
+        image.fill(color)
+        images.append(image)
+    return images
+
+def projectile_kinds():
+    """Default kinds of projectile: (image, Attack) pairs"""
+    bolt = pygame.Surface([16, 6])
+    bolt.fill(constants.CYAN)
+    return [(bolt, combat.Attack(4, 3, -3))]
+
+class ParticlePool(object):
+    """Up to (capacity) particles flying in straight lines (bent by
+       gravity) for a while.
+
+       INSTANCE VARIABLES:
+       capacity :
+          Number of slots
+       images :
+          List of Surfaces particles are drawn with; each particle
+          stores an index into it
+       gravity :
+          Added to every particle's deltaY per frame
+       x, y, deltaX, deltaY :
+          Position (top-left, world coordinates) and speed (pixels
+          per frame) of each slot
+       life :
+          Frames each slot has left
+       image :
+          Index into (images) of each slot
+       alive :
+          Which slots are in use
+       free, free_count :
+          Stack of free slots (free[:free_count], the next one to
+          use on top)
+    """
+
+    def __init__(self, capacity, images, gravity=0.0):
+        self.capacity = capacity
+        self.images = list(images)
+        self.gravity = gravity
+
+        self.x = numpy.zeros(capacity)
+        self.y = numpy.zeros(capacity)
+        self.deltaX = numpy.zeros(capacity)
+        self.deltaY = numpy.zeros(capacity)
+        self.life = numpy.zeros(capacity)
+        self.image = numpy.zeros(capacity, dtype=numpy.intp)
+        self.alive = numpy.zeros(capacity, dtype=bool)
+
+        self.free = numpy.arange(capacity - 1, -1, -1, dtype=numpy.intp)
+        self.free_count = capacity
+
+        # Scratch arrays update() and burst() work in
+        self.scratch = numpy.zeros(capacity)
+        self.expired = numpy.zeros(capacity, dtype=bool)
+
+        # Blit sequence draw() fills in, one [image, [x, y]] entry
+        #   per slot, kept so drawing doesn't make thousands of
+        #   new tuples every frame
+        self.blit_sequence = [[None, [0, 0]] for n in range(capacity)]
+
+        # Directions (with a spread of speeds) and lifetimes that
+        #   bursts fan out along, worked out once up front. Each is
+        #   a sequence of multiples of an irrational number, which
+        #   spreads any run of entries evenly, without the import
+        #   time numpy.random costs at startup
+        n = numpy.arange(capacity)
+        angle = 2 * numpy.pi * ((n * SPREAD_ANGLE) % 1.0)
+        speed = 0.25 + 0.75 * ((n * SPREAD_SPEED) % 1.0)
+        self.spread_x = numpy.cos(angle) * speed
+        self.spread_y = numpy.sin(angle) * speed
+        self.spread_life = 0.5 + 0.5 * ((n * SPREAD_LIFE) % 1.0)
+        self.spread_next = 0
+
+    @property
+    def count(self):
+        """Number of live particles"""
+        return self.capacity - self.free_count
+
+    def spawn(self, x, y, deltaX, deltaY, life, image=0):
+        """Start one particle. Returns its slot, or -1 if the pool
+           is full.
+        """
+        if not self.free_count:
+            return -1
+        self.free_count -= 1
+        slot = self.free[self.free_count]
+
+        self.x[slot] = x
+        self.y[slot] = y
+        self.deltaX[slot] = deltaX
+        self.deltaY[slot] = deltaY
+        self.life[slot] = life
+        self.image[slot] = image
+        self.alive[slot] = True
+        return slot
+
+    def burst(self, count, x, y, speed, life, image=0):
+        """Start up to (count) particles at (x, y) flying out every
+           which way at up to (speed) for up to (life) frames.
+           Returns how many started (fewer if the pool fills up).
+        """
+        count = min(count, self.free_count)
+        if count <= 0:
+            return 0
+        top = self.free_count
+        slots = self.free[top - count:top]
+        self.free_count = top - count
+
+        # Next (count) entries of the spread tables, starting over
+        #   when they run out
+        start = self.spread_next
+        if start + count > self.capacity:
+            start = 0
+        end = start + count
+        self.spread_next = end
+        scratch = self.scratch[:count]
+
+        self.x[slots] = x
+        self.y[slots] = y
+        numpy.multiply(self.spread_x[start:end], speed, out=scratch)
+        self.deltaX[slots] = scratch
+        numpy.multiply(self.spread_y[start:end], speed, out=scratch)
+        self.deltaY[slots] = scratch
+        numpy.multiply(self.spread_life[start:end], life, out=scratch)
+        self.life[slots] = scratch
+        self.image[slots] = image
+        self.alive[slots] = True
+        return count
+
+    def kill(self, slot):
+        """Put particle (slot) back in the pool"""
+        if self.alive[slot]:
+            self.alive[slot] = False
+            self.free[self.free_count] = slot
+            self.free_count += 1
+
+    def clear(self):
+        """Put every particle back in the pool"""
+        self.alive[:] = False
+        self.free[:] = numpy.arange(self.capacity - 1, -1, -1)
+        self.free_count = self.capacity
+
+    def update(self, frames=1):
+        """Advance every particle (frames) frames, putting back
+           the ones whose time is up
+        """
+        if self.free_count == self.capacity:
+            return
+
+        # Free slots move too; it's cheaper than picking out the
+        #   live ones, and nothing reads them
+        scratch = self.scratch
+        if self.gravity:
+            self.deltaY += self.gravity * frames
+        numpy.multiply(self.deltaX, frames, out=scratch)
+        self.x += scratch
+        numpy.multiply(self.deltaY, frames, out=scratch)
+        self.y += scratch
+        self.life -= frames
+
+        expired = numpy.less_equal(self.life, 0, out=self.expired)
+        expired &= self.alive
+        if expired.any():
+            slots = numpy.flatnonzero(expired)
+            self.alive[slots] = False
+            top = self.free_count
+            self.free[top:top + len(slots)] = slots
+            self.free_count = top + len(slots)
+
+    def draw(self, screen, shift=0):
+        """Draw every live particle on (screen) (a Surface or a
+           render_target.ScaledView), scrolled (shift) pixels along
+           x
+        """
+        if self.free_count == self.capacity:
+            return
+        live = numpy.flatnonzero(self.alive)
+
+        # Skip the ones well off the screen
+        x = self.x[live] + shift
+        on_screen = (x > -constants.CULL_MARGIN) & (x < screen.get_width())
+        live = live[on_screen]
+        x = x[on_screen]
+        y = self.y[live]
+        images = self.images
+
+        # Through a render_target.ScaledView, scale the positions
+        #   here (a whole array at a time, rather than one blit at
+        #   a time in the view) and blit its scaled images straight
+        #   onto the Surface underneath
+        scale = getattr(screen, "scale", None)
+        if scale is not None:
+            images = [screen.scaled(image) for image in images]
+            x = numpy.floor(x * scale[0])
+            y = numpy.floor(y * scale[1])
+            screen = screen.surface
+
+        sequence = self.blit_sequence
+        for entry, image, left, top in zip(sequence,
+                                           self.image[live].tolist(),
+                                           x.astype(int).tolist(),
+                                           y.astype(int).tolist()):
+            entry[0] = images[image]
+            position = entry[1]
+            position[0] = left
+            position[1] = top
+
+        if hasattr(screen, "blits"):
+            screen.blits(islice(sequence, len(live)), False)
+        else:
+            for image, position in islice(sequence, len(live)):
+                screen.blit(image, position)
+
+class ProjectileSlot(object):
+    """One slot of a ProjectilePool as a combatant for the
+       CombatWorld (made once per slot when the pool is built)
+    """
+    __slots__ = ("pool", "slot")
+
+    def __init__(self, pool, slot):
+        self.pool = pool
+        self.slot = slot
+
+    @property
+    def owner(self):
+        return self.pool.fighters[self.pool.owner[self.slot]]
+
+    @property
+    def hit_mask(self):
+        return int(self.pool.hit_mask[self.slot])
+
+    @hit_mask.setter
+    def hit_mask(self, value):
+        self.pool.hit_mask[self.slot] = value
+
+    def attack_data(self):
+        return self.pool.attacks[self.pool.image[self.slot]]
+
+    def facing(self):
+        return 1 if self.pool.deltaX[self.slot] >= 0 else -1
+
+    def hit_landed(self, hitstop):
+        self.pool.kill(self.slot)
+
+    def clank(self, hitstop):
+        self.pool.hit_mask[self.slot] = combat.SPENT
+        self.pool.kill(self.slot)
+
+class ProjectilePool(ParticlePool):
+    """Particles that attack: each one's hitbox is its image's size,
+       and it goes away after one hit, one clank or its lifetime.
+       A projectile's kind picks both its image and its Attack.
+
+       INSTANCE VARIABLES:
+       attacks :
+          Attack of each kind
+       fighters :
+          The CombatWorld's fighters (set by CombatWorld.add_pool);
+          owners are stored as indices into it
+       owner :
+          Index into (fighters) of the fighter that fired each slot
+       hit_mask :
+          combat hit_mask of each slot
+    """
+
+    def __init__(self, capacity, kinds):
+        images = [image for image, attack in kinds]
+        super(ProjectilePool, self).__init__(capacity, images)
+        self.attacks = [attack for image, attack in kinds]
+        self.sizes = [image.get_size() for image in images]
+        self.fighters = []
+
+        self.owner = numpy.zeros(capacity, dtype=numpy.intp)
+        self.hit_mask = numpy.zeros(capacity, dtype=numpy.int64)
+        self.handles = [ProjectileSlot(self, slot) for slot in range(capacity)]
+
+        self.STATE_SIZE = capacity * 10 + 1
+
+    def fire(self, owner, kind, x, y, deltaX, deltaY=0, life=60):
+        """Fire a projectile of (kind) from fighter (owner). Returns
+           its slot, or -1 if the pool is full.
+        """
+        slot = self.spawn(x, y, deltaX, deltaY, life, kind)
+        if slot >= 0:
+            self.owner[slot] = self.fighters.index(owner)
+            self.hit_mask[slot] = 0
+        return slot
+
+    def combat_boxes(self, boxes):
+        """Append the hitbox of every live projectile that can still
+           hit to (boxes), in the CombatWorld's sweep format
+        """
+        if self.free_count == self.capacity:
+            return
+        sizes = self.sizes
+        fighters = self.fighters
+        handles = self.handles
+        live = numpy.flatnonzero(self.alive & (self.hit_mask != combat.SPENT))
+        for slot, x, y, kind, owner in zip(live.tolist(),
+                                           self.x[live].astype(int).tolist(),
+                                           self.y[live].astype(int).tolist(),
+                                           self.image[live].tolist(),
+                                           self.owner[live].tolist()):
+            width, height = sizes[kind]
+            boxes.append((x, y, x + width, y + height, handles[slot],
+                          fighters[owner], combat.HIT))
+
+    # -------- State snapshots (for rollback) --------
+    # (STATE_SIZE is set per pool, from its capacity)
+
+    def save_state(self, buf, offset):
+        """Write every slot and the free stack into (buf) (an
+           array('d'), as SnapshotRing's is) at (offset)
+        """
+        capacity = self.capacity
+        view = numpy.frombuffer(buf, dtype=numpy.float64,
+                                count=self.STATE_SIZE, offset=offset * 8)
+        fields = (self.x, self.y, self.deltaX, self.deltaY, self.life,
+                  self.image, self.alive, self.owner, self.hit_mask, self.free)
+        for n, field in enumerate(fields):
+            view[n * capacity:(n + 1) * capacity] = field
+        view[-1] = self.free_count
+
+    def load_state(self, buf, offset):
+        """Restore the state save_state() wrote at (offset)"""
+        capacity = self.capacity
+        view = numpy.frombuffer(buf, dtype=numpy.float64,
+                                count=self.STATE_SIZE, offset=offset * 8)
+        fields = (self.x, self.y, self.deltaX, self.deltaY, self.life,
+                  self.image, self.alive, self.owner, self.hit_mask, self.free)
+        for n, field in enumerate(fields):
+            field[:] = view[n * capacity:(n + 1) * capacity]
+        self.free_count = int(view[-1])
@@ -1,348 +1,435 @@
-"""Module for game objects with physical properties
-   (movement, collision, etc.)
-   Written Dec 4, 2015 by Benjamin Reed
-"""
-import pygame
-
-import constants
-from spritesheet import *
-
-class PhysObject(pygame.sprite.Sprite):
-    """Generic physical object class that extends Sprite"""
-
-    # --- Attributes ---
-
-    # Vector attributes
-    deltaX = 0
-    deltaY = 0
-
-    def __init__(self, color=constants.RED, width=30, height=50):
-        """Constructor (color=constants.RED, width=30, height=50)"""
-
-        # Call superconstructor
-        super(PhysObject, self).__init__()
-
-        # DEBUG: Set image to a Surface so as to draw a rect
-        self.image = pygame.Surface([width, height])
-        self.image.fill(color)
-
-        # DEBUG: Set collision rect to image rect
-        self.rect = self.image.get_rect()
-
-        # DEBUG: Initialize rect coords to determine
-        #   drawing coords
-        self.rect.x = 10
-        self.rect.y = 10
-
-#class Player(PhysObject):
-class Player(pygame.sprite.Sprite):
-    """Test player character class.
-
-       INSTANCE VARIABLES:
-       RUN_SPEED :
-          Character's left/right speed while standing on a surface
-       AIR_STEER_SPEED :
-          Character's left/right speed during a jump or fall
-       movement_speed :
-          Character's current left/right movement speed
-       jump_force :
-          Force applied when character jumps from ground
-       air_jump_force :
-          Force applied when character jumps in air
-       gravity_force:
-          Downward force applied while character is airborne
-
-       direction :
-          Character's sprite facing direction
-       airborne :
-          Tracks if character is grounded or airborne
-       air_jumped:
-          Tracks if character has jumped in the air or not
-    """
-    # -------- Input state variables --------
-    left_held = False
-    right_held = False
-
-    # -------- Movement attributes --------
-    deltaX = 0
-    deltaY = 0
-    RUN_SPEED = 6
-    AIR_STEER_SPEED = 3
-    movement_speed = RUN_SPEED
-    jump_force = -10
-    #air_jump_force = 0.75 * jump_force
-    air_jump_force = jump_force
-    gravity_force = .35
-
-    # -------- Character state variables --------
-    direction = "R"
-    airborne = True
-    air_jumped = False
-
-    # -------- Frame counting variables --------
-    #time_since_jump = 0
-    #counter_limit = 0
-
-    # -------- Lists for animation frames --------
-    idle_frames_R = []
-    idle_frames_L = []
-    running_frames_R = []
-    running_frames_L = []
-    jumping_frames_R = []
-    jumping_frames_L = []
-
-    # List of surfaces player can collide with
-    #   (from level)
-    level = None
-
-    def __init__(self, color=constants.RED, width=30, height=50):
-        #super(Player, self).__init__(color, width, height)
-        super(Player, self).__init__()
-
-        # Call function to populate frame lists from sprite
-        #   sheet
-        self.init_frames()
-
-        # Set the image the player starts with
-        self.image = self.idle_frames_R[0]
-
-        # Set a referance to the image rect.
-        self.rect = self.image.get_rect()
-        self.rect.x = 10
-        self.rect.y = 10
-
-    def init_frames(self):
-        # Get sprite sheet using a SpriteSheet object
-        sprite_sheet = SpriteSheet("img/nov2015_spritesheet_2.png")
-
-        # Initialize sprite sheet attributes
-        #   (draw coords and frame dimensions)
-        originX = 0
-        originY = 0
-        image_width = 120
-        image_height = 114
-
-        # Initialize right-facing frames
-        # (Right idle frames)
-        image = sprite_sheet.get_image(originX, originY, image_width, image_height)
-        self.idle_frames_R.append(image)
-
-        # (Right running frames)
-        originX = 240
-        for x in range (0, 6):
-            image = sprite_sheet.get_image(originX, originY, image_width, image_height)
-            self.running_frames_R.append(image)
-            originX += image_width
-
-        # (Right jumping frames)
-        for x in range (0, 4):
-            image = sprite_sheet.get_image(originX, originY, image_width, image_height)
-            self.jumping_frames_R.append(image)
-            originX += image_width
-
-        # Load right-facing images again and flip them to face left
-        # (Left idle frames)
-        originX = 0
-        originY = 0
-        image = sprite_sheet.get_image(originX, originY, image_width, image_height)
-        image = pygame.transform.flip(image, True, False)
-        self.idle_frames_L.append(image)
-
-        # (Left running frames)
-        originX = 240
-        for x in range (0, 6):
-            image = sprite_sheet.get_image(originX, originY, image_width, image_height)
-            image = pygame.transform.flip(image, True, False)
-            self.running_frames_L.append(image)
-            originX += image_width
-
-        # (Left jumping frames)
-        for x in range (0, 4):
-            image = sprite_sheet.get_image(originX, originY, image_width, image_height)
-            image = pygame.transform.flip(image, True, False)
-            self.jumping_frames_L.append(image)
-            originX += image_width
-
-    def update(self):
-        # Calculate and apply gravity
-        self.calc_grav()
-
-        # Move left/right (apply deltaX)
-        self.rect.x += self.deltaX
-        pos = self.rect.x + self.level.world_shift
-
-        # Set running frame based on direction, screen position,
-        #   and frame rate
-        if self.direction == "R":
-            frame = (pos // 30) % len(self.running_frames_R)
-            self.image = self.running_frames_R[frame]
-        else:
-            frame = (pos // 30) % len(self.running_frames_L)
-            self.image = self.running_frames_L[frame]
-
-        # Check for collisions (x-axis)
-        block_hit_list = pygame.sprite.spritecollide(self, self.level.platform_list, False)
-        for block in block_hit_list:
-            # If we are moving right,
-            # set our right side to the left side of the item we hit
-            if self.deltaX > 0:
-                self.rect.right = block.rect.left
-            elif self.deltaY < 0:
-                # Otherwise if we are moving left, do the opposite.
-                self.rect.left = block.rect.right
-
-        # Move up/down (apply deltaY)
-        self.rect.y += self.deltaY
-
-        # Check for collisions (y-axis)
-        block_hit_list = pygame.sprite.spritecollide(self, self.level.platform_list, False)
-        for block in block_hit_list:
-
-            # Reset rect position based on the top/bottom of the object.
-            if self.deltaY > 0:
-                self.rect.bottom = block.rect.top
-                # DEBUG: Land only if character was falling when
-                #   collision occurred
-                self.land()
-            elif self.deltaY < 0:
-                self.rect.top = block.rect.bottom
-                # Cause character to start falling if they bump
-                #   their head on the bottom of a platform
-                self.stop_rising()
-                #print "Bump" + str(self.deltaY)
-
-        #DEBUG: If character is rising, display jumping animation
-        if self.deltaY < 0:
-            if self.direction == "R":
-                self.image = self.jumping_frames_R[0]
-            else:
-                self.image = self.jumping_frames_L[0]
-
-        # DEBUG: If character is falling, display falling animation
-        if self.deltaY > 0:
-            if self.direction == "R":
-                if self.deltaY < 1.6:
-                    self.image = self.jumping_frames_R[1]
-                elif self.deltaY < 3.3:
-                    self.image = self.jumping_frames_R[2]
-                else:
-                    self.image = self.jumping_frames_R[3]
-            else:
-                if self.deltaY < 1.6:
-                    self.image = self.jumping_frames_L[1]
-                elif self.deltaY < 3.3:
-                    self.image = self.jumping_frames_L[2]
-                else:
-                    self.image = self.jumping_frames_L[3]
-
-        # DEBUG: If not airborne or moving horizontally, display
-        #   idle standing animation (currently 1 frame)
-        if self.airborne == False and self.deltaX == 0:
-            if self.direction == "R":
-                self.image = self.idle_frames_R[0]
-            else:
-                self.image = self.idle_frames_L[0]
-
-        # -------- Counter logic --------
-        # Check the frame counter(s) against the counter limit to
-        #   make sure we don't count past it
-        # If we hit the counter limit, reset our counter(s)
-        #if self.time_since_jump == self.counter_limit:
-            #self.time_since_jump = 0
-
-        # If time since jump is greater than 0, that means we're
-        #   counting frames, so we'll increase the counter
-        #if self.time_since_jump > 0:
-            #self.time_since_jump+=1
-            #print "Frames passed since jump began: " + str(self.time_since_jump)
-
-        # -------- DEBUG: Monitor values at the end of update() --------
-        # print "Left held: " + str(self.left_held) + "   Right held: " + str(self.right_held)
-
-    # Method to calculate gravity
-    def calc_grav(self):
-        # Calculate effect of gravity
-        if self.deltaY == 0:
-            self.deltaY = 1
-        else:
-            self.deltaY += self.gravity_force
-
-    # Player-controlled movement:
-    def go_left(self):
-        """ Called when the user hits the left arrow. """
-        #if not self.right_held:
-        self.left_held = True
-        self.deltaX = -1 * self.movement_speed
-        if not self.airborne:
-            self.direction = "L"
-
-    def go_right(self):
-        """ Called when the user hits the right arrow. """
-        self.right_held = True
-        self.deltaX = self.movement_speed
-        if not self.airborne:
-            self.direction = "R"
-
-    def jump(self):
-        """ Called when user hits 'jump' button. """
-        # move down a bit and see if there is a platform below us.
-        # Move down 2 pixels because it doesn't work well if we only move down
-        # 1 when working with a platform moving down.
-        self.rect.y += 2
-        platform_hit_list = pygame.sprite.spritecollide(self, self.level.platform_list, False)
-        self.rect.y -= 2
-
-        # If it is ok to jump, apply jump force and
-        #   declare the character airborne
-        if len(platform_hit_list) > 0 or self.rect.bottom >= constants.SCREEN_HEIGHT:
-            self.deltaY = self.jump_force
-            self.airborne = True
-            self.movement_speed = self.AIR_STEER_SPEED
-
-    def air_jump(self):
-        """ Called when user hits 'jump' button while airborne """
-        if self.airborne == True and self.air_jumped == False:
-            self.air_jumped = True
-            self.deltaY = self.air_jump_force
-
-    def stop(self):
-        """ Called when the user lets off the keyboard. """
-        self.deltaX = 0
-
-    def stop_rising(self):
-        # Apply this velocity change only to ground jump
-        #if not self.air_jumped:
-            # Apply half of jump force in the opposite
-            #   y direction to deltaY to accelerate
-            #   the effect of gravity, resulting in
-            #   a short jump
-        self.deltaY += -0.5 * self.jump_force
-
-    def land(self):
-        """ Called when player lands on a platform """
-        # Stop player's vertical movement
-        self.deltaY = 0
-
-        # Reset jumping state values
-        self.airborne = False
-        self.air_jumped = False
-
-        # Re-adjust movement speed
-        self.movement_speed = self.RUN_SPEED
-
-        # Re-adjust deltaX to ground movement speed,
-        #   based on directional facing
-        if self.deltaX < 0:
-            self.deltaX = -self.movement_speed
-            self.direction = "L"
-
-        if self.deltaX > 0:
-            self.deltaX = self.movement_speed
-            self.direction = "R"
-
-    # -------- DEBUG: Output variables of interest --------
-    #def debug_output(self):
-        # print self.deltaX
-        # print self.air_jumped
-        # print "deltaX         : " + str(self.deltaX)
+"""Module for game objects with physical properties
+   (movement, collision, etc.)
+   Written Dec 4, 2015 by Benjamin Reed
+"""
+import pygame
+
+import animation
+import characters
+import combat
+import constants
+
+class PhysObject(pygame.sprite.Sprite):
+    """Generic physical object class that extends Sprite"""
+
+    # --- Attributes ---
+
+    # Vector attributes
+    deltaX = 0
+    deltaY = 0
+
+    def __init__(self, color=constants.RED, width=30, height=50):
+        """Constructor (color=constants.RED, width=30, height=50)"""
+
+        # Call superconstructor
+        super(PhysObject, self).__init__()
+
+        # DEBUG: Set image to a Surface so as to draw a rect
+        self.image = pygame.Surface([width, height])
+        self.image.fill(color)
+
+        # DEBUG: Set collision rect to image rect
+        self.rect = self.image.get_rect()
+
+        # DEBUG: Initialize rect coords to determine
+        #   drawing coords
+        self.rect.x = 10
+        self.rect.y = 10
+
+#class Player(PhysObject):
+class Player(pygame.sprite.Sprite):
+    """Test player character class.
+
+       INSTANCE VARIABLES:
+       RUN_SPEED :
+          Character's left/right speed while standing on a surface
+       AIR_STEER_SPEED :
+          Character's left/right speed during a jump or fall
+       movement_speed :
+          Character's current left/right movement speed
+       jump_force :
+          Force applied when character jumps from ground
+       air_jump_force :
+          Force applied when character jumps in air
+       gravity_force:
+          Downward force applied while character is airborne
+
+       direction :
+          Character's sprite facing direction
+       airborne :
+          Tracks if character is grounded or airborne
+       air_jumped:
+          Tracks if character has jumped in the air or not
+
+       damage :
+          Damage taken so far (knockback grows with it)
+       attack_time :
+          Frames left of the attack being made (0 when not attacking)
+       hit_mask :
+          Combat bits of the fighters the current attack has hit
+          (combat.SPENT once it can't hit anything)
+       hitstun :
+          Frames left before the character can act after being hit
+       hitstop :
+          Frames left frozen in place by a hit or clank
+    """
+    # -------- Movement attributes --------
+    deltaX = 0
+    deltaY = 0
+    RUN_SPEED = 6
+    AIR_STEER_SPEED = 3
+    movement_speed = RUN_SPEED
+    jump_force = -10
+    #air_jump_force = 0.75 * jump_force
+    air_jump_force = jump_force
+    gravity_force = .35
+
+    # -------- Character state variables --------
+    direction = "R"
+    airborne = True
+    air_jumped = False
+
+    # -------- Combat state variables --------
+    damage = 0
+    attack_time = 0
+    hit_mask = 0
+    hitstun = 0
+    hitstop = 0
+
+    # -------- Animation --------
+    # (Set per instance by init_frames from the character's
+    #   shared AnimationSet)
+    animator = None
+
+    # List of surfaces player can collide with
+    #   (from level)
+    level = None
+
+    # particles.ProjectilePool the character's attacks fire into
+    #   (from the Simulation; attacks fire nothing without one)
+    projectiles = None
+
+    # Optional callable(player, event name) told about jump,
+    #   air_jump, land, stop_rising, attack, hit, hurt and clank
+    #   (e.g. for telemetry)
+    event_listener = None
+
+    def __init__(self, color=constants.RED, width=30, height=50,
+                 character=constants.PLAYER_CHARACTER):
+        #super(Player, self).__init__(color, width, height)
+        super(Player, self).__init__()
+
+        # Call function to set up the character's animations
+        self.init_frames(character)
+
+        # Set the image the player starts with
+        self.image = self.animator.play(animation.IDLE, self.direction)
+
+        # Set a referance to the image rect.
+        self.rect = self.image.get_rect()
+        self.rect.x = 10
+        self.rect.y = 10
+
+    def init_frames(self, character):
+        # The AnimationSet decodes the sprite sheet and cuts each
+        #   frame only once, no matter how many players use the
+        #   character; each player only keeps its own Animator
+        self.character = character
+        self.animator = animation.Animator(animation.get_animation_set(character))
+
+    def update(self, frames=1):
+        """Advance the player (frames) frames (1 at the normal frame
+           rate; more for bigger simulation timesteps)
+        """
+        # Frozen by a hit: nothing moves or animates until the
+        #   hit-stop runs out
+        if self.hitstop > 0:
+            self.hitstop = max(self.hitstop - frames, 0)
+            return
+
+        # Calculate and apply gravity
+        fall = self.calc_grav(frames)
+        moveX = self.deltaX * frames
+
+        # Position in the world once moved left/right, before
+        #   walls stop it (the rect is in world coordinates, so
+        #   this doesn't change when the level scrolls)
+        pos = self.rect.x + int(moveX)
+
+        # Move through the level (x-axis, then y-axis), then react
+        #   to whatever was hit. Moves are swept, so they can be any
+        #   length without passing through platforms
+        for contact in self.level.world.move(self, moveX, fall):
+            normal = contact.normal[1]
+            # DEBUG: Land only if character was falling when
+            #   collision occurred
+            if normal < 0:
+                self.land()
+            # Cause character to start falling if they bump
+            #   their head on the bottom of a platform
+            elif normal > 0:
+                self.stop_rising()
+                #print "Bump" + str(self.deltaY)
+
+        # Pick the animation state, then set the image once.
+        #   Reeling from a hit and attacking come first. Running
+        #   frames go by world position, falling frames by falling
+        #   speed; standing still on the ground is idle whatever
+        #   else is going on
+        if self.hitstun > 0:
+            state, value = animation.HURT, self.deltaY
+        elif self.attack_time > 0:
+            state, value = animation.ATTACK, None
+        elif self.airborne == False and self.deltaX == 0:
+            state, value = animation.IDLE, None
+        elif self.deltaY < 0:
+            state, value = animation.RISE, None
+        elif self.deltaY > 0:
+            state, value = animation.FALL, self.deltaY
+        else:
+            state, value = animation.RUN, pos
+        self.image = self.animator.play(state, self.direction, value, frames)
+
+        # Count down the attack and hitstun (after picking the
+        #   frame, so an attack shows every one of its frames)
+        if self.attack_time > 0:
+            self.attack_time = max(self.attack_time - frames, 0)
+        if self.hitstun > 0:
+            self.hitstun = max(self.hitstun - frames, 0)
+            # The knockback is spent once the character can act
+            #   again (so it doesn't become a run on landing)
+            if self.hitstun == 0:
+                self.deltaX = 0
+
+    # Method to calculate gravity
+    def calc_grav(self, frames=1):
+        """Apply (frames) frames of gravity to deltaY and return how
+           far the player falls over them -- exactly as far as
+           (frames) separate frames would have moved it
+        """
+        # Calculate effect of gravity
+        if self.deltaY == 0:
+            first = 1
+        else:
+            first = self.deltaY + self.gravity_force
+        self.deltaY = first + (frames - 1) * self.gravity_force
+        return frames * first + self.gravity_force * frames * (frames - 1) / 2.0
+
+    # Player-controlled movement:
+    def go_left(self):
+        """ Called when the user hits the left arrow. """
+        self.deltaX = -1 * self.movement_speed
+        # (Attacks keep facing the way they started)
+        if not self.airborne and self.attack_time <= 0:
+            self.direction = "L"
+
+    def go_right(self):
+        """ Called when the user hits the right arrow. """
+        self.deltaX = self.movement_speed
+        if not self.airborne and self.attack_time <= 0:
+            self.direction = "R"
+
+    def jump(self):
+        """ Called when user hits 'jump' button. """
+        # See if there is a platform (just) below us. The collision
+        #   world worked that out at the end of our last move
+        ground = self.level.world.ground_contact(self)
+
+        # If it is ok to jump, apply jump force and
+        #   declare the character airborne
+        if ground is not None or self.rect.bottom >= constants.SCREEN_HEIGHT:
+            self.deltaY = self.jump_force
+            self.airborne = True
+            self.movement_speed = self.AIR_STEER_SPEED
+            self.notify("jump")
+
+    def air_jump(self):
+        """ Called when user hits 'jump' button while airborne """
+        if self.airborne == True and self.air_jumped == False:
+            self.air_jumped = True
+            self.deltaY = self.air_jump_force
+            self.notify("air_jump")
+
+    def stop(self):
+        """ Called when the user lets off the keyboard. """
+        self.deltaX = 0
+
+    def stop_rising(self):
+        # Apply this velocity change only to ground jump
+        #if not self.air_jumped:
+            # Apply half of jump force in the opposite
+            #   y direction to deltaY to accelerate
+            #   the effect of gravity, resulting in
+            #   a short jump
+        self.deltaY += -0.5 * self.jump_force
+        self.notify("stop_rising")
+
+    def land(self):
+        """ Called when player lands on a platform """
+        # Only report landing from a jump (standing players land
+        #   again every frame as gravity pulls them into the floor)
+        if self.airborne:
+            self.notify("land")
+
+        # Stop player's vertical movement
+        self.deltaY = 0
+
+        # Reset jumping state values
+        self.airborne = False
+        self.air_jumped = False
+
+        # Re-adjust movement speed
+        self.movement_speed = self.RUN_SPEED
+
+        # Knocked back characters stop where they land
+        if self.hitstun > 0:
+            self.deltaX = 0
+
+        # Re-adjust deltaX to ground movement speed,
+        #   based on directional facing
+        if self.deltaX < 0:
+            self.deltaX = -self.movement_speed
+            self.direction = "L"
+
+        if self.deltaX > 0:
+            self.deltaX = self.movement_speed
+            self.direction = "R"
+
+    # -------- Combat (see the combat module) --------
+    def can_act(self):
+        """Whether the character is free to move, jump and attack
+           (not frozen by a hit-stop or reeling from a hit)
+        """
+        return self.hitstop <= 0 and self.hitstun <= 0
+
+    def attack(self):
+        """ Called when user hits 'attack' button. """
+        # One attack at a time, and not while reeling from a hit
+        if self.attack_time > 0 or not self.can_act():
+            return
+        animations = self.animator.animations
+        if animations.attacks[animation.ATTACK] is None:
+            return
+
+        self.attack_time = animations.durations[animation.ATTACK]
+        self.hit_mask = 0
+        self.animator.restart()
+
+        # Attacks that throw something launch it as they start
+        shot = animations.projectiles[animation.ATTACK]
+        if shot is not None and self.projectiles is not None:
+            self.fire(*shot)
+        self.notify("attack")
+
+    def fire(self, kind, points, speed, life):
+        """Launch a projectile of (kind) from the frame's launch
+           point (points[direction]), flying away from the way the
+           character faces
+        """
+        width, height = self.projectiles.sizes[kind]
+        x, y = points[animation.DIRECTIONS[self.direction]]
+        x += self.rect.x
+        y += self.rect.y - height // 2
+        if self.direction == "L":
+            x -= width
+        self.projectiles.fire(self, kind, x, y, speed * self.facing(), 0, life)
+
+    def attack_data(self):
+        return self.animator.animations.attacks[self.animator.state]
+
+    def hitboxes(self, out):
+        """Append the world boxes the current frame attacks with to
+           (out)
+        """
+        if self.attack_time > 0:
+            combat.world_boxes(self.animator.hitboxes(), self.rect.x, self.rect.y, out)
+
+    def hurtboxes(self, out):
+        """Append the world boxes the current frame can be hit in to
+           (out)
+        """
+        combat.world_boxes(self.animator.hurtboxes(), self.rect.x, self.rect.y, out)
+
+    def facing(self):
+        return 1 if self.direction == "R" else -1
+
+    def take_hit(self, damage, knockX, knockY, hitstun, hitstop):
+        """ Called when another fighter's attack hits """
+        self.damage += damage
+        self.hitstun = hitstun
+        self.hitstop = hitstop
+
+        # Being hit cuts the character's own attack short
+        self.attack_time = 0
+        self.hit_mask = combat.SPENT
+
+        # Fly off once the hit-stop is over
+        self.deltaX = knockX
+        self.deltaY = knockY
+        self.airborne = True
+        self.movement_speed = self.AIR_STEER_SPEED
+        self.notify("hurt")
+
+    def hit_landed(self, hitstop):
+        """ Called when this character's attack hits someone """
+        self.hitstop = max(self.hitstop, hitstop)
+        self.notify("hit")
+
+    def clank(self, hitstop):
+        """ Called when this character's attack is cancelled by
+            meeting another one """
+        self.hit_mask = combat.SPENT
+        self.hitstop = max(self.hitstop, hitstop)
+        self.notify("clank")
+
+    def notify(self, event):
+        """Tell the event listener (if any) about (event)"""
+        if self.event_listener is not None:
+            self.event_listener(self, event)
+
+    # -------- State snapshots (for rollback) --------
+    # Number of slots save_state() fills
+    STATE_SIZE = 13 + animation.Animator.STATE_SIZE
+
+    def save_state(self, buf, offset):
+        """Write this player's simulation state into (buf) (an
+           array of doubles) starting at (offset)
+        """
+        buf[offset] = self.rect.x
+        buf[offset + 1] = self.rect.y
+        buf[offset + 2] = self.deltaX
+        buf[offset + 3] = self.deltaY
+        buf[offset + 4] = self.movement_speed
+        buf[offset + 5] = self.airborne
+        buf[offset + 6] = self.air_jumped
+        buf[offset + 7] = self.direction == "R"
+        buf[offset + 8] = self.damage
+        buf[offset + 9] = self.attack_time
+        buf[offset + 10] = self.hit_mask
+        buf[offset + 11] = self.hitstun
+        buf[offset + 12] = self.hitstop
+        self.animator.save_state(buf, offset + 13)
+
+    def load_state(self, buf, offset):
+        """Restore the state save_state() wrote at (offset)"""
+        self.rect.x = int(buf[offset])
+        self.rect.y = int(buf[offset + 1])
+        self.deltaX = buf[offset + 2]
+        self.deltaY = buf[offset + 3]
+        self.movement_speed = buf[offset + 4]
+        self.airborne = buf[offset + 5] != 0
+        self.air_jumped = buf[offset + 6] != 0
+        self.direction = "R" if buf[offset + 7] else "L"
+        self.damage = buf[offset + 8]
+        self.attack_time = buf[offset + 9]
+        self.hit_mask = int(buf[offset + 10])
+        self.hitstun = buf[offset + 11]
+        self.hitstop = buf[offset + 12]
+        self.animator.load_state(buf, offset + 13)
+
+    # -------- DEBUG: Output variables of interest --------
+    #def debug_output(self):
+        # print self.deltaX
+        # print self.air_jumped
+        # print "deltaX         : " + str(self.deltaX)
         # print "movement speed : " + str(self.movement_speed)
\ No newline at end of file
@@ -1,27 +1,226 @@
-"""
-    Module for classes representing physical surfaces in
-    a play stage -- walls or platforms that game objects
-    may physically interact with
-    Written Dec 4, 2015 by Benjamin Reed
-"""
-import pygame
-
-import constants
-
-# Generic surface superclass. Basic surface functionality
-#   common to all Surfaces
-class PhysSurface(pygame.sprite.Sprite):
-    def __init__(self):
-        super(PhysSurface, self).__init__()
-
-# A Platform is a static barrier that objects can smack
-#   into, land on, be obstructed by, etc
-class Platform(PhysSurface):
-    def __init__(self, width, height):
-        super(Platform, self).__init__()
-
-        # DEBUG: Image is a green rectangle
-        self.image = pygame.Surface([width, height])
-        self.image.fill(constants.GREEN)
-
-        self.rect = self.image.get_rect()
\ No newline at end of file
+"""
+    Module for classes representing physical surfaces in
+    a play stage -- walls or platforms that game objects
+    may physically interact with
+    Written Dec 4, 2015 by Benjamin Reed
+"""
+import math
+
+import pygame
+
+import constants
+
+# Generic surface superclass. Basic surface functionality
+#   common to all Surfaces
+class PhysSurface(pygame.sprite.Sprite):
+
+    # Static surfaces never move, so they can be baked into the
+    #   level's static layer and never need reindexing
+    static = True
+
+    # How far (pixels) the surface moved in the last step
+    deltaX = 0
+    deltaY = 0
+
+    def __init__(self):
+        super(PhysSurface, self).__init__()
+
+# A Platform is a static barrier that objects can smack
+#   into, land on, be obstructed by, etc
+class Platform(PhysSurface):
+    def __init__(self, width, height):
+        super(Platform, self).__init__()
+
+        # DEBUG: Image is a green rectangle
+        self.image = pygame.Surface([width, height])
+        self.image.fill(constants.GREEN)
+
+        self.rect = self.image.get_rect()
+
+# A KinematicPlatform moves itself along a set course every step,
+#   carrying anything standing on it. Subclasses say where it should
+#   be after (frames) more frames in advance()
+class KinematicPlatform(Platform):
+    static = False
+
+    def __init__(self, width, height, x, y):
+        super(KinematicPlatform, self).__init__(width, height)
+
+        # Frames since the platform started moving, and its exact
+        #   (sub-pixel) position
+        self.time = 0
+        self.posX = x
+        self.posY = y
+        self.rect.x = int(round(x))
+        self.rect.y = int(round(y))
+
+    def advance(self, frames):
+        """Return the (x, y) the platform should be at after
+           (frames) more frames"""
+        return self.posX, self.posY
+
+    def update(self, frames=1):
+        """Move along the course, setting deltaX/deltaY to the
+           whole pixels moved"""
+        self.posX, self.posY = self.advance(frames)
+        self.time += frames
+
+        x = int(round(self.posX))
+        y = int(round(self.posY))
+        self.deltaX = x - self.rect.x
+        self.deltaY = y - self.rect.y
+        self.rect.x = x
+        self.rect.y = y
+
+    def ridden(self, body):
+        """Called every step (body) is standing on the platform"""
+        pass
+
+    # -------- State snapshots (for rollback) --------
+    # Number of slots save_state() fills
+    STATE_SIZE = 5
+
+    def save_state(self, buf, offset):
+        buf[offset] = self.time
+        buf[offset + 1] = self.posX
+        buf[offset + 2] = self.posY
+        buf[offset + 3] = self.deltaX
+        buf[offset + 4] = self.deltaY
+
+    def load_state(self, buf, offset):
+        """Restore the state save_state() wrote at (offset). The
+           level reindexes the platform afterwards."""
+        self.time = buf[offset]
+        self.posX = buf[offset + 1]
+        self.posY = buf[offset + 2]
+        self.deltaX = int(buf[offset + 3])
+        self.deltaY = int(buf[offset + 4])
+        self.rect.x = int(round(self.posX))
+        self.rect.y = int(round(self.posY))
+
+# Platform that follows a list of (x, y) points at (speed) pixels
+#   per frame, back and forth, or round and round if (loop)
+class PathPlatform(KinematicPlatform):
+    def __init__(self, width, height, points, speed=2, loop=False):
+        self.points = [tuple(point) for point in points]
+        if not loop:
+            # Ping-pong: come back the way we went
+            self.points += self.points[-2:0:-1]
+        self.speed = speed
+
+        # Length of each leg, and of the whole course
+        self.legs = []
+        for n, (x, y) in enumerate(self.points):
+            nextX, nextY = self.points[(n + 1) % len(self.points)]
+            self.legs.append(math.hypot(nextX - x, nextY - y))
+        self.length = sum(self.legs)
+
+        x, y = self.points[0]
+        super(PathPlatform, self).__init__(width, height, x, y)
+
+    def advance(self, frames):
+        # Distance along the course, then the leg that's on
+        distance = ((self.time + frames) * self.speed) % self.length if self.length else 0
+        for n, leg in enumerate(self.legs):
+            if distance < leg:
+                x, y = self.points[n]
+                nextX, nextY = self.points[(n + 1) % len(self.points)]
+                along = distance / leg
+                return x + (nextX - x) * along, y + (nextY - y) * along
+            distance -= leg
+        return self.points[0]
+
+# Platform that swings back and forth around (x, y) by up to
+#   (amplitudeX, amplitudeY) pixels, once every (period) frames
+class OscillatingPlatform(KinematicPlatform):
+    def __init__(self, width, height, x, y, amplitudeX=0, amplitudeY=0,
+                 period=120, phase=0.0):
+        self.originX = x
+        self.originY = y
+        self.amplitudeX = amplitudeX
+        self.amplitudeY = amplitudeY
+        self.period = period
+        self.phase = phase
+
+        super(OscillatingPlatform, self).__init__(width, height, x, y)
+        self.posX, self.posY = self.advance(0)
+        self.rect.x = int(round(self.posX))
+        self.rect.y = int(round(self.posY))
+
+    def advance(self, frames):
+        angle = 2 * math.pi * ((self.time + frames) / float(self.period) + self.phase)
+        offset = math.sin(angle)
+        return (self.originX + self.amplitudeX * offset,
+                self.originY + self.amplitudeY * offset)
+
+# Platform that holds still until something stands on it, then
+#   falls (delay) frames later. It comes back to where it started
+#   (respawn) frames after it starts falling
+class FallingPlatform(KinematicPlatform):
+
+    # Same gravity as the Player, but falling platforms don't
+    #   fall faster than this
+    gravity_force = .35
+    max_fall_speed = 12
+
+    def __init__(self, width, height, x, y, delay=30, respawn=240):
+        super(FallingPlatform, self).__init__(width, height, x, y)
+        self.startX = x
+        self.startY = y
+        self.delay = delay
+        self.respawn = respawn
+
+        # Frames left before falling (None until stood on), and
+        #   current falling speed
+        self.countdown = None
+        self.fall_speed = 0.0
+
+        # Whether the last step put it back at the start
+        self.respawned = False
+
+    def ridden(self, body):
+        if self.countdown is None:
+            self.countdown = self.delay
+
+    def advance(self, frames):
+        if self.countdown is None:
+            return self.posX, self.posY
+
+        self.countdown -= frames
+        if self.countdown > 0:
+            return self.posX, self.posY
+
+        # Back to the start once it's been falling long enough
+        if -self.countdown >= self.respawn:
+            self.countdown = None
+            self.fall_speed = 0.0
+            self.respawned = True
+            return self.startX, self.startY
+
+        self.fall_speed = min(self.fall_speed + self.gravity_force * frames,
+                              self.max_fall_speed)
+        return self.posX, self.posY + self.fall_speed * frames
+
+    def update(self, frames=1):
+        super(FallingPlatform, self).update(frames)
+
+        # Jumping back to the start doesn't carry anything along
+        if self.respawned:
+            self.deltaX = 0
+            self.deltaY = 0
+            self.respawned = False
+
+    STATE_SIZE = KinematicPlatform.STATE_SIZE + 3
+
+    def save_state(self, buf, offset):
+        super(FallingPlatform, self).save_state(buf, offset)
+        offset += KinematicPlatform.STATE_SIZE
+        buf[offset] = self.countdown is not None
+        buf[offset + 1] = self.countdown or 0
+        buf[offset + 2] = self.fall_speed
+
+    def load_state(self, buf, offset):
+        super(FallingPlatform, self).load_state(buf, offset)
+        offset += KinematicPlatform.STATE_SIZE
+        self.countdown = buf[offset + 1] if buf[offset] else None
+        self.fall_speed = buf[offset + 2]
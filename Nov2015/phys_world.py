@@ -0,0 +1,232 @@
+"""Module for the collision world: moving bodies through a level's
+   static surfaces and reporting what they touched.
+
+   Each move does a single spatial hash query covering the body's
+   whole path (plus a couple of pixels under its feet), then
+   resolves the x-axis and the y-axis against just those surfaces.
+   Each axis is swept: a surface anywhere along the way stops the
+   body, not just one it ends up overlapping, so fast bodies and
+   big timesteps can't tunnel through thin platforms.
+   What the body touched comes back as Contacts, and whether it's
+   standing on something is cached per body, so a jump doesn't need
+   a query of its own.
+"""
+
+# How far (pixels) under a body to look for ground. 2 rather than
+#   1, so a body on a platform moving down still counts as grounded
+GROUND_PROBE = 2
+
+# -------- Contact normals (pointing from the surface to the body) --------
+UP = (0, -1)
+DOWN = (0, 1)
+LEFT = (-1, 0)
+RIGHT = (1, 0)
+
+class Contact(object):
+    """One body touching one surface.
+
+       INSTANCE VARIABLES:
+       surface :
+          The surface (e.g. a Platform) touched
+       normal :
+          Direction to push the body out of the surface: UP for
+          landing on top of it, DOWN for bumping into its underside,
+          LEFT/RIGHT for walls
+       penetration :
+          How many pixels the body had moved into the surface
+          before it was pushed back out
+    """
+    __slots__ = ("surface", "normal", "penetration")
+
+    def __init__(self, surface, normal, penetration):
+        self.surface = surface
+        self.normal = normal
+        self.penetration = penetration
+
+    def __repr__(self):
+        return "Contact(%r, %r, %r)" % (self.surface, self.normal, self.penetration)
+
+class PhysWorld(object):
+    """Collision service for one level.
+
+       INSTANCE VARIABLES:
+       surfaces :
+          SpatialHashGroup of static surfaces bodies collide with
+          (the level's platform_list)
+       bodies :
+          List of bodies (sprites with a rect) moving in the world
+       contacts :
+          Dict of body -> list of Contacts from its last move
+       ground :
+          Dict of body -> (body position, ground Contact or None)
+          as of the end of its last move
+       queries :
+          Number of spatial hash queries moves and ground checks
+          have made so far (for telemetry)
+    """
+
+    def __init__(self, surfaces):
+        self.surfaces = surfaces
+        self.bodies = []
+        self.contacts = {}
+        self.ground = {}
+        self.queries = 0
+
+    def add_body(self, body):
+        if body not in self.contacts:
+            self.bodies.append(body)
+            self.contacts[body] = []
+
+    def remove_body(self, body):
+        if body in self.contacts:
+            self.bodies.remove(body)
+            del self.contacts[body]
+            self.ground.pop(body, None)
+
+    def forget_contacts(self):
+        """Drop every body's contacts and cached ground, e.g. when
+           the level's been put back into an earlier state (a
+           rollback), so nothing is reported from where things were
+        """
+        for body in self.bodies:
+            self.contacts[body] = []
+        self.ground.clear()
+
+    def move(self, body, deltaX, deltaY, carrier=None):
+        """Move (body) by (deltaX, deltaY), first along x and then
+           along y, stopping at any surface in the way. Returns the
+           list of Contacts made.
+
+           (carrier) is a surface carrying the body (a moving
+           platform it stands on, which has already moved): it
+           doesn't stop the body, so a platform that rose into its
+           rider doesn't push it off the side as if it were a wall,
+           but it still counts as ground.
+        """
+        rect = body.rect
+
+        # One query for every surface the move could touch
+        area = rect.union(rect.move(int(deltaX), int(deltaY)))
+        area.inflate_ip(2, 2)
+        area.height += GROUND_PROBE
+        nearby = self.surfaces.index.query(area)
+        self.queries += 1
+        if carrier is None:
+            solid = nearby
+        else:
+            solid = [surface for surface in nearby if surface is not carrier]
+
+        contacts = []
+
+        # Move left/right (apply deltaX), then push back out of
+        #   the first wall in the way
+        left = rect.left
+        rect.x += deltaX
+        moved = rect.left - left
+        hits = self.sweep_x(rect, left, moved, solid)
+        if hits and deltaX > 0:
+            wall = min(hits, key=lambda surface: surface.rect.left)
+            contacts.append(Contact(wall, LEFT, rect.right - wall.rect.left))
+            rect.right = wall.rect.left
+        elif hits and deltaX < 0:
+            wall = max(hits, key=lambda surface: surface.rect.right)
+            contacts.append(Contact(wall, RIGHT, wall.rect.right - rect.left))
+            rect.left = wall.rect.right
+
+        # Move up/down (apply deltaY), then land on the first
+        #   surface below or bump into the first one above
+        top = rect.top
+        rect.y += deltaY
+        moved = rect.top - top
+        hits = self.sweep_y(rect, top, moved, solid)
+        ground = None
+        if hits and deltaY > 0:
+            ground = min(hits, key=lambda surface: surface.rect.top)
+            ground = Contact(ground, UP, rect.bottom - ground.rect.top)
+            contacts.append(ground)
+            rect.bottom = ground.surface.rect.top
+        elif hits and deltaY < 0:
+            ceiling = max(hits, key=lambda surface: surface.rect.bottom)
+            contacts.append(Contact(ceiling, DOWN, ceiling.rect.bottom - rect.top))
+            rect.top = ceiling.rect.bottom
+
+        # Anything just under the body counts as ground too
+        if ground is None:
+            ground = self.probe_ground(rect, nearby)
+        self.ground[body] = (rect.topleft, ground)
+
+        self.contacts[body] = contacts
+        return contacts
+
+    @staticmethod
+    def sweep_x(rect, left, moved, surfaces):
+        """(surfaces) hit by (rect) moving (moved) pixels along x
+           from (left) to where it is now: any crossed on the way
+           (so fast bodies can't pass through thin walls), plus any
+           it still overlaps (so a body that started out inside a
+           surface is pushed out as before)
+        """
+        hits = []
+        if moved > 0:
+            start = left + rect.width
+            for surface in surfaces:
+                block = surface.rect
+                if block.top < rect.bottom and block.bottom > rect.top and \
+                        (start <= block.left < rect.right or rect.colliderect(block)):
+                    hits.append(surface)
+        elif moved < 0:
+            for surface in surfaces:
+                block = surface.rect
+                if block.top < rect.bottom and block.bottom > rect.top and \
+                        (rect.left < block.right <= left or rect.colliderect(block)):
+                    hits.append(surface)
+        else:
+            hits = [surface for surface in surfaces if rect.colliderect(surface.rect)]
+        return hits
+
+    @staticmethod
+    def sweep_y(rect, top, moved, surfaces):
+        """sweep_x() for moving (moved) pixels along y from (top)"""
+        hits = []
+        if moved > 0:
+            start = top + rect.height
+            for surface in surfaces:
+                block = surface.rect
+                if block.left < rect.right and block.right > rect.left and \
+                        (start <= block.top < rect.bottom or rect.colliderect(block)):
+                    hits.append(surface)
+        elif moved < 0:
+            for surface in surfaces:
+                block = surface.rect
+                if block.left < rect.right and block.right > rect.left and \
+                        (rect.top < block.bottom <= top or rect.colliderect(block)):
+                    hits.append(surface)
+        else:
+            hits = [surface for surface in surfaces if rect.colliderect(surface.rect)]
+        return hits
+
+    def probe_ground(self, rect, surfaces):
+        """Contact with the first of (surfaces) within GROUND_PROBE
+           pixels under (rect), or None
+        """
+        probe = rect.move(0, GROUND_PROBE)
+        for surface in surfaces:
+            if probe.colliderect(surface.rect):
+                return Contact(surface, UP, probe.bottom - surface.rect.top)
+        return None
+
+    def ground_contact(self, body):
+        """The surface (body) is standing on, as a Contact, or None.
+           Cached by move(); only queries again if the body has been
+           put somewhere else since (a respawn or a rollback).
+        """
+        cached = self.ground.get(body)
+        rect = body.rect
+        if cached is not None and cached[0] == rect.topleft:
+            return cached[1]
+
+        probe = rect.move(0, GROUND_PROBE)
+        ground = self.probe_ground(rect, self.surfaces.index.query(probe))
+        self.queries += 1
+        self.ground[body] = (rect.topleft, ground)
+        return ground
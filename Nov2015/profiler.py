@@ -0,0 +1,198 @@
+"""Module for timing each phase of the main loop, and the steps of
+   startup before it.
+
+   Timings go into fixed-size ring buffers (one array of doubles per
+   phase), so a profiler costs the same after an hour as after a
+   second. When disabled every call returns straight away, so it can
+   stay wired into the loop in release builds.
+"""
+from array import array
+import timeit
+
+# -------- Main loop phases, in loop order --------
+# (POLL_WAIT is the frame pacer's wait before polling input,
+#   TICK_WAIT its wait after the flip)
+POLL_WAIT = 0
+EVENT_POLL = 1
+INPUT = 2
+SPRITE_UPDATE = 3
+LEVEL_UPDATE = 4
+LEVEL_DRAW = 5
+SPRITE_DRAW = 6
+FLIP = 7
+TICK_WAIT = 8
+
+PHASE_NAMES = ("poll wait", "event poll", "input", "sprite update", "level update",
+               "level draw", "sprite draw", "flip", "tick wait")
+
+def percentile(sorted_values, fraction):
+    """Value (fraction) of the way through (sorted_values)"""
+    if not sorted_values:
+        return 0.0
+    index = int(round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+class FrameProfiler(object):
+    """Times the phases of each frame.
+
+       Call begin_frame() at the top of the loop, mark(phase) at the
+       end of each phase (time since the previous mark is added to
+       that phase, so a phase can be marked more than once a frame),
+       and end_frame() at the bottom.
+
+       Each mark also records a span (phase, seconds from the start
+       of the frame, seconds), so the last frame's phases can be
+       laid out in the order they really ran (see last_frame()).
+
+       INSTANCE VARIABLES:
+       enabled :
+          Whether anything is being timed
+       capacity :
+          Number of frames kept
+       phase_times :
+          One ring buffer of seconds per phase
+       frame_times :
+          Ring buffer of whole-frame seconds
+       frames :
+          Total number of frames recorded
+    """
+
+    def __init__(self, capacity=600, enabled=False):
+        self.enabled = enabled
+        self.capacity = capacity
+        self.timer = timeit.default_timer
+
+        self.phase_times = [array("d", [0.0]) * capacity for name in PHASE_NAMES]
+        self.frame_times = array("d", [0.0]) * capacity
+        self.frames = 0
+
+        # Times for the frame in progress
+        self.current = array("d", [0.0]) * len(PHASE_NAMES)
+        self.frame_start = 0.0
+        self.last_frame_start = 0.0
+        self.last_mark = 0.0
+        self.spans = []
+        self.last_spans = []
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.frame_start = self.last_mark = self.timer()
+        del self.spans[:]
+
+    def mark(self, phase):
+        """Add the time since the last mark to (phase)"""
+        if not self.enabled:
+            return
+        now = self.timer()
+        last_mark = self.last_mark
+        self.current[phase] += now - last_mark
+        self.spans.append((phase, last_mark - self.frame_start, now - last_mark))
+        self.last_mark = now
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        slot = self.frames % self.capacity
+        current = self.current
+        for phase in range(len(current)):
+            self.phase_times[phase][slot] = current[phase]
+            current[phase] = 0.0
+        self.frame_times[slot] = self.timer() - self.frame_start
+        self.last_frame_start = self.frame_start
+        self.spans, self.last_spans = self.last_spans, self.spans
+        self.frames += 1
+
+    def last_frame(self):
+        """(start time, frame seconds, phase seconds, spans) for the
+           most recently finished frame, or None. (spans) is a tuple
+           of (phase, seconds from the start, seconds), one per
+           mark, in the order they were made.
+        """
+        if self.frames == 0:
+            return None
+        slot = (self.frames - 1) % self.capacity
+        return (self.last_frame_start, self.frame_times[slot],
+                tuple(times[slot] for times in self.phase_times),
+                tuple(self.last_spans))
+
+    def recent(self, times):
+        """The recorded part of ring buffer (times), oldest first"""
+        if self.frames < self.capacity:
+            return times[:self.frames]
+        slot = self.frames % self.capacity
+        return times[slot:] + times[:slot]
+
+    def stats(self, phase=None):
+        """Dict of p50/p95/p99/worst seconds for (phase), or for
+           whole frames if (phase) is None
+        """
+        times = self.frame_times if phase is None else self.phase_times[phase]
+        values = sorted(self.recent(times))
+        return {"p50": percentile(values, 0.50),
+                "p95": percentile(values, 0.95),
+                "p99": percentile(values, 0.99),
+                "worst": values[-1] if values else 0.0}
+
+    def worst_frame(self):
+        """(frame number, {phase name: seconds}) for the slowest
+           frame still in the buffer, or None
+        """
+        recent = self.recent(self.frame_times)
+        if not recent:
+            return None
+        worst = max(range(len(recent)), key=recent.__getitem__)
+
+        first = self.frames - len(recent)
+        slot = (first + worst) % self.capacity
+        return (first + worst,
+                dict((name, self.phase_times[phase][slot])
+                     for phase, name in enumerate(PHASE_NAMES)))
+
+    def reset(self):
+        """Forget every recorded frame. Timing picks up from now, so
+           a profiler enabled and reset partway through a frame
+           records the rest of that frame, not the time since it
+           was last enabled.
+        """
+        self.frames = 0
+        for phase in range(len(self.current)):
+            self.current[phase] = 0.0
+        self.frame_start = self.last_mark = self.timer()
+        del self.spans[:]
+
+class StartupProfile(object):
+    """Wall-clock time of each startup step, from (start) (a
+       timeit.default_timer() reading, e.g. taken before the game's
+       imports) to the first frame on screen.
+
+       INSTANCE VARIABLES:
+       start :
+          When startup began
+       steps :
+          List of (step name, time it finished)
+    """
+
+    def __init__(self, start=None):
+        self.timer = timeit.default_timer
+        self.start = self.timer() if start is None else start
+        self.steps = []
+
+    def mark(self, name):
+        """Note that step (name) just finished"""
+        self.steps.append((name, self.timer()))
+
+    def total(self):
+        """Seconds from start to the last step"""
+        if not self.steps:
+            return 0.0
+        return self.steps[-1][1] - self.start
+
+    def report(self):
+        """Per-step breakdown for the console"""
+        lines = ["startup: %.1f ms to first frame" % (self.total() * 1000)]
+        last = self.start
+        for name, end in self.steps:
+            lines.append("  %-14s %8.1f ms" % (name, (end - last) * 1000))
+            last = end
+        return "\n".join(lines)
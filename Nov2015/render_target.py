@@ -0,0 +1,246 @@
+"""Module for drawing the game into a fixed-size internal render
+   target and presenting it scaled to the window.
+
+   Three sizes are kept apart:
+      logical : constants.SCREEN_WIDTH x SCREEN_HEIGHT, the part of
+                the world the camera shows. The game only ever
+                works in these coordinates.
+      render  : the Surface everything is drawn into, so the size
+                that drawing's fill rate is paid at
+      window  : the display surface from set_mode()
+
+   Once a frame is drawn, present() scales the render target onto
+   the window with one pygame.transform.scale() (nearest neighbour,
+   so pixel art stays sharp), letterboxed if the window is a
+   different shape.
+
+   With a render target smaller than the logical resolution (e.g.
+   400x300 for 800x600), the game draws through a ScaledView: it
+   takes logical coordinates and draws every image as a copy scaled
+   down to the render target, made the first time the image is
+   drawn and kept. Blits then only touch the render target's
+   pixels, a quarter of them in that example. With a render target
+   the size of the logical resolution (e.g. a native pixel-art
+   resolution, shown in a bigger window), drawing is unchanged and
+   only the present scales.
+"""
+import math
+import weakref
+
+import pygame
+
+import constants
+
+def fit_rect(size, area):
+    """The largest rect of (size)'s shape that fits centered in
+       (area) (a Rect)
+    """
+    width, height = size
+    scale = min(float(area.width) / width, float(area.height) / height)
+    rect = pygame.Rect(0, 0, int(width * scale), int(height * scale))
+    rect.center = area.center
+    return rect
+
+class ScaledView(object):
+    """A (size) (logical) drawing area onto (surface), of any other
+       size. Has the part of the Surface API the levels, sprite
+       groups and particle pools draw with (blit, blits, fill,
+       get_rect, get_width, get_height, get_size, get_clip and
+       set_clip), in logical coordinates: rects are mapped to
+       (surface)'s pixels and images swapped for scaled copies.
+
+       Scaled copies are kept per image (for as long as the image
+       is), so an image that's changed in place after it's been
+       drawn keeps its old look until forget() is called on it.
+       Images that are replaced (sprite animation frames, say) need
+       nothing.
+
+       INSTANCE VARIABLES:
+       surface :
+          The Surface drawn on
+       size :
+          Logical (width, height)
+       scale :
+          (x, y) pixels of (surface) per logical pixel
+    """
+
+    def __init__(self, surface, size):
+        self.surface = surface
+        self.size = tuple(size)
+        self.scale = (float(surface.get_width()) / size[0],
+                      float(surface.get_height()) / size[1])
+        self.images = weakref.WeakKeyDictionary()
+        self.clip = self.get_rect()
+
+    # -------- Coordinates and images --------
+
+    def map_rect(self, rect):
+        """Logical (rect) in (surface) pixels, rounded outward"""
+        rect = pygame.Rect(rect)
+        scale_x, scale_y = self.scale
+        left = int(math.floor(rect.left * scale_x))
+        top = int(math.floor(rect.top * scale_y))
+        return pygame.Rect(left, top,
+                           int(math.ceil(rect.right * scale_x)) - left,
+                           int(math.ceil(rect.bottom * scale_y)) - top)
+
+    def scaled(self, image):
+        """(image) scaled to (surface)'s pixels"""
+        scaled = self.images.get(image)
+        if scaled is None:
+            width, height = image.get_size()
+            scale_x, scale_y = self.scale
+            scaled = pygame.transform.scale(
+                image, (max(1, int(round(width * scale_x))),
+                        max(1, int(round(height * scale_y)))))
+
+            # (transform.scale keeps the colorkey but not its RLE
+            #   acceleration)
+            if image.get_flags() & pygame.RLEACCEL:
+                scaled.set_colorkey(image.get_colorkey(), pygame.RLEACCEL)
+            self.images[image] = scaled
+        return scaled
+
+    def forget(self, image=None):
+        """Drop the scaled copy of (image) (of every image if None)"""
+        if image is None:
+            self.images.clear()
+        else:
+            self.images.pop(image, None)
+
+    # -------- Surface API --------
+
+    def get_size(self):
+        return self.size
+
+    def get_width(self):
+        return self.size[0]
+
+    def get_height(self):
+        return self.size[1]
+
+    def get_rect(self, **kwargs):
+        rect = pygame.Rect((0, 0), self.size)
+        for name, value in kwargs.items():
+            setattr(rect, name, value)
+        return rect
+
+    def get_clip(self):
+        return pygame.Rect(self.clip)
+
+    def set_clip(self, rect=None):
+        if rect is None:
+            self.clip = self.get_rect()
+        else:
+            self.clip = self.get_rect().clip(rect)
+        self.surface.set_clip(self.map_rect(self.clip))
+
+    def fill(self, color, rect=None, special_flags=0):
+        if rect is None:
+            self.surface.fill(color, None, special_flags)
+            return self.get_clip()
+        self.surface.fill(color, self.map_rect(rect), special_flags)
+        return pygame.Rect(rect).clip(self.clip)
+
+    def blit(self, image, dest, area=None, special_flags=0):
+        scale_x, scale_y = self.scale
+        x, y = dest[0], dest[1]
+        left = int(math.floor(x * scale_x))
+        top = int(math.floor(y * scale_y))
+
+        if area is None:
+            width, height = image.get_size()
+            scaled_area = None
+        else:
+            # Place the area by its offset from (dest), so the same
+            #   source pixel always lands on the same pixel of
+            #   (surface) however a blit of it is split up (e.g. the
+            #   whole view, then rects restored under sprites)
+            #   (plus a pixel for rounding; the clip trims it)
+            area = pygame.Rect(area)
+            width, height = area.size
+            scaled_area = pygame.Rect(
+                left + int(math.floor((area.left - x) * scale_x)),
+                top + int(math.floor((area.top - y) * scale_y)),
+                int(math.ceil(width * scale_x)) + 1, int(math.ceil(height * scale_y)) + 1)
+        self.surface.blit(self.scaled(image), (left, top), scaled_area, special_flags)
+        return pygame.Rect(x, y, width, height).clip(self.clip)
+
+    def blits(self, blit_sequence, doreturn=1):
+        blit = self.blit
+        if doreturn:
+            return [blit(*item) for item in blit_sequence]
+        for item in blit_sequence:
+            blit(*item)
+
+class RenderTarget(object):
+    """Where the game draws each frame, and how that reaches the
+       window.
+
+       INSTANCE VARIABLES:
+       window :
+          The display surface
+       surface :
+          The render target: an offscreen Surface of the render
+          size, or the window itself if they're the same size
+       view :
+          What to draw on, in logical coordinates: (surface) itself
+          if it's the logical size, otherwise a ScaledView of it
+       window_view :
+          The logical screen on the window, for drawing at window
+          resolution after present() (e.g. the debug overlay):
+          the part of the window the render target is presented
+          on, or a ScaledView of it if that isn't the logical size
+       present_rect :
+          Part of the window the render target is presented on
+    """
+
+    def __init__(self, window, render_size=None,
+                 size=(constants.SCREEN_WIDTH, constants.SCREEN_HEIGHT)):
+        self.window = window
+        self.size = tuple(size)
+        window_rect = window.get_rect()
+        if render_size is None or tuple(render_size) == window_rect.size:
+            self.surface = window
+            self.present_rect = window_rect
+        else:
+            # Same pixel format as the window, so the scale needs no
+            #   conversion
+            self.surface = pygame.Surface(render_size, 0, window)
+            self.present_rect = fit_rect(render_size, window_rect)
+        self.presented = window.subsurface(self.present_rect)
+
+        if self.surface.get_size() == self.size:
+            self.view = self.surface
+        else:
+            self.view = ScaledView(self.surface, self.size)
+        if self.present_rect.size == self.size:
+            self.window_view = self.presented
+        else:
+            self.window_view = ScaledView(self.presented, self.size)
+
+        # Bars around a letterboxed picture, filled once
+        if self.present_rect != window_rect:
+            window.fill(constants.BLACK)
+
+    def present(self, dirty_rects=None):
+        """Scale the render target onto the window. Takes the list
+           of logical rects that changed this frame (or None if
+           everything did), and returns the window rects to pass to
+           pygame.display.update() (or None to flip the whole
+           window).
+        """
+        if self.surface is not self.window:
+            pygame.transform.scale(self.surface, self.present_rect.size, self.presented)
+        if dirty_rects is None:
+            return None
+
+        # Window rects of the changed rects, offset into the
+        #   letterboxed picture
+        offset = self.present_rect.topleft
+        if self.window_view is self.presented:
+            if offset == (0, 0):
+                return dirty_rects
+            return [pygame.Rect(rect).move(offset) for rect in dirty_rects]
+        map_rect = self.window_view.map_rect
+        return [map_rect(rect).move(offset) for rect in dirty_rects]
@@ -0,0 +1,194 @@
+"""Module for recording sim input to disk and replaying it.
+
+   Replay file format (little-endian):
+      header : 4s magic "NVRP", B version, B player count,
+               H length of level name, then the level name (utf-8)
+      frames : one fixed-size record per sim step, in order --
+               I crc32 state checksum after the step, then one
+               B input mask per player (see controls)
+
+   Every step gets a record, so frame N lives at a fixed offset
+   and a file can be streamed to disk while the game runs.
+"""
+import struct
+import timeit
+import zlib
+
+from controls import JUMP
+
+MAGIC = b"NVRP"
+VERSION = 3
+
+HEADER = struct.Struct("<4sBBH")
+CHECKSUM = struct.Struct("<I")
+
+# Per-player state that goes into the checksum
+PLAYER_STATE = struct.Struct("<iiddBBBBdddd")
+
+def state_checksum(sim):
+    """crc32 of everything that decides how (sim) plays out next"""
+    crc = zlib.crc32(struct.pack("<I", sim.frame))
+    for player, controller in zip(sim.players, sim.controllers):
+        state = PLAYER_STATE.pack(player.rect.x, player.rect.y,
+                                  player.deltaX, player.deltaY,
+                                  player.airborne, player.air_jumped,
+                                  player.direction == "R",
+                                  controller.held,
+                                  controller.buffer.held_time(JUMP),
+                                  player.damage, player.attack_time,
+                                  player.hitstun)
+        crc = zlib.crc32(state, crc)
+    return crc & 0xffffffff
+
+class InputRecorder(object):
+    """Streams one record per sim step to a replay file"""
+
+    def __init__(self, path, level_name, player_count):
+        self.file = open(path, "wb")
+        self.player_count = player_count
+        self.record_struct = struct.Struct("<I%dB" % player_count)
+
+        name = level_name.encode("utf-8")
+        self.file.write(HEADER.pack(MAGIC, VERSION, player_count, len(name)))
+        self.file.write(name)
+
+    def record(self, inputs, checksum):
+        """Write the step that used (inputs) (one mask per player)
+           and ended with state (checksum)
+        """
+        self.file.write(self.record_struct.pack(checksum, *inputs))
+
+    def close(self):
+        self.file.close()
+
+class InputLog(object):
+    """Reads a replay file written by InputRecorder.
+       Iterate it for (checksum, inputs) per step.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+
+        magic, version, player_count, name_length = HEADER.unpack(
+            self.file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("%s is not a version %d replay file" % (path, VERSION))
+
+        self.player_count = player_count
+        self.level_name = self.file.read(name_length).decode("utf-8")
+        self.record_struct = struct.Struct("<I%dB" % player_count)
+
+    def __iter__(self):
+        size = self.record_struct.size
+        unpack = self.record_struct.unpack
+        read = self.file.read
+        while True:
+            data = read(size)
+            if len(data) < size:
+                return
+            record = unpack(data)
+            yield record[0], record[1:]
+
+    def close(self):
+        self.file.close()
+
+class ReplayInput(object):
+    """An InputLog as an input source: each sample() reads the next
+       step's record into one reused buffer and hands back its masks
+       (in a list that's reused too), or None once the recording
+       runs out.
+
+       INSTANCE VARIABLES:
+       checksum :
+          Recorded state checksum of the step last sampled
+    """
+
+    def __init__(self, log):
+        self.log = log
+        self.record = bytearray(log.record_struct.size)
+        self.masks = [0] * log.player_count
+        self.checksum = None
+
+    def sample(self, frame=None):
+        """Masks of the next recorded step ((frame) is ignored:
+           steps are read in order)
+        """
+        record = self.record
+        if self.log.file.readinto(record) < len(record):
+            return None
+        self.checksum = CHECKSUM.unpack_from(record)[0]
+        masks = self.masks
+        for n in range(len(masks)):
+            masks[n] = record[CHECKSUM.size + n]
+        return masks
+
+class ReplayResult(object):
+    """Outcome of replay(): how many frames ran, how fast, and the
+       first frame (if any) whose state didn't match the recording
+    """
+
+    def __init__(self, sim, frames, fps, diverged_at):
+        self.sim = sim
+        self.frames = frames
+        self.fps = fps
+        self.diverged_at = diverged_at
+
+def replay(path, level_factory=None, stop_on_divergence=True):
+    """Replay the recording at (path) as fast as possible and check
+       each step's state against the recorded checksum.
+
+       (level_factory) takes (level name, player) and builds the
+       level; by default level_loader.build_level.
+    """
+    # Imported here so init_headless() can run before any
+    #   sprite sheets are loaded
+    from level_loader import build_level
+    from phys_object import Player
+    from simulation import Simulation
+
+    log = InputLog(path)
+    if level_factory is None:
+        level_factory = build_level
+
+    players = [Player() for x in range(log.player_count)]
+    level = level_factory(log.level_name, players[0])
+    spawn_points = getattr(level, "spawn_points", None)
+    if spawn_points:
+        for n, player in enumerate(players):
+            player.rect.topleft = spawn_points[n % len(spawn_points)]
+    sim = Simulation(level, players)
+
+    source = ReplayInput(log)
+    diverged_at = None
+    frames = 0
+    start = timeit.default_timer()
+    while True:
+        inputs = source.sample(sim.frame)
+        if inputs is None:
+            break
+        sim.step(inputs)
+        frames += 1
+        if diverged_at is None and state_checksum(sim) != source.checksum:
+            diverged_at = sim.frame
+            if stop_on_divergence:
+                break
+    elapsed = timeit.default_timer() - start
+    log.close()
+
+    fps = frames / elapsed if elapsed > 0 else float("inf")
+    return ReplayResult(sim, frames, fps, diverged_at)
+
+if __name__ == "__main__":
+    import argparse
+
+    from simulation import init_headless
+
+    parser = argparse.ArgumentParser(description="Replay a recorded session headless")
+    parser.add_argument("replay_file")
+    args = parser.parse_args()
+
+    init_headless()
+    result = replay(args.replay_file)
+    print("Replayed %d frames at %.0f frames/sec" % (result.frames, result.fps))
+    if result.diverged_at is not None:
+        print("Diverged from the recording at frame %d" % result.diverged_at)
@@ -0,0 +1,197 @@
+"""Module for rollback: snapshotting the whole simulation every
+   step into a preallocated ring buffer, so a late-arriving input
+   can be fixed up by restoring an old state and resimulating.
+"""
+from array import array
+import timeit
+
+class SnapshotRing(object):
+    """Fixed number of simulation snapshots, packed back to back in
+       one preallocated array of doubles. Saving and restoring copy
+       values into and out of the array; nothing is allocated.
+
+       Snapshot layout: sim frame, level state, then each player's
+       state followed by their controller's state, then the sim's
+       projectiles (if it has a pool of them).
+
+       INSTANCE VARIABLES:
+       sim :
+          The Simulation being snapshotted
+       capacity :
+          How many steps back a snapshot can be restored from
+       size :
+          Slots per snapshot
+       buf :
+          array('d') holding (capacity) snapshots
+    """
+
+    def __init__(self, sim, capacity=16):
+        self.sim = sim
+        self.capacity = capacity
+
+        self.size = 1 + sim.level.STATE_SIZE
+        for player, controller in zip(sim.players, sim.controllers):
+            self.size += player.STATE_SIZE + controller.STATE_SIZE
+        if sim.projectiles is not None:
+            self.size += sim.projectiles.STATE_SIZE
+
+        self.buf = array("d", [0.0]) * (capacity * self.size)
+
+        # Frame stored in each slot (-1 if empty)
+        self.frames = array("l", [-1]) * capacity
+
+    def save(self):
+        """Snapshot the sim's current state (keyed by sim.frame)"""
+        sim = self.sim
+        buf = self.buf
+        slot = sim.frame % self.capacity
+        offset = slot * self.size
+
+        buf[offset] = sim.frame
+        offset += 1
+        sim.level.save_state(buf, offset)
+        offset += sim.level.STATE_SIZE
+        for player, controller in zip(sim.players, sim.controllers):
+            player.save_state(buf, offset)
+            offset += player.STATE_SIZE
+            controller.save_state(buf, offset)
+            offset += controller.STATE_SIZE
+        if sim.projectiles is not None:
+            sim.projectiles.save_state(buf, offset)
+
+        self.frames[slot] = sim.frame
+
+    def has(self, frame):
+        """Whether the snapshot for (frame) is still in the ring"""
+        return self.frames[frame % self.capacity] == frame
+
+    def restore(self, frame):
+        """Put the sim back into the state it had at (frame)"""
+        slot = frame % self.capacity
+        if self.frames[slot] != frame:
+            raise ValueError("no snapshot for frame %d" % frame)
+
+        sim = self.sim
+        buf = self.buf
+        offset = slot * self.size
+
+        sim.frame = int(buf[offset])
+        offset += 1
+        sim.level.load_state(buf, offset)
+        offset += sim.level.STATE_SIZE
+        for player, controller in zip(sim.players, sim.controllers):
+            player.load_state(buf, offset)
+            offset += player.STATE_SIZE
+            controller.load_state(buf, offset)
+            offset += controller.STATE_SIZE
+        if sim.projectiles is not None:
+            sim.projectiles.load_state(buf, offset)
+
+class RollbackSession(object):
+    """Drives a Simulation for rollback netplay: every step's state
+       and input masks are kept for (capacity) steps, so input for a
+       past frame can be corrected and the frames since resimulated.
+    """
+
+    def __init__(self, sim, capacity=16):
+        self.sim = sim
+        self.capacity = capacity
+        self.snapshots = SnapshotRing(sim, capacity)
+
+        # Input masks used for each of the last (capacity) frames,
+        #   one per player
+        self.player_count = len(sim.players)
+        self.inputs = array("B", [0]) * (capacity * self.player_count)
+
+        # One step's input masks, reused for every step resimulated
+        self.step_inputs = [0] * self.player_count
+
+    def advance(self, inputs):
+        """Snapshot the current frame, then step it with (inputs)"""
+        sim = self.sim
+        self.snapshots.save()
+
+        offset = (sim.frame % self.capacity) * self.player_count
+        for n in range(self.player_count):
+            self.inputs[offset + n] = inputs[n]
+
+        sim.step(inputs)
+
+    def correct(self, frame, player_no, mask):
+        """Replace player (player_no)'s input for past (frame) with
+           (mask) and resimulate up to the current frame
+        """
+        current = self.sim.frame
+        if current - frame > self.capacity or not self.snapshots.has(frame):
+            raise ValueError("frame %d is too old to roll back to" % frame)
+
+        self.inputs[(frame % self.capacity) * self.player_count + player_no] = mask
+        self.resimulate(frame, current)
+
+    def resimulate(self, frame, until):
+        """Restore the snapshot for (frame) and step forward to
+           (until) with the stored inputs, re-saving snapshots
+        """
+        self.snapshots.restore(frame)
+
+        sim = self.sim
+        count = self.player_count
+        inputs = self.inputs
+        step_inputs = self.step_inputs
+        while sim.frame < until:
+            self.snapshots.save()
+            offset = (sim.frame % self.capacity) * count
+            for n in range(count):
+                step_inputs[n] = inputs[offset + n]
+            sim.step(step_inputs)
+
+def benchmark(players=2, rollback_frames=8, cycles=2000):
+    """Time (cycles) rounds of advance + roll back (rollback_frames)
+       frames + resimulate on PlayLevel_02. Returns cycles per second.
+    """
+    import random
+
+    import levels
+    from controls import ACTIONS, input_mask
+    from phys_object import Player
+    from simulation import Simulation
+
+    roster = [Player() for x in range(players)]
+    sim = Simulation(levels.PlayLevel_02(roster[0]), roster)
+    session = RollbackSession(sim, max(16, rollback_frames + 1))
+    rand = random.Random(0)
+
+    def random_inputs():
+        return [input_mask(rand.choice(ACTIONS), rand.choice(ACTIONS))
+                if rand.random() < 0.2 else 0
+                for x in range(players)]
+
+    # Fill the ring before rolling back into it
+    for x in range(rollback_frames):
+        session.advance(random_inputs())
+
+    start = timeit.default_timer()
+    for x in range(cycles):
+        session.advance(random_inputs())
+        session.correct(sim.frame - rollback_frames,
+                        rand.randrange(players), input_mask(rand.choice(ACTIONS)))
+    elapsed = timeit.default_timer() - start
+
+    return cycles / elapsed if elapsed > 0 else float("inf")
+
+if __name__ == "__main__":
+    import argparse
+
+    from simulation import init_headless
+
+    parser = argparse.ArgumentParser(description="Benchmark rollback resimulation")
+    parser.add_argument("--players", type=int, default=2)
+    parser.add_argument("--frames", type=int, default=8,
+                        help="frames rolled back and resimulated per cycle")
+    parser.add_argument("--cycles", type=int, default=2000)
+    args = parser.parse_args()
+
+    init_headless()
+    rate = benchmark(args.players, args.frames, args.cycles)
+    print("%.0f snapshot+resimulate cycles/sec (%d players, %d frames)"
+          % (rate, args.players, args.frames))
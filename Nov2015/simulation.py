@@ -0,0 +1,304 @@
+"""Module for the simulation core -- stepping players and levels
+   independently of the window, clock and display
+"""
+import os
+import timeit
+from contextlib import contextmanager
+
+import pygame
+
+import constants
+import profiler
+from camera import Camera
+from combat import CombatWorld
+from controls import PlayerController
+
+def init_headless():
+    """Initialize pygame with SDL's dummy video driver so the
+       simulation can run with no window or display surface
+    """
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    pygame.display.init()
+
+class Simulation(object):
+    """Steps the game state of one level one fixed timestep at a time.
+
+       The simulation never touches the display or the clock, so it
+       can run at the window's frame rate (see FixedTimestep) or as
+       fast as the CPU allows (see run()).
+
+       INSTANCE VARIABLES:
+       level :
+          The PlayLevel being simulated
+       players :
+          List of Players in the level
+       controllers :
+          PlayerController for each player, applying input masks
+       camera :
+          Camera scrolling the level to follow the first player
+       combat :
+          CombatWorld working out who hit whom
+       projectiles :
+          Optional particles.ProjectilePool of the players'
+          projectiles (part of the sim state)
+       effects :
+          Optional particles.ParticlePool for hit sparks (just for
+          show: not part of the sim state, so not rolled back)
+       active_sprite_list :
+          Sprite group updated every step
+       frame :
+          Number of steps simulated so far
+       profiler :
+          Optional profiler.FrameProfiler to mark step phases on
+       timestep :
+          Seconds of game time per step. Steps longer than a frame
+          are fine: movement is swept, so nothing tunnels through
+          platforms
+    """
+
+    def __init__(self, level, players, active_sprite_list=None,
+                 timestep=constants.SIM_TIMESTEP, projectiles=None):
+        self.level = level
+
+        # Seconds per step, and how many frames at the normal frame
+        #   rate that makes (the game's speeds are per frame)
+        self.timestep = timestep
+        self.frame_steps = timestep * constants.TARGET_FRAME_RATE
+        self.players = list(players)
+
+        # Players are updated through a sprite group, just like
+        #   the main loop has always done it
+        if active_sprite_list is None:
+            active_sprite_list = pygame.sprite.Group()
+        self.active_sprite_list = active_sprite_list
+        for player in self.players:
+            player.level = level
+            level.world.add_body(player)
+            self.active_sprite_list.add(player)
+
+        self.controllers = [PlayerController(player) for player in self.players]
+        self.combat = CombatWorld()
+        for player in self.players:
+            self.combat.add_fighter(player)
+        self.projectiles = projectiles
+        if projectiles is not None:
+            self.combat.add_pool(projectiles)
+            for player in self.players:
+                player.projectiles = projectiles
+        self.effects = None
+        self.camera = Camera(level)
+
+        self.frame = 0
+        self.profiler = None
+
+        # Positions of the active sprites and the level's scroll
+        #   before the last step, used to interpolate drawing
+        #   between sim states
+        self.previous_positions = {}
+        self.previous_shift = level.world_shift
+
+    def set_level(self, level):
+        """Move every player into (level)"""
+        for player in self.players:
+            self.level.world.remove_body(player)
+            player.level = level
+            level.world.add_body(player)
+        self.level = level
+        self.camera = Camera(level)
+        for pool in (self.projectiles, self.effects):
+            if pool is not None:
+                pool.clear()
+        self.previous_shift = level.world_shift
+        self.previous_positions.clear()
+
+    def step(self, inputs=None):
+        """Advance the simulation by one fixed timestep. (inputs) is
+           an optional sequence with one input mask per player.
+        """
+        # Apply this step's input first, like the main loop
+        #   always handled events before updating
+        if inputs is not None:
+            for controller, mask in zip(self.controllers, inputs):
+                controller.apply(mask)
+        if self.profiler:
+            self.profiler.mark(profiler.INPUT)
+
+        # Remember where everything was so rendering can blend
+        #   between the previous and current state
+        previous = self.previous_positions
+        for sprite in self.active_sprite_list:
+            previous[sprite] = sprite.rect.topleft
+        for platform in self.level.moving_platforms:
+            previous[platform] = platform.rect.topleft
+        self.previous_shift = self.level.world_shift
+
+        # Update active sprites
+        self.active_sprite_list.update(self.frame_steps)
+        if self.projectiles is not None:
+            self.projectiles.update(self.frame_steps)
+        if self.profiler:
+            self.profiler.mark(profiler.SPRITE_UPDATE)
+
+        # Update the level
+        self.level.update(self.frame_steps)
+
+        # DEBUG: Player vs level boundary handling
+        level_width = self.level.level_width
+        for player in self.players:
+            if player.rect.right > level_width:
+                player.rect.right = level_width
+            if player.rect.left < 0:
+                player.rect.left = 0
+
+        # Attacks land where everything ended up
+        self.combat.step()
+        if self.effects is not None:
+            self.spark()
+
+        # Scroll to follow the first player
+        if self.players:
+            self.camera.follow(self.players[0])
+
+        for controller in self.controllers:
+            controller.end_step(self.frame_steps)
+
+        self.frame += 1
+        if self.profiler:
+            self.profiler.mark(profiler.LEVEL_UPDATE)
+
+    def spark(self):
+        """Update the hit sparks and throw out new ones for this
+           step's hits (more for harder hits) and clanks
+        """
+        effects = self.effects
+        effects.update(self.frame_steps)
+        for attacker, victim, x, y in self.combat.hits:
+            count = int(attacker.attack_data().damage * constants.SPARKS_PER_DAMAGE)
+            effects.burst(count, x, y, constants.SPARK_SPEED, constants.SPARK_LIFE)
+        for first, second, x, y in self.combat.clanks:
+            effects.burst(constants.CLANK_SPARKS, x, y,
+                          constants.SPARK_SPEED, constants.SPARK_LIFE, 1)
+
+    def run(self, frames):
+        """Step the simulation (frames) times as fast as possible.
+           Returns the number of simulated frames per second.
+        """
+        start = timeit.default_timer()
+        for x in range(frames):
+            self.step()
+        elapsed = timeit.default_timer() - start
+
+        if elapsed <= 0:
+            return float("inf")
+        return frames / elapsed
+
+    @contextmanager
+    def interpolated(self, alpha):
+        """Temporarily move active sprites to their screen positions
+           (and moving platforms to their world positions),
+           blended between the previous and current sim state
+           (alpha=0 is the previous state, alpha=1 the current one),
+           with the level's scroll blended the same way. Draw inside
+           the with block; the real state is restored after.
+        """
+        level = self.level
+        shift = level.world_shift
+        shown_shift = int(round(self.previous_shift + (shift - self.previous_shift) * alpha))
+
+        moved = []
+        previous = self.previous_positions
+        for sprite in self.active_sprite_list:
+            currX, currY = sprite.rect.topleft
+            prevX, prevY = previous.get(sprite, (currX, currY))
+            moved.append((sprite, currX, currY))
+            sprite.rect.x = int(round(prevX + (currX - prevX) * alpha)) + shown_shift
+            sprite.rect.y = int(round(prevY + (currY - prevY) * alpha))
+
+        # Moving platforms stay in world coordinates (the level
+        #   scrolls them when it draws them)
+        for platform in level.moving_platforms:
+            currX, currY = platform.rect.topleft
+            prevX, prevY = previous.get(platform, (currX, currY))
+            moved.append((platform, currX, currY))
+            platform.rect.x = int(round(prevX + (currX - prevX) * alpha))
+            platform.rect.y = int(round(prevY + (currY - prevY) * alpha))
+
+        level.world_shift = shown_shift
+        try:
+            yield
+        finally:
+            level.world_shift = shift
+            for sprite, currX, currY in moved:
+                sprite.rect.topleft = (currX, currY)
+
+class FixedTimestep(object):
+    """Accumulator that turns variable real frame times into a
+       whole number of fixed simulation steps, and reports how far
+       the display is between the last two sim states.
+    """
+
+    def __init__(self, timestep=constants.SIM_TIMESTEP,
+                 max_frame_time=constants.MAX_FRAME_TIME):
+        self.timestep = timestep
+        self.max_frame_time = max_frame_time
+        self.accumulator = 0.0
+
+    def advance(self, frame_time):
+        """Add (frame_time) seconds of real time and return how many
+           fixed steps are now due
+        """
+        # Don't try to catch up on huge hitches (window drags,
+        #   breakpoints), just drop the time
+        if frame_time > self.max_frame_time:
+            frame_time = self.max_frame_time
+        self.accumulator += frame_time
+
+        steps = 0
+        while self.accumulator >= self.timestep:
+            self.accumulator -= self.timestep
+            steps += 1
+        return steps
+
+    def alpha(self):
+        """Fraction of a step between the last sim state and the
+           next one, for render interpolation
+        """
+        return self.accumulator / self.timestep
+
+def run_headless(level_class, frames, hz=constants.TARGET_FRAME_RATE):
+    """Build (level_class) with a fresh Player and simulate (frames)
+       frames at the normal frame rate (as match_runner counts them),
+       in steps of 1/(hz) seconds, with no display. Returns
+       (simulation, steps per second).
+    """
+    # Imported here so init_headless() can run before any
+    #   sprite sheets are loaded
+    from phys_object import Player
+
+    player = Player()
+    level = level_class(player)
+    sim = Simulation(level, [player], timestep=1.0 / hz)
+    steps_per_second = sim.run(int(round(frames / sim.frame_steps)))
+    return sim, steps_per_second
+
+if __name__ == "__main__":
+    import argparse
+
+    import levels
+
+    parser = argparse.ArgumentParser(description="Run the game simulation headless")
+    parser.add_argument("--frames", type=int, default=10000,
+                        help="number of frames (at the normal frame rate) to simulate")
+    parser.add_argument("--level", default="PlayLevel_02",
+                        help="name of the level class to simulate")
+    parser.add_argument("--hz", type=float, default=constants.TARGET_FRAME_RATE,
+                        help="simulation steps per second of game time")
+    args = parser.parse_args()
+
+    init_headless()
+    sim, steps_per_second = run_headless(getattr(levels, args.level), args.frames, args.hz)
+    print("Simulated %d frames in %d steps (%.0f s of game time) at %.0f steps/sec "
+          "(%.0f frames/sec)"
+          % (int(round(sim.frame * sim.frame_steps)), sim.frame, sim.frame * sim.timestep,
+             steps_per_second, steps_per_second * sim.frame_steps))
@@ -0,0 +1,155 @@
+"""Module for spatial indexing of sprites, so collision checks
+   only look at sprites near the rect being tested instead of
+   scanning a whole sprite group
+"""
+import pygame
+
+import constants
+
+class SpatialHash(object):
+    """Uniform grid of square cells mapping each cell to the
+       sprites whose rects overlap it.
+
+       INSTANCE VARIABLES:
+       cell_size :
+          Width and height of a grid cell in pixels
+       cells :
+          Dict of (cell x, cell y) -> list of sprites in that cell
+       sprite_cells :
+          Dict of sprite -> list of cells the sprite was indexed in
+       queries :
+          Number of queries made so far (for telemetry)
+    """
+
+    def __init__(self, cell_size=constants.SPATIAL_HASH_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.sprite_cells = {}
+        self.queries = 0
+
+    def __len__(self):
+        return len(self.sprite_cells)
+
+    def __contains__(self, sprite):
+        return sprite in self.sprite_cells
+
+    def cells_for(self, rect):
+        """List of cell keys that (rect) overlaps"""
+        size = self.cell_size
+        left = rect.left // size
+        top = rect.top // size
+        # Rects are half-open, so a rect ending exactly on a cell
+        #   boundary doesn't reach into the next cell
+        right = (rect.right - 1) // size
+        bottom = (rect.bottom - 1) // size
+
+        return [(cellX, cellY)
+                for cellX in range(left, right + 1)
+                for cellY in range(top, bottom + 1)]
+
+    def insert(self, sprite):
+        """Index (sprite) under every cell its rect overlaps"""
+        keys = self.cells_for(sprite.rect)
+
+        old_keys = self.sprite_cells.get(sprite)
+        if old_keys is not None:
+            # Sprites that moved without leaving their cells (most
+            #   moves of moving platforms) don't need touching
+            if old_keys == keys:
+                return
+            self.remove(sprite)
+
+        for key in keys:
+            cell = self.cells.get(key)
+            if cell is None:
+                cell = self.cells[key] = []
+            cell.append(sprite)
+        self.sprite_cells[sprite] = keys
+
+    def remove(self, sprite):
+        """Drop (sprite) from the index (no-op if it isn't in it)"""
+        keys = self.sprite_cells.pop(sprite, None)
+        if keys is None:
+            return
+
+        for key in keys:
+            cell = self.cells[key]
+            cell.remove(sprite)
+            # Don't let empty cells pile up as things move around
+            if not cell:
+                del self.cells[key]
+
+    def clear(self):
+        self.cells.clear()
+        self.sprite_cells.clear()
+
+    def query(self, rect):
+        """Return a list of sprites in the cells (rect) overlaps.
+           These are only candidates -- their rects may not actually
+           intersect (rect). Order is deterministic for a given
+           sequence of inserts.
+        """
+        self.queries += 1
+        cells = self.cells
+        found = []
+        seen = set()
+        for key in self.cells_for(rect):
+            cell = cells.get(key)
+            if cell is None:
+                continue
+            for sprite in cell:
+                if sprite not in seen:
+                    seen.add(sprite)
+                    found.append(sprite)
+        return found
+
+    def collide(self, rect):
+        """Return a list of indexed sprites whose rects intersect (rect)"""
+        return [sprite for sprite in self.query(rect)
+                if rect.colliderect(sprite.rect)]
+
+class SpatialHashGroup(pygame.sprite.Group):
+    """Sprite group that keeps a SpatialHash of its members up to
+       date as sprites are added and removed.
+
+       Sprites are indexed by the rect they have when they are added,
+       so set a sprite's position before adding it (or call reindex()
+       after moving it).
+    """
+
+    def __init__(self, *sprites, **kwargs):
+        self.index = SpatialHash(kwargs.pop("cell_size",
+                                            constants.SPATIAL_HASH_CELL_SIZE))
+
+        # Bumped whenever a member is added, removed or moved, so
+        #   anything cached from the group's geometry can tell when
+        #   it's stale
+        self.version = 0
+
+        # Bumped only when a member is added or removed
+        self.members_version = 0
+
+        super(SpatialHashGroup, self).__init__(*sprites, **kwargs)
+
+    def add_internal(self, sprite, *args):
+        super(SpatialHashGroup, self).add_internal(sprite, *args)
+        self.index.insert(sprite)
+        self.version += 1
+        self.members_version += 1
+
+    def remove_internal(self, sprite):
+        super(SpatialHashGroup, self).remove_internal(sprite)
+        self.index.remove(sprite)
+        self.version += 1
+        self.members_version += 1
+
+    def reindex(self, sprite):
+        """Re-file (sprite) under the cells its rect covers now"""
+        self.index.insert(sprite)
+        self.version += 1
+
+    def collide(self, sprite):
+        """Drop-in for pygame.sprite.spritecollide(sprite, group, False)
+           that only tests sprites in the cells near (sprite)
+        """
+        return self.index.collide(sprite.rect)
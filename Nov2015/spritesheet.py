@@ -1,34 +1,120 @@
-"""
-    Module for loading images from sprite sheets
-    Written Dec 4, 2015 by Benjamin Reed
-"""
-import pygame
-import constants
-
-class SpriteSheet(object):
-    """ Class used to grab images out of a sprite sheet. """
-    # This points to our sprite sheet image
-    sprite_sheet = None
-
-    def __init__(self, file_name):
-        """ Constructor. Pass in the file name of the sprite sheet. """
-
-        # Load the sprite sheet.
-        self.sprite_sheet = pygame.image.load(file_name).convert()
-
-    def get_image(self, x, y, width, height):
-        """ Grab a single image out of a larger spritesheet
-            Pass in the x, y location of the sprite
-            and the width and height of the sprite. """
-
-        # Create a new blank image
-        image = pygame.Surface([width, height]).convert()
-
-        # Copy the sprite from the large sheet onto the smaller image
-        image.blit(self.sprite_sheet, (0, 0), (x, y, width, height))
-
-        # Assuming black works as the transparent color
-        image.set_colorkey(constants.BLACK)
-
-        # Return the image
-        return image
\ No newline at end of file
+"""
+    Module for loading images from sprite sheets
+    Written Dec 4, 2015 by Benjamin Reed
+"""
+import pygame
+import constants
+
+def surface_bytes(surface):
+    """Bytes of pixel data a Surface holds"""
+    return surface.get_pitch() * surface.get_height()
+
+class SpriteSheet(object):
+    """ Class used to grab images out of a sprite sheet.
+
+        In subsurface mode, images are subsurface views into the
+        sheet (or into one left/right flipped copy of it), so no
+        pixels are copied per frame. Otherwise every image is its
+        own copy, as before.
+    """
+    # This points to our sprite sheet image
+    sprite_sheet = None
+
+    def __init__(self, file_name, subsurface=constants.SPRITESHEET_SUBSURFACES,
+                 alpha=None):
+        """ Constructor. Pass in the file name of the sprite sheet.
+            (alpha) picks per-pixel alpha (True) or a colorkey
+            (False); by default per-pixel alpha is only used if the
+            sheet has partly transparent pixels. """
+
+        self.subsurface = subsurface
+
+        # Load the sprite sheet
+        sheet = pygame.image.load(file_name)
+
+        # Sheets whose pixels are only ever fully opaque or fully
+        #   transparent are drawn faster with a colorkey
+        if alpha is None:
+            alpha = self.has_partial_alpha(sheet)
+        self.alpha = alpha
+
+        # Only convert to the display's pixel format if there is a
+        #   display to convert to (headless simulation runs never
+        #   call set_mode)
+        if pygame.display.get_surface() is not None:
+            if alpha:
+                sheet = sheet.convert_alpha()
+            else:
+                sheet = sheet.convert()
+        self.sprite_sheet = sheet
+
+        # Left/right mirror image of the whole sheet, made the
+        #   first time a flipped image is asked for
+        self.flipped_sheet = None
+
+        # Bytes held by image copies (not used in subsurface mode)
+        self.copied_bytes = 0
+
+    @staticmethod
+    def has_partial_alpha(sheet):
+        """Whether (sheet) has pixels that are neither fully
+           opaque nor fully transparent
+        """
+        if not sheet.get_flags() & pygame.SRCALPHA:
+            return False
+        visible = pygame.mask.from_surface(sheet, 0).count()
+        opaque = pygame.mask.from_surface(sheet, 254).count()
+        return visible != opaque
+
+    def get_flipped_sheet(self):
+        if self.flipped_sheet is None:
+            self.flipped_sheet = pygame.transform.flip(self.sprite_sheet, True, False)
+        return self.flipped_sheet
+
+    def get_image(self, x, y, width, height, colorkey=constants.BLACK, flip=False):
+        """ Grab a single image out of a larger spritesheet
+            Pass in the x, y location of the sprite
+            and the width and height of the sprite,
+            and optionally the transparent color and whether
+            to mirror the image left/right. """
+
+        # Flipped images come from the flipped sheet, where the
+        #   sprite's x is mirrored too
+        sheet = self.sprite_sheet
+        if flip:
+            sheet = self.get_flipped_sheet()
+            x = sheet.get_width() - x - width
+        area = pygame.Rect(x, y, width, height)
+
+        if self.subsurface:
+            # A view into the sheet: no pixels are copied
+            image = sheet.subsurface(area)
+        else:
+            # Create a new blank image
+            if self.alpha:
+                image = pygame.Surface([width, height], pygame.SRCALPHA)
+            else:
+                image = pygame.Surface([width, height])
+            if pygame.display.get_surface() is not None:
+                image = image.convert_alpha() if self.alpha else image.convert()
+
+            # Copy the sprite from the large sheet onto the smaller image
+            image.blit(sheet, (0, 0), area)
+            self.copied_bytes += surface_bytes(image)
+
+        # Black works as the transparent color unless told otherwise.
+        #   RLE-accelerated, since sprite frames have long runs of it
+        if colorkey is not None and not self.alpha:
+            image.set_colorkey(colorkey, pygame.RLEACCEL)
+
+        # Return the image
+        return image
+
+    def memory_bytes(self):
+        """Bytes of pixel data held for this sheet: the sheet, its
+           flipped copy and any image copies
+        """
+        total = surface_bytes(self.sprite_sheet) + self.copied_bytes
+        if self.flipped_sheet is not None:
+            total += surface_bytes(self.flipped_sheet)
+        return total
@@ -0,0 +1,138 @@
+"""Module for streaming frame timings and game events to a file for
+   offline analysis.
+
+   Two formats are written:
+      .json  : Chrome Trace Event format -- open it in
+               chrome://tracing or ui.perfetto.dev
+      .jsonl : one JSON object per line
+
+   Records are handed to a background thread through a queue, so the
+   main loop never waits on the disk.
+"""
+import json
+import threading
+import timeit
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import profiler
+
+class TelemetryWriter(object):
+    """Buffered background writer of per-frame phase timings,
+       collision query counts and Player events.
+
+       INSTANCE VARIABLES:
+       path :
+          File being written
+       chrome :
+          True for Chrome Trace Event output, False for JSONL
+       frame :
+          Number of the frame being recorded (stamped on events)
+    """
+
+    def __init__(self, path, chrome=None):
+        self.path = path
+        if chrome is None:
+            chrome = not path.endswith(".jsonl")
+        self.chrome = chrome
+        self.frame = 0
+
+        # Timestamps are microseconds since the writer started,
+        #   on the same clock as the FrameProfiler
+        self.timer = timeit.default_timer
+        self.start = self.timer()
+
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="telemetry")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def microseconds(self, seconds):
+        return int((seconds - self.start) * 1000000)
+
+    # -------- Main thread side: just queue records --------
+
+    def record_frame(self, frame_profiler, collision_queries=0):
+        """Queue the frame frame_profiler just finished"""
+        last = frame_profiler.last_frame()
+        if last is None:
+            return
+        start, duration, phases, spans = last
+        self.queue.put(("frame", self.frame, self.microseconds(start),
+                        duration, phases, spans, collision_queries))
+        self.frame += 1
+
+    def player_event(self, player, name):
+        """Listener for Player events (jump, air_jump, land,
+           stop_rising) -- set it as player.event_listener
+        """
+        self.queue.put(("event", self.frame, self.microseconds(self.timer()),
+                        name, player.rect.x, player.rect.y))
+
+    def close(self):
+        """Flush everything queued and close the file"""
+        self.queue.put(None)
+        self.thread.join()
+
+    # -------- Writer thread side --------
+
+    def run(self):
+        with open(self.path, "w") as out:
+            if self.chrome:
+                out.write("[\n")
+            first = True
+
+            while True:
+                record = self.queue.get()
+                if record is None:
+                    break
+
+                for entry in self.format(record):
+                    if self.chrome and not first:
+                        out.write(",\n")
+                    out.write(json.dumps(entry, sort_keys=True))
+                    if not self.chrome:
+                        out.write("\n")
+                    first = False
+
+            if self.chrome:
+                out.write("\n]\n")
+
+    def format(self, record):
+        """List of output entries for one queued record"""
+        if record[0] == "frame":
+            kind, frame, ts, duration, phases, spans, queries = record
+            if not self.chrome:
+                entry = {"type": "frame", "frame": frame, "ts": ts,
+                         "ms": duration * 1000.0, "collision_queries": queries}
+                for phase, name in enumerate(profiler.PHASE_NAMES):
+                    entry[name] = phases[phase] * 1000.0
+                return [entry]
+
+            entries = [{"name": "frame %d" % frame, "cat": "frame", "ph": "X",
+                        "ts": ts, "dur": int(duration * 1000000),
+                        "pid": 1, "tid": 1}]
+            # One block per mark, where it really ran in the frame (so
+            #   a phase marked several times shows up several times,
+            #   e.g. once per sim step)
+            for phase, offset, seconds in spans:
+                dur = int(seconds * 1000000)
+                if dur > 0:
+                    entries.append({"name": profiler.PHASE_NAMES[phase], "cat": "phase",
+                                    "ph": "X", "ts": ts + int(offset * 1000000),
+                                    "dur": dur, "pid": 1, "tid": 1,
+                                    "args": {"frame": frame}})
+            entries.append({"name": "collision queries", "ph": "C", "ts": ts,
+                            "pid": 1, "args": {"queries": queries}})
+            return entries
+
+        kind, frame, ts, name, x, y = record
+        if not self.chrome:
+            return [{"type": "event", "event": name, "frame": frame,
+                     "ts": ts, "x": x, "y": y}]
+        return [{"name": name, "cat": "player", "ph": "i", "s": "t",
+                 "ts": ts, "pid": 1, "tid": 1,
+                 "args": {"frame": frame, "x": x, "y": y}}]
@@ -0,0 +1,53 @@
+"""Tests for unloading sprite sheets from a frame_cache.FrameCache,
+   and the character animations built from them
+
+   Run from this directory with:
+      python -m unittest test_frame_cache
+"""
+import os
+import unittest
+
+import animation
+import constants
+from frame_cache import FrameCache
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class UnloadTest(unittest.TestCase):
+
+    def setUp(self):
+        # (The sprite sheet is found relative to the game's directory)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(HERE)
+        self.cache = FrameCache()
+        self.animations = animation.get_animation_set(constants.PLAYER_CHARACTER,
+                                                      self.cache)
+
+    def test_animations_shared_until_unloaded(self):
+        self.assertIs(animation.get_animation_set(constants.PLAYER_CHARACTER,
+                                                  self.cache), self.animations)
+        self.assertEqual(self.cache.decodes, 1)
+
+        self.cache.unload(constants.PLAYER_SPRITESHEET)
+        self.assertEqual(self.cache.frames, {})
+        self.assertEqual(self.cache.built, {})
+
+        # Asked for again, they're rebuilt from a fresh decode
+        animations = animation.get_animation_set(constants.PLAYER_CHARACTER,
+                                                 self.cache)
+        self.assertIsNot(animations, self.animations)
+        self.assertEqual(self.cache.decodes, 2)
+
+    def test_clear_drops_animations(self):
+        self.cache.clear()
+        self.assertEqual(self.cache.built, {})
+        self.assertIsNot(animation.get_animation_set(constants.PLAYER_CHARACTER,
+                                                     self.cache), self.animations)
+
+    def test_other_sheets_keep_their_animations(self):
+        self.cache.unload("img/some_other_sheet.png")
+        self.assertIs(animation.get_animation_set(constants.PLAYER_CHARACTER,
+                                                  self.cache), self.animations)
+
+if __name__ == "__main__":
+    unittest.main()
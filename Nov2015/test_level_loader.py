@@ -0,0 +1,50 @@
+"""Tests for loading stages through level_loader.LevelLoader
+
+   Run from this directory with:
+      python -m unittest test_level_loader
+"""
+import os
+import unittest
+
+import constants
+from level_loader import LevelLoader
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Stage with moving and falling platforms
+MOVING_STAGE = 2
+
+def moving_positions(level):
+    return sorted(platform.rect.topleft for platform in level.platform_list
+                  if not platform.static)
+
+class LevelLoaderTest(unittest.TestCase):
+
+    def setUp(self):
+        # (Stage files are found relative to the game's directory)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(HERE)
+        self.loader = LevelLoader(constants.STAGE_FILES)
+
+    def test_prefetch_only_reads_the_file(self):
+        self.loader.prefetch(MOVING_STAGE)
+        with self.loader.lock:
+            thread = self.loader.pending.get(MOVING_STAGE)
+        if thread is not None:
+            thread.join()
+        self.assertIsInstance(self.loader.cache[MOVING_STAGE], dict)
+
+    def test_stage_starts_afresh_each_time(self):
+        level = self.loader.get(MOVING_STAGE, None)
+        start = moving_positions(level)
+        self.assertTrue(start)
+        for step in range(90):
+            level.update()
+        self.assertNotEqual(moving_positions(level), start)
+
+        again = self.loader.get(MOVING_STAGE, None)
+        self.assertIsNot(again, level)
+        self.assertEqual(moving_positions(again), start)
+
+if __name__ == "__main__":
+    unittest.main()
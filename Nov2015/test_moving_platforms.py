@@ -0,0 +1,75 @@
+"""Tests for bodies riding moving platforms (levels.PlayLevel.move_platforms
+   and phys_world.PhysWorld.move)
+
+   Run from this directory with:
+      python -m unittest test_moving_platforms
+"""
+import unittest
+
+import pygame
+
+import levels
+from phys_surface import Platform, PathPlatform
+
+class Body(pygame.sprite.Sprite):
+    """Bare body: just a rect, like a Player's"""
+    def __init__(self, width, height):
+        super(Body, self).__init__()
+        self.rect = pygame.Rect(0, 0, width, height)
+
+def build_level(*platforms):
+    level = levels.PlayLevel(None)
+    for platform in platforms:
+        level.platform_list.add(platform)
+    return level
+
+def ride(level, body, platform, steps):
+    """Put (body) on top of (platform) and run the level's moving
+       platforms for (steps) steps. Returns [(body x, body bottom,
+       platform x, platform top)] per step.
+    """
+    level.world.add_body(body)
+    level.refresh_platforms()
+    body.rect.bottom = platform.rect.top
+    trace = []
+    for step in range(steps):
+        level.move_platforms(1)
+        trace.append((body.rect.x, body.rect.bottom,
+                      platform.rect.x, platform.rect.top))
+    return trace
+
+class RiderTest(unittest.TestCase):
+
+    def test_horizontal_platform_carries_rider(self):
+        platform = PathPlatform(200, 15, [(200, 400), (400, 400)])
+        body = Body(120, 114)
+        body.rect.x = 250
+        trace = ride(build_level(platform), body, platform, 20)
+        self.assertEqual(trace[-1][0], 250 + trace[-1][2] - 200)
+        self.assertEqual(trace[-1][1], 400)
+
+    def test_diagonal_platform_carries_rider(self):
+        # Rising diagonally, the platform overlaps its rider before
+        #   the rider is carried; it mustn't be pushed off the side
+        platform = PathPlatform(200, 15, [(200, 400), (400, 300)])
+        body = Body(120, 114)
+        body.rect.x = 250
+        level = build_level(platform)
+        # There and back again (the course ping-pongs)
+        for x, bottom, platformX, platformTop in ride(level, body, platform, 220):
+            self.assertEqual(bottom, platformTop)
+            self.assertEqual(x - platformX, 50)
+        self.assertIs(level.world.ground_contact(body).surface, platform)
+
+    def test_walls_still_stop_rider(self):
+        platform = PathPlatform(200, 15, [(200, 400), (400, 400)])
+        wall = Platform(20, 200)
+        wall.rect.topleft = (400, 200)
+        body = Body(120, 114)
+        body.rect.x = 250
+        trace = ride(build_level(platform, wall), body, platform, 60)
+        self.assertEqual(max(x for x, bottom, platformX, platformTop in trace) + 120,
+                         wall.rect.left)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""Tests for attacks firing projectiles (phys_object.Player.attack into
+   a particles.ProjectilePool, through the Simulation)
+
+   Run from this directory with:
+      python -m unittest test_projectiles
+"""
+import os
+import unittest
+
+import numpy
+
+import controls
+import levels
+import particles
+from phys_object import Player
+from simulation import Simulation
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class FireTest(unittest.TestCase):
+
+    def setUp(self):
+        # (The sprite sheet is found relative to the game's directory)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(HERE)
+
+        self.player = Player()
+        self.pool = particles.ProjectilePool(8, particles.projectile_kinds())
+        self.sim = Simulation(levels.PlayLevel_02(self.player), [self.player],
+                              projectiles=self.pool)
+
+    def live(self):
+        return numpy.flatnonzero(self.pool.alive).tolist()
+
+    def test_attack_input_fires(self):
+        self.sim.step([0])
+        self.assertEqual(self.pool.count, 0)
+        self.sim.step([controls.ATTACK])
+        self.assertEqual(self.pool.count, 1)
+
+        slot, = self.live()
+        self.assertGreater(self.pool.deltaX[slot], 0)
+        self.assertGreaterEqual(self.pool.x[slot], self.player.rect.centerx)
+        self.assertIs(self.pool.fighters[self.pool.owner[slot]], self.player)
+
+        # It flies on while the button's held, and another press
+        #   mid-attack fires nothing more
+        x = self.pool.x[slot]
+        self.sim.step([controls.ATTACK])
+        self.sim.step([0])
+        self.sim.step([controls.ATTACK])
+        self.assertEqual(self.pool.count, 1)
+        self.assertGreater(self.pool.x[slot], x)
+
+    def test_fires_the_way_the_player_faces(self):
+        self.player.direction = "L"
+        self.sim.step([controls.ATTACK])
+
+        slot, = self.live()
+        self.assertLess(self.pool.deltaX[slot], 0)
+        self.assertLessEqual(self.pool.x[slot] + self.pool.sizes[0][0],
+                             self.player.rect.centerx)
+
+    def test_no_pool_fires_nothing(self):
+        player = Player()
+        sim = Simulation(levels.PlayLevel_02(player), [player])
+        sim.step([controls.ATTACK])
+        self.assertGreater(player.attack_time, 0)
+        self.assertIsNone(player.projectiles)
+
+if __name__ == "__main__":
+    unittest.main()
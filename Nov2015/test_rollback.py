@@ -0,0 +1,88 @@
+"""Tests for rolling the simulation back and resimulating
+   (rollback.RollbackSession)
+
+   Run from this directory with:
+      python -m unittest test_rollback
+"""
+import os
+import unittest
+
+import levels
+from controls import JUMP, LEFT, RIGHT, ATTACK
+from phys_object import Player
+from rollback import RollbackSession
+from simulation import Simulation
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Input masks for two players, one step each
+SCRIPT = ([[RIGHT, 0]] * 20 + [[RIGHT | JUMP, LEFT]] * 5 + [[0, LEFT]] * 10
+          + [[ATTACK, JUMP]] * 3 + [[LEFT, 0]] * 20)
+
+def build_sim():
+    players = [Player(), Player()]
+    players[1].rect.x = 300
+    return Simulation(levels.PlayLevel_02(players[0]), players)
+
+def positions(sim):
+    return [(player.rect.topleft, player.deltaX, player.deltaY)
+            for player in sim.players]
+
+class RollbackTest(unittest.TestCase):
+
+    def setUp(self):
+        # (The sprite sheet is found relative to the game's directory)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(HERE)
+
+    def test_correction_matches_straight_run(self):
+        corrected = [list(inputs) for inputs in SCRIPT]
+        corrected[50][0] = JUMP
+
+        straight = build_sim()
+        for inputs in corrected:
+            straight.step(inputs)
+
+        sim = build_sim()
+        session = RollbackSession(sim)
+        for inputs in SCRIPT:
+            session.advance(inputs)
+        session.correct(50, 0, JUMP)
+
+        self.assertEqual(sim.frame, straight.frame)
+        self.assertEqual(positions(sim), positions(straight))
+
+    def test_resimulate_reuses_input_list(self):
+        sim = build_sim()
+        session = RollbackSession(sim)
+        for inputs in SCRIPT[:10]:
+            session.advance(inputs)
+
+        stepped = []
+        step = sim.step
+        def spy(inputs):
+            stepped.append((inputs, list(inputs)))
+            step(inputs)
+        sim.step = spy
+        session.resimulate(2, 10)
+
+        for passed, inputs in stepped:
+            self.assertIs(passed, stepped[0][0])
+        self.assertEqual([inputs for passed, inputs in stepped], SCRIPT[2:10])
+
+    def test_restore_forgets_contacts(self):
+        sim = build_sim()
+        session = RollbackSession(sim)
+        for inputs in SCRIPT[:10]:
+            session.advance(inputs)
+        world = sim.level.world
+        for player in sim.players:
+            world.ground_contact(player)
+
+        session.snapshots.restore(5)
+        self.assertEqual(world.ground, {})
+        for player in sim.players:
+            self.assertEqual(world.contacts[player], [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,382 @@
+"""Module for training agents: a Gym-style vectorized environment
+   stepping many independent stages at once, with no window.
+
+   Every env is a real PlayLevel + Player in its own Simulation, so
+   agents learn exactly the game's physics. What's vectorized is the
+   interface: actions come in as one array, and observations,
+   rewards and done flags go out in NumPy arrays that are allocated
+   once and overwritten every step. Envs that finish are reset on
+   the spot (restoring a snapshot taken when they were built rather
+   than rebuilding the level).
+
+   Actions are the action bits (controls.LEFT/RIGHT/JUMP/ATTACK) each agent
+   wants held that step.
+
+   Observation layout (one float32 row per env):
+      x, y, deltaX, deltaY, airborne, air_jumped, facing right
+      then (nearby) platforms, nearest first, each as
+      left - x, top - y, width, height, present (1.0, or all zeros
+      for unused slots)
+
+   Optional pixel observations are (height, width) uint8 images per
+   env of the camera's view: 0 empty, 1 platform, 2 player. They are
+   sliced out of a low-res map of the stage's static platforms built
+   once per env, so nothing is drawn with pygame.
+
+   Requires NumPy.
+"""
+import numpy
+
+import constants
+from batch_physics import PlatformArray
+from controls import held_mask
+from rollback import SnapshotRing
+
+# Number of observation values before the platform slots
+PLAYER_FIELDS = 7
+PLATFORM_FIELDS = 5
+
+def x_progress(env, index, player, previous_x):
+    """Default reward: pixels moved to the right this step"""
+    return player.rect.x - previous_x
+
+class VecEnv(object):
+    """(num_envs) independent copies of one stage.
+
+       INSTANCE VARIABLES:
+       num_envs :
+          Number of envs
+       sims :
+          Simulation of each env
+       observations :
+          (num_envs, PLAYER_FIELDS + nearby * PLATFORM_FIELDS)
+          float32 array, rewritten by every reset() and step()
+       pixels :
+          (num_envs, height, width) uint8 array, or None if pixel
+          observations are off
+       rewards, dones :
+          (num_envs,) float32 / bool arrays from the last step()
+       infos :
+          One dict per env; an env reset during the last step()
+          has its final observation in "terminal_observation"
+       steps :
+          Steps each env has taken since it was last reset
+    """
+
+    # How far (pixels) from the player to look for platforms
+    NEARBY_RANGE = 400
+
+    def __init__(self, num_envs, level="PlayLevel_02", max_steps=3600,
+                 nearby=8, pixel_size=None, reward=x_progress):
+        # Imported here so init_headless() can run before any
+        #   sprite sheets are loaded
+        from level_loader import build_level
+        from phys_object import Player
+        from simulation import Simulation
+
+        self.num_envs = num_envs
+        self.max_steps = max_steps
+        self.nearby = nearby
+        self.reward = reward
+
+        self.sims = []
+        self.snapshots = []
+        for n in range(num_envs):
+            player = Player()
+            stage = build_level(level, player)
+            spawn_points = getattr(stage, "spawn_points", None)
+            if spawn_points:
+                player.rect.topleft = spawn_points[0]
+            sim = Simulation(stage, [player])
+            self.sims.append(sim)
+
+            # Starting state, restored by reset()
+            snapshot = SnapshotRing(sim, 1)
+            snapshot.save()
+            self.snapshots.append(snapshot)
+
+        self.players = [sim.players[0] for sim in self.sims]
+
+        width = PLAYER_FIELDS + nearby * PLATFORM_FIELDS
+        self.observations = numpy.zeros((num_envs, width), dtype=numpy.float32)
+        self.rewards = numpy.zeros(num_envs, dtype=numpy.float32)
+        self.dones = numpy.zeros(num_envs, dtype=bool)
+        self.infos = [{} for n in range(num_envs)]
+        self.steps = [0] * num_envs
+
+        # Action bits each env's player is holding
+        self.held = [0] * num_envs
+
+        # Every env is a copy of the same stage, so the static
+        #   platforms of the first one stand for all of them
+        self.platform_array = PlatformArray(self.sims[0].level, static_only=True)
+        self.player_size = self.players[0].rect.size
+        self.init_platform_buffers(self.platform_array.get())
+
+        self.pixels = None
+        if pixel_size is not None:
+            self.init_pixels(pixel_size)
+
+    # -------- Pixel observations --------
+
+    def init_pixels(self, pixel_size):
+        width, height = pixel_size
+        self.pixel_scale = float(constants.SCREEN_WIDTH) / width
+        self.pixels = numpy.zeros((self.num_envs, height, width), dtype=numpy.uint8)
+
+        # Low-res map of each env's whole stage with its static
+        #   platforms (moving ones are drawn in every frame)
+        self.stage_maps = []
+        for sim in self.sims:
+            level = sim.level
+            stage_map = numpy.zeros((height, int(level.level_width / self.pixel_scale) + width),
+                                    dtype=numpy.uint8)
+            for platform in level.platform_list:
+                if platform.static:
+                    left, top, right, bottom = self.scale_rect(platform.rect)
+                    stage_map[max(top, 0):max(bottom, 0), max(left, 0):max(right, 0)] = 1
+            self.stage_maps.append(stage_map)
+
+    def scale_rect(self, rect):
+        """(rect) as left, top, right, bottom in pixel observation
+           coordinates (always at least one pixel)
+        """
+        scale = self.pixel_scale
+        left = int(rect.left / scale)
+        top = int(rect.top / scale)
+        return (left, top,
+                max(int(rect.right / scale), left + 1),
+                max(int(rect.bottom / scale), top + 1))
+
+    def render_pixels(self, index):
+        pixels = self.pixels[index]
+        sim = self.sims[index]
+        height, width = pixels.shape
+
+        # The camera's view of the stage map, then moving platforms
+        #   and the player
+        offset = int(-sim.level.world_shift / self.pixel_scale)
+        pixels[:] = self.stage_maps[index][:, offset:offset + width]
+        for platform in sim.level.moving_platforms:
+            left, top, right, bottom = self.scale_rect(platform.rect)
+            pixels[max(top, 0):max(bottom, 0),
+                   max(left - offset, 0):max(right - offset, 0)] = 1
+        left, top, right, bottom = self.scale_rect(self.players[index].rect)
+        pixels[max(top, 0):max(bottom, 0),
+               max(left - offset, 0):max(right - offset, 0)] = 2
+
+    # -------- Observations --------
+
+    def observe(self, indices=None):
+        """Rewrite the observation rows of envs (indices) (a list),
+           or of every env if None
+        """
+        whole = indices is None
+        if whole:
+            indices = range(self.num_envs)
+            rows = self.observations
+        else:
+            rows = self.observations[indices]
+
+        # Player fields, gathered in one pass over the players
+        players = self.players
+        rows[:, :PLAYER_FIELDS] = [
+            (player.rect.x, player.rect.y, player.deltaX, player.deltaY,
+             player.airborne, player.air_jumped, player.direction == "R")
+            for player in [players[index] for index in indices]]
+
+        if self.nearby:
+            self.observe_platforms(rows, indices)
+
+        # Picking out rows copied them, so copy them back
+        if not whole:
+            self.observations[indices] = rows
+
+        if self.pixels is not None:
+            for index in indices:
+                self.render_pixels(index)
+
+    def init_platform_buffers(self, edges):
+        """(Re)allocate the arrays observe_platforms() works in, for
+           static platforms (edges) plus the stage's moving ones
+        """
+        num_envs = self.num_envs
+        static = len(edges)
+        platforms = static + len(self.sims[0].level.moving_platforms)
+        self.static_edges = edges
+
+        # Edges and centers of every platform, per env: the static
+        #   ones are filled in here, the moving ones every step
+        self.edges = numpy.empty((num_envs, platforms, 4))
+        self.edges[:, :static] = edges
+        self.centers_x = numpy.empty((num_envs, platforms))
+        self.centers_y = numpy.empty((num_envs, platforms))
+        self.centers_x[:, :static] = (edges[:, 0] + edges[:, 2]) * 0.5
+        self.centers_y[:, :static] = (edges[:, 1] + edges[:, 3]) * 0.5
+
+        self.distance = numpy.empty((num_envs, platforms))
+        self.distance_y = numpy.empty((num_envs, platforms))
+        self.nearest = numpy.empty((self.nearby, num_envs), dtype=numpy.intp)
+        self.slots = numpy.zeros((num_envs, self.nearby, PLATFORM_FIELDS),
+                                 dtype=numpy.float32)
+        self.env_range = numpy.arange(num_envs)
+
+    def observe_platforms(self, rows, indices):
+        """Fill in the platform slots of (rows) (the observations of
+           envs (indices)) from their player fields, for every env
+           at once. Every env is a copy of the same stage, so one
+           array of static platforms serves them all; only moving
+           platforms are looked up per env. Works in arrays
+           allocated once (see init_platform_buffers()).
+        """
+        edges = self.platform_array.get()
+        if edges is not self.static_edges:
+            self.init_platform_buffers(edges)
+        static = len(edges)
+
+        count = len(rows)
+        edges = self.edges[:count]
+        platforms = edges.shape[1]
+        if not platforms:
+            rows[:, PLAYER_FIELDS:] = 0
+            return
+        centers_x = self.centers_x[:count]
+        centers_y = self.centers_y[:count]
+
+        if platforms > static:
+            sims = self.sims
+            edges[:, static:] = [
+                [(p.rect.left, p.rect.top, p.rect.right, p.rect.bottom)
+                 for p in sims[index].level.moving_platforms]
+                for index in indices]
+            moving = edges[:, static:]
+            numpy.add(moving[:, :, 0], moving[:, :, 2], out=centers_x[:, static:])
+            centers_x[:, static:] *= 0.5
+            numpy.add(moving[:, :, 1], moving[:, :, 3], out=centers_y[:, static:])
+            centers_y[:, static:] *= 0.5
+
+        width, height = self.player_size
+        x = rows[:, 0]
+        y = rows[:, 1]
+
+        # Distance between centers (along x plus along y) from
+        #   each player to each platform
+        distance = self.distance[:count]
+        distance_y = self.distance_y[:count]
+        numpy.subtract(centers_x, (x + width * 0.5)[:, None], out=distance)
+        numpy.abs(distance, out=distance)
+        numpy.subtract(centers_y, (y + height * 0.5)[:, None], out=distance_y)
+        numpy.abs(distance_y, out=distance_y)
+        distance += distance_y
+
+        # Then the nearest ones, nearest first: pick each env's
+        #   nearest platform and rule it out, (nearby) times
+        slots = self.slots[:count]
+        env_range = self.env_range[:count]
+        for n in range(min(self.nearby, platforms)):
+            nearest = self.nearest[n, :count]
+            numpy.argmin(distance, axis=1, out=nearest)
+            present = distance[env_range, nearest] <= self.NEARBY_RANGE
+            distance[env_range, nearest] = numpy.inf
+
+            left, top, right, bottom = edges[env_range, nearest].T
+            slots[:, n, 0] = (left - x) * present
+            slots[:, n, 1] = (top - y) * present
+            slots[:, n, 2] = (right - left) * present
+            slots[:, n, 3] = (bottom - top) * present
+            slots[:, n, 4] = present
+        rows[:, PLAYER_FIELDS:] = slots.reshape(count, -1)
+
+    # -------- Gym-style API --------
+
+    def reset_env(self, index):
+        """Put env (index) back at its start"""
+        self.snapshots[index].restore(0)
+        self.held[index] = 0
+        self.steps[index] = 0
+
+    def reset(self):
+        """Reset every env and return the observations"""
+        for index in range(self.num_envs):
+            self.reset_env(index)
+        self.observe()
+        return self.observations
+
+    def step(self, actions):
+        """Step every env with its held action bits in (actions).
+           Returns (observations, rewards, dones, infos), all reused
+           by the next step.
+        """
+        rewards = self.rewards
+        dones = self.dones
+        infos = self.infos
+        held = self.held
+        steps = self.steps
+        max_steps = self.max_steps
+        bottom = constants.SCREEN_HEIGHT
+        inputs = [0]
+        finished = []
+
+        for index in range(self.num_envs):
+            player = self.players[index]
+            if infos[index]:
+                infos[index].clear()
+
+            want = int(actions[index])
+            inputs[0] = held_mask(held[index], want)
+            held[index] = want
+            previous_x = player.rect.x
+            self.sims[index].step(inputs)
+            steps[index] += 1
+
+            rewards[index] = self.reward(self, index, player, previous_x)
+            done = steps[index] >= max_steps or player.rect.top > bottom
+            dones[index] = done
+            if done:
+                finished.append(index)
+
+        self.observe()
+
+        # Hand back the final observation of finished envs and
+        #   start them over
+        if finished:
+            for index in finished:
+                infos[index]["terminal_observation"] = self.observations[index].copy()
+                self.reset_env(index)
+            self.observe(finished)
+
+        return self.observations, rewards, dones, infos
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import timeit
+
+    from simulation import init_headless
+
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized environment")
+    parser.add_argument("--envs", type=int, default=64, help="number of envs")
+    parser.add_argument("--steps", type=int, default=500, help="steps per env")
+    parser.add_argument("--level", default="PlayLevel_02",
+                        help="level class name or stage file to play")
+    parser.add_argument("--pixels", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"),
+                        help="also produce WIDTH x HEIGHT pixel observations")
+    args = parser.parse_args()
+
+    init_headless()
+    env = VecEnv(args.envs, args.level, pixel_size=args.pixels)
+    env.reset()
+
+    # Random held actions, changed every few steps
+    rng = random.Random(0)
+    actions = numpy.zeros(args.envs, dtype=numpy.int64)
+    start = timeit.default_timer()
+    for step in range(args.steps):
+        if step % 8 == 0:
+            for index in range(args.envs):
+                actions[index] = rng.randrange(8)
+        env.step(actions)
+    elapsed = timeit.default_timer() - start
+
+    print("%d envs x %d steps: %.0f env-steps/sec"
+          % (args.envs, args.steps, args.envs * args.steps / elapsed))